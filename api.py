@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+API HTTP/JSON de AsadoApp
+
+Expone las operaciones de AsadoService sin pasar por Streamlit, usando el
+mismo servicio (y por lo tanto el mismo engine y pool de conexiones) del
+proceso. Se puede correr sola:
+    
+    python api.py --port 8000
+
+o dentro del proceso de Streamlit definiendo ASADO_API_PORT. Escucha en
+127.0.0.1 salvo que se indique otro host (--host o ASADO_API_HOST); para
+escuchar en otra interfaz hace falta ASADO_API_TOKEN, y entonces cada
+petición debe mandar "Authorization: Bearer <token>".
+
+Rutas:
+    GET    /asados                                  asados con totales
+    POST   /asados                                  {"name": ...}
+    DELETE /asados/<asado>
+    POST   /asados/<asado>/archive                  mover sus datos a un Parquet (solo lectura)
+    POST   /asados/<asado>/restore                  devolverlo a las tablas
+    GET    /asados/<asado>                          versión, participantes y gastos
+    GET    /asados/<asado>/participants
+    POST   /asados/<asado>/participants             {"name": ...} o {"names": [...]}
+    DELETE /asados/<asado>/participants/<nombre>
+    GET    /asados/<asado>/expenses?since=<versión> gastos en formato columnar (delta con since)
+    POST   /asados/<asado>/expenses                 un gasto o {"expenses": [...]} (un solo commit)
+    DELETE /asados/<asado>/expenses/<id>
+    PUT    /asados/<asado>/expenses/<id>/shares     {"shares": {participante: peso}} o {"shares": null}
+    DELETE /expenses/<id>                           (sin shards: los ids de gasto son de cada base)
+    PUT    /expenses/<id>/shares
+    GET    /asados/<asado>/summary                  totales, balances y transferencias
+    GET    /categories
+    GET    /search?q=<texto>&asado=<asado>&limit=<n>  gastos por relevancia (asado y limit opcionales; sin los archivados)
+
+Las lecturas de un asado devuelven ETag con su versión: si el cliente manda
+If-None-Match con la misma, la respuesta es 304 sin cuerpo.
+"""
+
+import os
+import re
+import hmac
+import json
+import logging
+import argparse
+import ipaddress
+import threading
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+import numpy as np
+from database import initialize_database, get_asado_service
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo del cuerpo de una petición (1 MB)
+MAX_BODY_BYTES = 1024 * 1024
+# Resultados máximos de una búsqueda
+MAX_SEARCH_RESULTS = 200
+# Host por defecto: solo conexiones locales
+DEFAULT_HOST = '127.0.0.1'
+
+class ApiError(Exception):
+    """Error con código HTTP que se devuelve como {"error": mensaje}"""
+    
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def to_json(value):
+    """Serializar fechas y arrays NumPy además de los tipos de json"""
+    def default(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        if isinstance(obj, np.ndarray):
+            if np.issubdtype(obj.dtype, np.datetime64):
+                return np.datetime_as_string(obj, unit='us').tolist()
+            return obj.tolist()
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f"{type(obj).__name__} no es serializable")
+    return json.dumps(value, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def version_etag(version):
+    """ETag de una versión (shard, asado_id, versión); sin shards no lleva el shard"""
+    return '"' + '-'.join(str(part) for part in version if part is not None) + '"'
+
+def build_settlement(participants, columns, shares=None):
+    """Totales, balances y transferencias del asado a partir de sus gastos y divisiones columnares"""
+    from summary import calculate_totals, calculate_transfers
+    import pandas as pd
+    
+    totals = calculate_totals(participants, pd.DataFrame(columns), shares)
+    if not totals:
+        return {
+            'total': 0.0,
+            'per_person': 0.0,
+            'participants': len(participants),
+            'by_participant': {},
+            'by_category': {},
+            'should_pay': {participant: 0.0 for participant in participants},
+            'balance': {participant: 0.0 for participant in participants},
+            'transfers': []
+        }
+    should_pay = totals['should_pay']
+    if not isinstance(should_pay, dict):
+        should_pay = {participant: should_pay for participant in participants}
+    return {
+        'total': float(totals['total_general']),
+        'per_person': float(totals['amount_per_person']),
+        'participants': len(participants),
+        'by_participant': {name: float(amount) for name, amount in totals['total_by_participant'].items()},
+        'by_category': {name: float(amount) for name, amount in totals['total_by_category'].items()},
+        'should_pay': {name: round(float(amount), 2) for name, amount in should_pay.items()},
+        'balance': {name: round(amount, 2) for name, amount in totals['balance'].items()},
+        'transfers': [
+            {'from': deudor, 'to': acreedor, 'amount': round(monto, 2)}
+            for deudor, acreedor, monto in calculate_transfers(totals['balance'])
+        ]
+    }
+
+# (método, patrón de la ruta, nombre del método del handler)
+ROUTES = [
+    ('GET', r'/asados', 'list_asados'),
+    ('POST', r'/asados', 'create_asado'),
+    ('GET', r'/asados/(?P<asado>[^/]+)', 'get_asado'),
+    ('DELETE', r'/asados/(?P<asado>[^/]+)', 'delete_asado'),
+    ('POST', r'/asados/(?P<asado>[^/]+)/archive', 'archive_asado'),
+    ('POST', r'/asados/(?P<asado>[^/]+)/restore', 'restore_asado'),
+    ('GET', r'/asados/(?P<asado>[^/]+)/participants', 'list_participants'),
+    ('POST', r'/asados/(?P<asado>[^/]+)/participants', 'add_participants'),
+    ('DELETE', r'/asados/(?P<asado>[^/]+)/participants/(?P<participant>[^/]+)', 'remove_participant'),
+    ('GET', r'/asados/(?P<asado>[^/]+)/expenses', 'list_expenses'),
+    ('POST', r'/asados/(?P<asado>[^/]+)/expenses', 'add_expenses'),
+    ('DELETE', r'/asados/(?P<asado>[^/]+)/expenses/(?P<expense_id>\d+)', 'remove_expense'),
+    ('PUT', r'/asados/(?P<asado>[^/]+)/expenses/(?P<expense_id>\d+)/shares', 'set_expense_shares'),
+    ('DELETE', r'/expenses/(?P<expense_id>\d+)', 'remove_expense'),
+    ('PUT', r'/expenses/(?P<expense_id>\d+)/shares', 'set_expense_shares'),
+    ('GET', r'/asados/(?P<asado>[^/]+)/summary', 'get_summary'),
+    ('GET', r'/categories', 'list_categories'),
+    ('GET', r'/search', 'search_expenses'),
+]
+COMPILED_ROUTES = [(method, re.compile(pattern + r'/?$'), name) for method, pattern, name in ROUTES]
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para mantener la conexión abierta entre peticiones
+    protocol_version = 'HTTP/1.1'
+    server_version = 'AsadoAppAPI/1.0'
+    
+    def do_GET(self):
+        self._dispatch('GET')
+    
+    def do_POST(self):
+        self._dispatch('POST')
+    
+    def do_PUT(self):
+        self._dispatch('PUT')
+    
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+    
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+    
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        try:
+            # El cuerpo se lee siempre: si quedara en el socket rompería la próxima petición
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # rfile.read(-1) esperaría hasta que el cliente cierre la conexión
+                self.close_connection = True
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+                raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo demasiado grande")
+            self.body = self.rfile.read(length)
+            self._check_token()
+            
+            path_exists = False
+            for route_method, pattern, name in COMPILED_ROUTES:
+                match = pattern.match(url.path)
+                if not match:
+                    continue
+                path_exists = True
+                if route_method == method:
+                    params = {key: unquote(value) for key, value in match.groupdict().items()}
+                    status, body, etag = getattr(self, name)(**params)
+                    break
+            else:
+                if path_exists:
+                    raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"Método no permitido: {method} {url.path}")
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Ruta inexistente: {url.path}")
+        except ApiError as e:
+            status, body, etag = e.status, {'error': e.message}, None
+        except Exception as e:
+            logger.error(f"Error en {method} {url.path}: {e}")
+            status, body, etag = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Error interno"}, None
+        self._send(status, body, etag)
+    
+    def _send(self, status, body, etag=None):
+        payload = b'' if body is None else to_json(body)
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _check_token(self):
+        """401 si el servidor tiene token y la petición no trae el mismo"""
+        token = self.server.token
+        if not token:
+            return
+        scheme, _, value = self.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(value.strip().encode(), token.encode()):
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Falta el token de la API o no es válido")
+    
+    @property
+    def service(self):
+        service = get_asado_service()
+        if service is None:
+            raise ApiError(HTTPStatus.SERVICE_UNAVAILABLE, "Base de datos no inicializada")
+        return service
+    
+    def _read_json(self):
+        try:
+            return json.loads(self.body or b'null')
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "JSON inválido")
+    
+    def _not_modified(self, version):
+        """304 si el cliente ya tiene esta versión"""
+        etag = version_etag(version)
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            return HTTPStatus.NOT_MODIFIED, None, etag
+        return None
+    
+    def _current_version(self, asado):
+        """Versión del asado (del listener si está al día, si no de la base) o 404"""
+        version = self.service.versions.get(asado) or self.service.get_asado_version(asado)
+        if version is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No existe el asado {asado}")
+        return version
+    
+    def _read_shares(self, value):
+        """Mapeo participante -> peso de un gasto (None: entre todos por igual)"""
+        if value is None:
+            return None
+        try:
+            shares = {str(name): float(weight) for name, weight in value.items()}
+        except (AttributeError, TypeError, ValueError):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "shares debe ser un objeto participante -> peso")
+        if any(weight < 0 for weight in shares.values()) or (shares and not any(weight > 0 for weight in shares.values())):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Los pesos deben ser positivos (0 excluye al participante)")
+        return shares or None
+    
+    def _snapshot(self, asado, since_version=0):
+        snapshot = self.service.get_asado_snapshot(asado, since_version)
+        if snapshot is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No existe el asado {asado}")
+        return snapshot
+    
+    # Asados
+    
+    def list_asados(self):
+        return HTTPStatus.OK, [row._asdict() for row in self.service.get_asado_stats()], None
+    
+    def create_asado(self):
+        data = self._read_json()
+        name = str(data.get('name') or '').strip() if isinstance(data, dict) else ''
+        if not name:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Falta el nombre del asado")
+        row = self.service.create_asado(name)
+        if row is None:
+            raise ApiError(HTTPStatus.CONFLICT, f"Ya existe el asado {name}")
+        return HTTPStatus.CREATED, row._asdict(), None
+    
+    def delete_asado(self, asado):
+        if not self.service.delete_asado(asado):
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No existe el asado {asado}")
+        return HTTPStatus.NO_CONTENT, None, None
+    
+    def archive_asado(self, asado):
+        if not self.service.archive_asado(asado):
+            raise ApiError(HTTPStatus.CONFLICT, f"No existe el asado {asado} o ya está archivado")
+        return HTTPStatus.NO_CONTENT, None, None
+    
+    def restore_asado(self, asado):
+        if not self.service.restore_asado(asado):
+            raise ApiError(HTTPStatus.CONFLICT, f"No existe el asado {asado} o no está archivado")
+        return HTTPStatus.NO_CONTENT, None, None
+    
+    def get_asado(self, asado):
+        not_modified = self._not_modified(self._current_version(asado))
+        if not_modified:
+            return not_modified
+        snapshot = self._snapshot(asado)
+        return HTTPStatus.OK, {
+            'name': asado,
+            'shard': snapshot['version'][0],
+            'id': snapshot['version'][1],
+            'version': snapshot['version'][2],
+            'participants': snapshot['participants'],
+            'expenses': snapshot['expenses']['inserted'],
+            'shares': snapshot['shares'],
+            'archived': snapshot['archived']
+        }, version_etag(snapshot['version'])
+    
+    # Participantes
+    
+    def list_participants(self, asado):
+        not_modified = self._not_modified(self._current_version(asado))
+        if not_modified:
+            return not_modified
+        snapshot = self._snapshot(asado)
+        return HTTPStatus.OK, snapshot['participants'], version_etag(snapshot['version'])
+    
+    def add_participants(self, asado):
+        data = self._read_json()
+        if not isinstance(data, dict) or not (data.get('name') or data.get('names')):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Falta name o names")
+        names = data['names'] if data.get('names') else [data['name']]
+        if not isinstance(names, list) or not all(isinstance(name, str) and name.strip() for name in names):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "name debe ser un texto y names una lista de textos")
+        names = [name.strip() for name in names]
+        self._current_version(asado)
+        
+        added = []
+        for name in names:
+            row = self.service.add_participant(asado, name)
+            if row is not None:
+                added.append(row._asdict())
+        if not added and len(names) == 1:
+            raise ApiError(HTTPStatus.CONFLICT, f"Ya existe el participante {names[0]}")
+        return HTTPStatus.CREATED, {'added': added}, None
+    
+    def remove_participant(self, asado, participant):
+        if not self.service.remove_participant(asado, participant):
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No existe el participante {participant} en {asado}")
+        return HTTPStatus.NO_CONTENT, None, None
+    
+    # Gastos
+    
+    def list_expenses(self, asado):
+        try:
+            since_version = int(self.query.get('since', ['0'])[0])
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "since debe ser un número")
+        
+        not_modified = self._not_modified(self._current_version(asado))
+        if not_modified:
+            return not_modified
+        snapshot = self._snapshot(asado, since_version)
+        return HTTPStatus.OK, snapshot['expenses'], version_etag(snapshot['version'])
+    
+    def add_expenses(self, asado):
+        data = self._read_json()
+        items = data.get('expenses') if isinstance(data, dict) and 'expenses' in data else [data]
+        if not isinstance(items, list) or not items:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Se esperaba un gasto o {\"expenses\": [...]}")
+        
+        expenses = []
+        for item in items:
+            try:
+                expense = {
+                    'asado': asado,
+                    'participant': str(item['participant']),
+                    'category': str(item['category']),
+                    'amount': float(item['amount']),
+                    'description': str(item.get('description', '')),
+                    'timestamp': datetime.now(),
+                    'shares': self._read_shares(item.get('shares'))
+                }
+            except (KeyError, TypeError, ValueError):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Cada gasto necesita participant, category y amount")
+            if expense['amount'] <= 0:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "El monto debe ser mayor a 0")
+            expenses.append(expense)
+        self._current_version(asado)
+        
+        ids = self.service.add_expenses(expenses)
+        if all(expense_id is None for expense_id in ids):
+            raise ApiError(HTTPStatus.UNPROCESSABLE_ENTITY, "Ningún participante existe en el asado")
+        return HTTPStatus.CREATED, {'ids': ids}, None
+    
+    def remove_expense(self, expense_id, asado=None):
+        try:
+            removed = self.service.remove_expense(int(expense_id), asado)
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        if not removed:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No existe el gasto {expense_id}")
+        return HTTPStatus.NO_CONTENT, None, None
+    
+    def set_expense_shares(self, expense_id, asado=None):
+        data = self._read_json()
+        if not isinstance(data, dict) or 'shares' not in data:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Se esperaba {\"shares\": {participante: peso} o null}")
+        try:
+            updated = self.service.set_expense_shares(int(expense_id), self._read_shares(data['shares']), asado)
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        if not updated:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No existe el gasto {expense_id} o algún participante de la división")
+        return HTTPStatus.NO_CONTENT, None, None
+    
+    # Resumen y categorías
+    
+    def get_summary(self, asado):
+        not_modified = self._not_modified(self._current_version(asado))
+        if not_modified:
+            return not_modified
+        snapshot = self._snapshot(asado)
+        settlement = build_settlement(snapshot['participants'], snapshot['expenses']['inserted'], snapshot['shares'])
+        return HTTPStatus.OK, {'version': snapshot['version'][2], **settlement}, version_etag(snapshot['version'])
+    
+    def search_expenses(self):
+        query = self.query.get('q', [''])[0]
+        if not query.strip():
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Falta q")
+        try:
+            limit = min(int(self.query.get('limit', ['20'])[0]), MAX_SEARCH_RESULTS)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit debe ser un número")
+        # En SQLite un LIMIT negativo es "sin límite"
+        if limit < 1:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit debe ser al menos 1")
+        asado = self.query.get('asado', [None])[0]
+        return HTTPStatus.OK, [row._asdict() for row in self.service.search_expenses(query, asado, limit)], None
+    
+    def list_categories(self):
+        return HTTPStatus.OK, {'all': self.service.categories.all(), 'custom': self.service.categories.custom()}, None
+
+def is_loopback(host: str) -> bool:
+    """Si el host solo acepta conexiones de la misma máquina"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def __init__(self, address, handler, token=None):
+        # Sin token, solo en localhost: la API no tiene usuarios y puede borrar asados
+        if not token and not is_loopback(address[0]):
+            raise ValueError(f"Para escuchar en {address[0]} hay que definir ASADO_API_TOKEN")
+        self.token = token
+        super().__init__(address, handler)
+
+# Servidor iniciado dentro de este proceso (ver start_in_background)
+_server = None
+_server_lock = threading.Lock()
+
+def start_in_background(port: int, host: str = None):
+    """Levantar la API en un hilo del proceso actual (una sola vez por proceso)"""
+    global _server
+    host = host or os.getenv('ASADO_API_HOST', DEFAULT_HOST)
+    with _server_lock:
+        if _server is None:
+            _server = ApiServer((host, port), ApiHandler, os.getenv('ASADO_API_TOKEN'))
+            threading.Thread(target=_server.serve_forever, name="asadoapp-api", daemon=True).start()
+            logger.info(f"API escuchando en {host}:{port}")
+        return _server
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP/JSON de AsadoApp")
+    parser.add_argument("--host", default=os.getenv('ASADO_API_HOST', DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=int(os.getenv('ASADO_API_PORT', '8000')))
+    args = parser.parse_args()
+    
+    if not initialize_database():
+        raise SystemExit("Error al conectar con la base de datos")
+    try:
+        server = ApiServer((args.host, args.port), ApiHandler, os.getenv('ASADO_API_TOKEN'))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    logger.info(f"API escuchando en {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        get_asado_service().stop_write_behind()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import os
 from datetime import datetime
+import json
 import numpy as np
-from database import initialize_database, get_asado_service
+from database import initialize_database, get_asado_service, EXPENSE_COLUMNS, SHARE_COLUMNS, expense_rows_to_columns, share_rows_to_columns
+from categories import DEFAULT_CATEGORIES
+from summary import format_currency, build_summary, build_analytics, build_participant_history
+from memory import SessionCache, sessions, start_tracing, measure, section_report, peak_rss, format_bytes
 # Configuración de la página
 st.set_page_config(
     page_title="AsadoApp",
@@ -20,29 +22,35 @@ if 'db_initialized' not in st.session_state:
         st.error("Error al conectar con la base de datos")
         st.stop()
 
+# API HTTP/JSON opcional en el mismo proceso (comparte servicio y pool de conexiones)
+if os.getenv('ASADO_API_PORT'):
+    from api import start_in_background
+    try:
+        start_in_background(int(os.getenv('ASADO_API_PORT')))
+    except ValueError as e:
+        st.error(f"No se pudo iniciar la API: {e}")
+
+# Medición de memoria por rerun y por sección con tracemalloc (ASADO_MEMORY_TRACE)
+start_tracing()
+
 # Inicializar session state
 if 'current_asado' not in st.session_state:
     st.session_state.current_asado = None
 
-# Categorías predefinidas para asados argentinos
-DEFAULT_CATEGORIES = [
-    "Carne", "Achuras", "Chorizo", "Morcilla", "Pollo",
-    "Bebidas", "Vino", "Cerveza", "Gaseosas", "Agua",
-    "Carbón", "Leña", "Encendedor",
-    "Verduras", "Ensalada", "Tomate", "Lechuga", "Cebolla",
-    "Condimentos", "Sal", "Chimichurri", "Salsa criolla",
-    "Pan", "Postre", "Helado", "Fruta",
-    "Varios", "Hielo", "Servilletas", "Platos", "Vasos"
-]
+# Copia local (columnar) de los gastos por asado, sincronizada por deltas
+if not isinstance(st.session_state.get('expense_cache'), SessionCache):
+    st.session_state.expense_cache = SessionCache(st.session_state.get('expense_cache') or {})
+
+# Identificador de la sesión en el registro de memoria (ver memory.py)
+if 'session_key' not in st.session_state:
+    st.session_state.session_key = sessions.new_key()
 
 def get_all_categories():
-    """Obtener todas las categorías disponibles"""
+    """Obtener todas las categorías disponibles (ordenadas, cacheadas por proceso)"""
     service = get_asado_service()
     if service:
-        custom_categories = service.get_custom_categories()
-        all_categories = list(DEFAULT_CATEGORIES) + list(custom_categories)
-        return sorted(all_categories)
-    return sorted(list(DEFAULT_CATEGORIES))
+        return service.categories.all()
+    return sorted(DEFAULT_CATEGORIES)
 
 def create_asado(name):
     """Crear un nuevo asado"""
@@ -52,6 +60,97 @@ def create_asado(name):
         return asado is not None
     return False
 
+def apply_expense_changes(columns, changes):
+    """Aplicar un delta (altas y bajas) a la copia columnar de gastos"""
+    inserted = changes['inserted']
+    removed = list(changes['deleted'])
+    # Un gasto puede llegar repetido en dos deltas: se reemplaza por id
+    removed.extend(inserted['id'].tolist())
+    
+    if removed:
+        keep = ~np.isin(columns['id'], removed)
+        if not keep.all():
+            columns = {column: values[keep] for column, values in columns.items()}
+    
+    if len(inserted['id']):
+        columns = {
+            column: np.concatenate([columns[column], inserted[column]])
+            for column in EXPENSE_COLUMNS
+        }
+    return columns
+
+def sync_asado(asado_name):
+    """Obtener versión, participantes y gastos del asado trayendo solo los gastos nuevos
+    
+    Devuelve (versión, participantes, gastos en formato columnar, divisiones
+    en formato columnar, si está archivado) o None.
+    """
+    service = get_asado_service()
+    cache = st.session_state.expense_cache
+    entry = cache.get(asado_name)
+    
+    # Con el listener de avisos conectado, si nadie escribió no hace falta consultar
+    known_version = service.versions.get(asado_name)
+    if entry and known_version is not None and known_version == entry['asado_version']:
+        return entry['asado_version'], entry['participants'], entry['columns'], entry['shares'], entry['archived']
+    
+    snapshot = service.get_asado_snapshot(asado_name, entry['version'] if entry else 0)
+    if snapshot and entry and snapshot['version'][:2] != (entry['shard'], entry['asado_id']):
+        # El asado fue eliminado y recreado con el mismo nombre, o movido a
+        # otro shard: las versiones de la caché no sirven para pedir el delta
+        snapshot = service.get_asado_snapshot(asado_name, 0)
+    
+    if snapshot is None:
+        cache.pop(asado_name, None)
+        return None
+    
+    changes = snapshot['expenses']
+    if entry is None or changes['reset']:
+        entry = {
+            'shard': snapshot['version'][0],
+            'asado_id': changes['asado_id'],
+            'version': 0,
+            'columns': expense_rows_to_columns([]),
+            'frame': None,
+            'asado_version': None,
+            'participants': [],
+            'shares': share_rows_to_columns([]),
+            'archived': False
+        }
+    
+    if changes['reset'] or changes['version'] != entry['version']:
+        entry['columns'] = apply_expense_changes(entry['columns'], changes)
+        entry['version'] = changes['version']
+        entry['frame'] = None
+    entry['asado_version'] = snapshot['version']
+    entry['participants'] = snapshot['participants']
+    entry['shares'] = snapshot['shares']
+    entry['archived'] = snapshot['archived']
+    cache[asado_name] = entry
+    return snapshot['version'], snapshot['participants'], entry['columns'], entry['shares'], entry['archived']
+
+def get_expenses_frame(asado_name, pending=0, expenses=None):
+    """DataFrame de gastos del asado, construido una sola vez por versión de datos
+    
+    Es compartido entre páginas: no modificarlo en el lugar. Si hay gastos
+    pendientes de escribir se arma uno aparte con expenses, sin cachearlo.
+    """
+    # pandas se importa recién acá: la página de Participantes no lo necesita
+    import pandas as pd
+    
+    if pending:
+        with measure("DataFrame de gastos"):
+            return pd.DataFrame(expenses)
+    
+    entry = st.session_state.expense_cache.get(asado_name)
+    if entry is None:
+        # Un fragmento puede seguir mostrando datos de una caché ya desalojada
+        return pd.DataFrame(expenses if expenses is not None else expense_rows_to_columns([]))
+    if entry['frame'] is None:
+        with measure("DataFrame de gastos"):
+            entry['frame'] = pd.DataFrame(entry['columns'])
+    return entry['frame']
+
 def get_current_asado_data():
     """Obtener datos del asado actual"""
     if not st.session_state.current_asado:
@@ -59,14 +158,45 @@ def get_current_asado_data():
     
     service = get_asado_service()
     if service:
-        participants = service.get_participants(st.session_state.current_asado)
-        expenses = service.get_expenses(st.session_state.current_asado)
+        synced = sync_asado(st.session_state.current_asado)
+        if synced is None:
+            return {
+                'version': None,
+                'participants': [],
+                'expenses': expense_rows_to_columns([]),
+                'shares': share_rows_to_columns([]),
+                'pending': 0,
+                'archived': False
+            }
+        version, participants, expenses, shares, archived = synced
+        
+        # Gastos en la cola de escritura diferida: se muestran ya (id negativo)
+        pending = service.get_pending_expenses(st.session_state.current_asado, expenses['id'])
+        if pending:
+            pending_columns = expense_rows_to_columns(pending)
+            expenses = {
+                column: np.concatenate([expenses[column], pending_columns[column]])
+                for column in EXPENSE_COLUMNS
+            }
+            pending_shares = service.get_pending_shares(st.session_state.current_asado, expenses['id'])
+            shares = {
+                column: np.concatenate([shares[column], pending_shares[column]])
+                for column in SHARE_COLUMNS
+            }
         return {
+            'version': version,
             'participants': participants,
-            'expenses': expenses
+            'expenses': expenses,
+            'shares': shares,
+            'pending': len(pending),
+            'archived': archived
         }
     return None
 
+def count_expenses(expenses):
+    """Cantidad de gastos en la tabla columnar"""
+    return len(expenses['id'])
+
 def add_participant(name):
     """Agregar un nuevo participante al asado actual"""
     if not st.session_state.current_asado:
@@ -78,57 +208,49 @@ def add_participant(name):
         return participant is not None
     return False
 
-def add_expense(participant, category, amount, description=""):
-    """Agregar un nuevo gasto al asado actual"""
+def add_expense(participant, category, amount, description="", shares=None):
+    """Agregar un nuevo gasto al asado actual (shares: participante -> peso, o None para todos por igual)"""
     if not st.session_state.current_asado:
         return False
     
     service = get_asado_service()
     if service:
-        expense = service.add_expense(st.session_state.current_asado, participant, category, amount, description)
+        expense = service.submit_expense(st.session_state.current_asado, participant, category, amount, description, shares)
         return expense is not None
     return False
 
-def calculate_totals():
-    """Calcular totales y división de gastos del asado actual"""
-    asado_data = get_current_asado_data()
-    if not asado_data or not asado_data['expenses'] or not asado_data['participants']:
-        return None
-    
-    df = pd.DataFrame(asado_data['expenses'])
-    
-    # Total general
-    total_general = df['amount'].sum()
-    
-    # Total por participante
-    total_by_participant = df.groupby('participant')['amount'].sum()
-    
-    # Total por categoría
-    total_by_category = df.groupby('category')['amount'].sum()
-    
-    # Cantidad a pagar por persona
-    num_participants = len(asado_data['participants'])
-    amount_per_person = total_general / num_participants if num_participants > 0 else 0
-    
-    # Calcular balance (cuánto pagó cada uno vs cuánto debe pagar)
-    balance = {}
-    for participant in asado_data['participants']:
-        paid = float(total_by_participant.get(participant, 0))
-        should_pay = float(amount_per_person)
-        balance[participant] = paid - should_pay
+# Cantidad de resúmenes (shard, asado, versión) que se mantienen en memoria
+SUMMARY_CACHE_ENTRIES = 32
+
+@st.cache_resource(max_entries=SUMMARY_CACHE_ENTRIES, show_spinner=False)
+def get_summary(shard, asado_id, version, _participants, _expenses_df, _shares=None):
+    """Resumen memoizado por asado (shard e id) y versión de datos (compartido entre sesiones)
+    
+    Los argumentos con guión bajo no forman parte de la clave: la versión
+    cambia con cada alta o baja de participantes, gastos y divisiones.
+    """
+    return build_summary(_participants, _expenses_df, _shares)
+
+# Períodos de analítica entre asados que se mantienen en memoria
+ANALYTICS_CACHE_ENTRIES = 8
+
+@st.cache_resource(max_entries=ANALYTICS_CACHE_ENTRIES, show_spinner=False)
+def get_analytics(year, data_version):
+    """Analítica entre asados memoizada por período y versión de todos los datos
     
-    return {
-        'total_general': total_general,
-        'total_by_participant': total_by_participant,
-        'total_by_category': total_by_category,
-        'amount_per_person': amount_per_person,
-        'balance': balance,
-        'df': df
-    }
+    Las agregaciones se hacen en la base; data_version cambia con cada alta
+    o baja en cualquier asado, así que la consulta solo se repite entonces.
+    """
+    service = get_asado_service()
+    return build_analytics(service.get_participant_analytics(year), service.get_category_trends(year))
 
-def format_currency(amount):
-    """Formatear cantidad como moneda argentina"""
-    return f"${amount:,.2f}"
+def describe_shares(expense_ids, shares):
+    """Texto de la columna División para cada gasto ("Todos" si se divide por igual)"""
+    split = {}
+    for expense_id, participant, weight in zip(shares['expense_id'], shares['participant'], shares['weight']):
+        label = participant if weight == 1 else f"{participant} ×{weight:g}"
+        split.setdefault(int(expense_id), []).append(label)
+    return [', '.join(split[expense_id]) if expense_id in split else "Todos" for expense_id in expense_ids.tolist()]
 
 def main():
     st.title("🥩 AsadoApp")
@@ -139,23 +261,7 @@ def main():
     
     # Crear nuevo asado
     with st.sidebar.expander("Crear Nuevo Asado"):
-        # Usar un contador para crear claves únicas y reiniciar el formulario
-        if 'asado_counter' not in st.session_state:
-            st.session_state.asado_counter = 0
-            
-        new_asado_name = st.text_input("Nombre del asado:", key=f"new_asado_{st.session_state.asado_counter}")
-        if st.button("Crear Asado"):
-            if new_asado_name:
-                if create_asado(new_asado_name):
-                    st.session_state.current_asado = new_asado_name
-                    st.success(f"Asado '{new_asado_name}' creado!")
-                    # Incrementar contador para reiniciar el campo
-                    st.session_state.asado_counter += 1
-                    st.rerun()
-                else:
-                    st.error("Ya existe un asado con ese nombre")
-            else:
-                st.error("Ingresa un nombre para el asado")
+        show_create_asado_form()
     
     # Seleccionar asado actual
     service = get_asado_service()
@@ -187,42 +293,81 @@ def main():
             st.error("No se puede conectar con la base de datos. Por favor, recarga la página.")
             return
     
-    # Mostrar información del asado actual
+    # Mostrar información del asado actual (los datos se comparten con la página)
+    asado_data = get_current_asado_data()
     if st.session_state.current_asado:
-        asado_data = get_current_asado_data()
         if asado_data:
             st.sidebar.markdown(f"**Asado:** {st.session_state.current_asado}")
             st.sidebar.markdown(f"**Participantes:** {len(asado_data['participants'])}")
-            st.sidebar.markdown(f"**Gastos:** {len(asado_data['expenses'])}")
+            st.sidebar.markdown(f"**Gastos:** {count_expenses(asado_data['expenses'])}")
+            if asado_data['archived']:
+                st.sidebar.markdown("**Archivado** (solo lectura)")
     
     # Sidebar para navegación
     st.sidebar.title("Navegación")
     page = st.sidebar.selectbox(
         "Seleccionar página:",
-        ["Participantes", "Gastos", "Resumen", "Configuración"]
+        ["Participantes", "Gastos", "Resumen", "Historial", "Configuración"]
     )
+    sessions.set_page(st.session_state.session_key, page)
     
     if page == "Participantes":
-        show_participants_page()
+        show_participants_page(asado_data)
     elif page == "Gastos":
-        show_expenses_page()
+        show_expenses_page(asado_data)
     elif page == "Resumen":
-        show_summary_page()
+        show_summary_page(asado_data)
+    elif page == "Historial":
+        show_history_page()
     elif page == "Configuración":
-        show_settings_page()
+        show_settings_page(asado_data)
+
+# Fragmentos: una interacción con sus widgets vuelve a ejecutar solo el fragmento,
+# reutilizando los datos que recibió en la última ejecución completa. Las
+# escrituras llaman a st.rerun() para refrescar también la barra lateral.
+
+@st.fragment
+def show_create_asado_form():
+    # Usar un contador para crear claves únicas y reiniciar el formulario
+    if 'asado_counter' not in st.session_state:
+        st.session_state.asado_counter = 0
+    
+    new_asado_name = st.text_input("Nombre del asado:", key=f"new_asado_{st.session_state.asado_counter}")
+    if st.button("Crear Asado"):
+        if new_asado_name:
+            if create_asado(new_asado_name):
+                st.session_state.current_asado = new_asado_name
+                st.success(f"Asado '{new_asado_name}' creado!")
+                # Incrementar contador para reiniciar el campo
+                st.session_state.asado_counter += 1
+                st.rerun()
+            else:
+                st.error("Ya existe un asado con ese nombre")
+        else:
+            st.error("Ingresa un nombre para el asado")
 
-def show_participants_page():
+def show_participants_page(asado_data):
     st.header("👥 Gestión de Participantes")
     
     if not st.session_state.current_asado:
         st.warning("Selecciona un asado para gestionar participantes")
         return
     
-    asado_data = get_current_asado_data()
     if not asado_data:
         st.error("Error al obtener datos del asado")
         return
     
+    if asado_data['archived']:
+        st.info("Este asado está archivado: es de solo lectura. Se puede restaurar desde Configuración.")
+        st.subheader("Participantes")
+        for participant in asado_data['participants']:
+            st.write(f"• {participant}")
+        return
+    
+    show_participants_fragment(asado_data['participants'])
+
+@st.fragment
+def show_participants_fragment(participants):
     # Agregar nuevo participante
     st.subheader("Agregar Participante")
     
@@ -250,8 +395,8 @@ def show_participants_page():
     
     # Mostrar participantes actuales
     st.subheader("Participantes Actuales")
-    if asado_data['participants']:
-        for i, participant in enumerate(asado_data['participants']):
+    if participants:
+        for i, participant in enumerate(participants):
             col1, col2 = st.columns([4, 1])
             with col1:
                 st.write(f"• {participant}")
@@ -265,26 +410,34 @@ def show_participants_page():
         st.info("No hay participantes registrados")
     
     # Estadísticas
-    if asado_data['participants']:
+    if participants:
         st.subheader("Estadísticas")
-        st.metric("Total de participantes", len(asado_data['participants']))
+        st.metric("Total de participantes", len(participants))
 
-def show_expenses_page():
+def show_expenses_page(asado_data):
     st.header("💰 Gestión de Gastos")
     
     if not st.session_state.current_asado:
         st.warning("Selecciona un asado para gestionar gastos")
         return
     
-    asado_data = get_current_asado_data()
     if not asado_data:
         st.error("Error al obtener datos del asado")
         return
-        
+    
     if not asado_data['participants']:
         st.warning("Primero debes agregar participantes en la página de Participantes")
         return
     
+    if asado_data['archived']:
+        st.info("Este asado está archivado: es de solo lectura. Se puede restaurar desde Configuración.")
+    else:
+        show_expense_form(asado_data['participants'])
+    show_expense_search(asado_data['archived'])
+    show_expense_table(asado_data['expenses'], asado_data['shares'], asado_data['pending'])
+
+@st.fragment
+def show_expense_form(participants):
     # Agregar nuevo gasto
     st.subheader("Agregar Gasto")
     
@@ -297,7 +450,7 @@ def show_expenses_page():
     with col1:
         participant = st.selectbox(
             "Participante que pagó:",
-            asado_data['participants'],
+            participants,
             key=f"expense_participant_{st.session_state.expense_counter}"
         )
         
@@ -321,63 +474,151 @@ def show_expenses_page():
             key=f"expense_description_{st.session_state.expense_counter}"
         )
     
+    # División: por defecto entre todos y en partes iguales
+    split_between = st.multiselect(
+        "Se divide entre:",
+        participants,
+        default=participants,
+        key=f"expense_split_{st.session_state.expense_counter}"
+    )
+    weights = {}
+    with st.expander("Pesos de la división (opcional)"):
+        st.caption("Por ejemplo, 2 para quien come por dos; 0 lo excluye")
+        for i, name in enumerate(split_between):
+            weights[name] = st.number_input(
+                f"{name}:",
+                min_value=0.0,
+                value=1.0,
+                step=0.5,
+                key=f"expense_weight_{st.session_state.expense_counter}_{i}"
+            )
+    
     if st.button("Agregar Gasto", type="primary"):
-        if amount > 0:
-            add_expense(participant, category, amount, description)
+        if not any(weight > 0 for weight in weights.values()):
+            st.error("El gasto tiene que dividirse entre al menos un participante")
+        elif amount > 0:
+            # Entre todos y con el mismo peso es la división por defecto: no se guarda
+            if len(weights) == len(participants) and all(weight == 1 for weight in weights.values()):
+                shares = None
+            else:
+                shares = weights
+            add_expense(participant, category, amount, description, shares)
             st.success(f"Gasto agregado: {format_currency(amount)} - {category}")
             # Incrementar contador para reiniciar el formulario
             st.session_state.expense_counter += 1
             st.rerun()
         else:
             st.error("El monto debe ser mayor a 0")
+
+@st.fragment
+def show_expense_search(archived=False):
+    # Búsqueda por descripción, categoría o participante (con índice en la base)
+    st.subheader("Buscar Gastos")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Buscar:", placeholder="carbón, Juan, fernet...", key="expense_search_query")
+    with col2:
+        all_asados = st.checkbox("En todos los asados", key="expense_search_all")
+    
+    if not query:
+        return
+    service = get_asado_service()
+    if not service:
+        return
+    # Los gastos de los asados archivados están solo en su Parquet, sin índice de búsqueda
+    if not all_asados and archived:
+        st.info("La búsqueda no cubre asados archivados: los gastos están en la tabla de abajo")
+        return
+    if all_asados:
+        excluded = service.count_archived_asados()
+        if excluded:
+            st.caption(f"No incluye {excluded} asado(s) archivado(s)")
+    results = service.search_expenses(query, None if all_asados else st.session_state.current_asado, limit=50)
+    if not results:
+        st.info("No se encontraron gastos")
+        return
     
+    import pandas as pd
+    st.dataframe(pd.DataFrame({
+        'Asado': [row.asado for row in results],
+        'Participante': [row.participant for row in results],
+        'Categoría': [row.category for row in results],
+        'Monto': [format_currency(row.amount) for row in results],
+        'Descripción': [row.description for row in results],
+        'Fecha/Hora': [row.timestamp.strftime("%d/%m/%Y %H:%M") for row in results]
+    }), use_container_width=True)
+
+@st.fragment
+def show_expense_table(expenses, shares, pending=0):
     # Mostrar gastos actuales
     st.subheader("Gastos Registrados")
-    if asado_data['expenses']:
-        df = pd.DataFrame(asado_data['expenses'])
-        df['amount_formatted'] = df['amount'].apply(format_currency)
-        df['timestamp_formatted'] = df['timestamp'].dt.strftime("%d/%m/%Y %H:%M")
+    if count_expenses(expenses):
+        import pandas as pd
+        df = get_expenses_frame(st.session_state.current_asado, pending, expenses)
         
         # Tabla de gastos
-        display_df = df[['participant', 'category', 'amount_formatted', 'description', 'timestamp_formatted']]
-        display_df.columns = ['Participante', 'Categoría', 'Monto', 'Descripción', 'Fecha/Hora']
+        display_df = pd.DataFrame({
+            'Participante': df['participant'],
+            'Categoría': df['category'],
+            'Monto': df['amount'].apply(format_currency),
+            'División': describe_shares(expenses['id'], shares),
+            'Descripción': df['description'],
+            'Fecha/Hora': df['timestamp'].dt.strftime("%d/%m/%Y %H:%M")
+        })
         
         st.dataframe(display_df, use_container_width=True)
         
         # Opción para eliminar gastos
         with st.expander("Eliminar Gastos"):
-            for i, expense in enumerate(asado_data['expenses']):
+            for i, (expense_id, participant, category, amount) in enumerate(zip(
+                expenses['id'], expenses['participant'], expenses['category'], expenses['amount']
+            )):
                 col1, col2 = st.columns([4, 1])
                 with col1:
-                    st.write(f"{expense['participant']} - {expense['category']} - {format_currency(expense['amount'])}")
+                    st.write(f"{participant} - {category} - {format_currency(amount)}")
                 with col2:
-                    if st.button("Eliminar", key=f"del_expense_{i}"):
+                    if expense_id < 0:
+                        # Todavía en la cola de escritura: se puede eliminar cuando se guarde
+                        st.caption("Guardando...")
+                    elif st.button("Eliminar", key=f"del_expense_{i}"):
                         service = get_asado_service()
                         if service:
-                            service.remove_expense(expense['id'])
+                            service.remove_expense(int(expense_id), st.session_state.current_asado)
                             st.rerun()
     else:
         st.info("No hay gastos registrados")
 
-def show_summary_page():
+def show_summary_page(asado_data):
     st.header("📊 Resumen de Gastos")
     
     if not st.session_state.current_asado:
         st.warning("Selecciona un asado para ver el resumen")
         return
     
-    asado_data = get_current_asado_data()
-    if not asado_data:
+    if not asado_data or not asado_data['version']:
         st.error("Error al obtener datos del asado")
         return
     
-    if not asado_data['expenses']:
+    if not count_expenses(asado_data['expenses']):
         st.warning("No hay gastos registrados para mostrar")
         return
     
-    # Calcular totales
-    totals = calculate_totals()
-    if not totals:
+    # Calcular totales (o reutilizar los de esta versión)
+    if asado_data['pending']:
+        # Con gastos sin escribir la versión no los refleja: no se cachea
+        summary = build_summary(
+            asado_data['participants'],
+            get_expenses_frame(st.session_state.current_asado, asado_data['pending'], asado_data['expenses']),
+            asado_data['shares']
+        )
+    else:
+        summary = get_summary(
+            *asado_data['version'],
+            asado_data['participants'],
+            get_expenses_frame(st.session_state.current_asado),
+            asado_data['shares']
+        )
+    if not summary:
         st.error("Error al calcular totales")
         return
     
@@ -385,124 +626,101 @@ def show_summary_page():
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Total General", format_currency(totals['total_general']))
+        st.metric("Total General", format_currency(summary['total_general']))
     
     with col2:
-        st.metric("Por Persona", format_currency(totals['amount_per_person']))
+        st.metric("Promedio por Persona" if summary['weighted'] else "Por Persona", format_currency(summary['amount_per_person']))
     
     with col3:
-        st.metric("Participantes", len(asado_data['participants']))
+        st.metric("Participantes", summary['num_participants'])
     
     # Gráfico de gastos por categoría
     st.subheader("Gastos por Categoría")
-    if len(totals['total_by_category']) > 0:
-        fig_category = px.pie(
-            values=totals['total_by_category'].values,
-            names=totals['total_by_category'].index,
-            title="Distribución de Gastos por Categoría"
-        )
-        st.plotly_chart(fig_category, use_container_width=True)
+    if summary['category_figure']:
+        st.plotly_chart(json.loads(summary['category_figure']), use_container_width=True)
     
     # Gráfico de gastos por participante
     st.subheader("Gastos por Participante")
-    if len(totals['total_by_participant']) > 0:
-        fig_participant = px.bar(
-            x=totals['total_by_participant'].index,
-            y=totals['total_by_participant'].values,
-            title="Gastos Pagados por Participante",
-            labels={'x': 'Participante', 'y': 'Monto ($)'}
-        )
-        st.plotly_chart(fig_participant, use_container_width=True)
+    if summary['participant_figure']:
+        st.plotly_chart(json.loads(summary['participant_figure']), use_container_width=True)
     
     # Balance de pagos
     st.subheader("Balance de Pagos")
     st.write("Resumen de pagos y transferencias necesarias:")
+    st.dataframe(summary['balance_df'], use_container_width=True)
     
-    # Mostrar balance general
-    balance_data = []
-    deudores = []
-    acreedores = []
-    
-    for participant, balance in totals['balance'].items():
-        if balance > 0.01:  # Debe recibir (acreedor)
-            status = "Debe recibir"
-            acreedores.append((participant, balance))
-        elif balance < -0.01:  # Debe pagar (deudor)
-            status = "Debe pagar"
-            deudores.append((participant, abs(balance)))
-        else:  # Está al día
-            status = "Está al día"
-        
-        balance_data.append({
-            'Participante': participant,
-            'Balance': format_currency(abs(balance)),
-            'Estado': status
-        })
-    
-    balance_df = pd.DataFrame(balance_data)
-    st.dataframe(balance_df, use_container_width=True)
-    
-    # Calcular transferencias específicas
-    if deudores and acreedores:
+    # Transferencias específicas
+    if summary['transfers']:
         st.subheader("💰 Transferencias Necesarias")
         st.write("Quién le debe pagar a quién:")
+        st.dataframe(summary['transfers_df'], use_container_width=True)
         
-        # Ordenar por montos (mayor a menor)
-        deudores.sort(key=lambda x: x[1], reverse=True)
-        acreedores.sort(key=lambda x: x[1], reverse=True)
-        
-        transferencias = []
-        deudores_copy = deudores.copy()
-        acreedores_copy = acreedores.copy()
-        
-        while deudores_copy and acreedores_copy:
-            deudor_name, deuda = deudores_copy[0]
-            acreedor_name, credito = acreedores_copy[0]
-            
-            # El monto a transferir es el menor entre la deuda y el crédito
-            monto_transferencia = min(deuda, credito)
-            
-            transferencias.append({
-                'De': deudor_name,
-                'Para': acreedor_name,
-                'Monto': format_currency(monto_transferencia)
-            })
-            
-            # Actualizar los montos
-            deudores_copy[0] = (deudor_name, deuda - monto_transferencia)
-            acreedores_copy[0] = (acreedor_name, credito - monto_transferencia)
-            
-            # Remover si ya no deben nada
-            if deudores_copy[0][1] <= 0.01:
-                deudores_copy.pop(0)
-            if acreedores_copy[0][1] <= 0.01:
-                acreedores_copy.pop(0)
-        
-        if transferencias:
-            transferencias_df = pd.DataFrame(transferencias)
-            st.dataframe(transferencias_df, use_container_width=True)
-            
-            # Mostrar resumen en formato más legible
-            st.write("**Instrucciones de pago:**")
-            for i, transfer in enumerate(transferencias, 1):
-                st.write(f"{i}. **{transfer['De']}** debe pagar **{transfer['Monto']}** a **{transfer['Para']}**")
-        else:
-            st.info("No hay transferencias necesarias, todos están al día")
+        # Mostrar resumen en formato más legible
+        st.write("**Instrucciones de pago:**")
+        for i, transfer in enumerate(summary['transfers'], 1):
+            st.write(f"{i}. **{transfer['De']}** debe pagar **{transfer['Monto']}** a **{transfer['Para']}**")
     else:
         st.info("No hay transferencias necesarias, todos están al día")
     
     # Resumen detallado por categoría
     st.subheader("Detalle por Categoría")
-    category_summary = totals['df'].groupby('category').agg({
-        'amount': ['sum', 'count', 'mean']
-    }).round(2)
-    category_summary.columns = ['Total', 'Cantidad', 'Promedio']
-    category_summary['Total'] = category_summary['Total'].apply(format_currency)
-    category_summary['Promedio'] = category_summary['Promedio'].apply(format_currency)
+    st.dataframe(summary['category_summary'], use_container_width=True)
+
+def show_history_page():
+    st.header("📈 Historial de Todos los Asados")
     
-    st.dataframe(category_summary, use_container_width=True)
+    service = get_asado_service()
+    if not service:
+        return
+    
+    # La analítica se agrega en la base: los asados archivados no tienen filas ahí
+    excluded = service.count_archived_asados()
+    if excluded:
+        st.caption(f"No incluye {excluded} asado(s) archivado(s); para sumarlos hay que restaurarlos desde Configuración")
+    
+    years = service.get_expense_years()
+    if not years:
+        st.warning("No hay gastos registrados para mostrar")
+        return
+    
+    period = st.selectbox("Período:", ["Todos los años"] + years)
+    year = None if period == "Todos los años" else period
+    analytics = get_analytics(year, service.get_data_version())
+    if not analytics:
+        st.warning("No hay gastos registrados en el período")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Total Gastado", format_currency(analytics['total_paid']))
+    with col2:
+        st.metric("Participantes", analytics['num_participants'])
+    
+    # Participantes entre asados
+    st.subheader("Por Participante")
+    st.caption("Un mismo nombre en distintos asados se cuenta como la misma persona")
+    st.dataframe(analytics['totals_df'], use_container_width=True)
+    show_participant_history(analytics)
+    
+    # Tendencias por categoría
+    st.subheader("Tendencias por Categoría")
+    if analytics['trend_figure']:
+        st.plotly_chart(json.loads(analytics['trend_figure']), use_container_width=True)
+    st.dataframe(analytics['trend_df'], use_container_width=True)
 
-def show_settings_page():
+@st.fragment
+def show_participant_history(analytics):
+    participants = analytics['participants']
+    participant = st.selectbox(
+        "Ver mes a mes:",
+        list(participants),
+        format_func=participants.get
+    )
+    table, figure = build_participant_history(analytics['months'], participant)
+    st.plotly_chart(json.loads(figure), use_container_width=True)
+    st.dataframe(table, use_container_width=True)
+
+def show_settings_page(asado_data):
     st.header("⚙️ Configuración")
     
     # Gestión de asados
@@ -511,28 +729,31 @@ def show_settings_page():
     service = get_asado_service()
     if service:
         try:
-            asados = service.get_all_asados()
+            # Conteos de todos los asados en una sola consulta agrupada
+            asados = service.get_asado_stats()
             if asados:
                 st.write("Asados creados:")
                 for asado in asados:
-                    try:
-                        asado_data = {
-                            'participants': service.get_participants(str(asado.name)),
-                            'expenses': service.get_expenses(str(asado.name))
-                        }
-                        col1, col2, col3 = st.columns([3, 2, 1])
-                        with col1:
-                            st.write(f"• **{str(asado.name)}**")
-                        with col2:
-                            st.write(f"Participantes: {len(asado_data['participants'])}, Gastos: {len(asado_data['expenses'])}")
-                        with col3:
-                            if st.button("Eliminar", key=f"del_asado_{str(asado.name)}"):
-                                service.delete_asado(str(asado.name))
-                                if st.session_state.current_asado == str(asado.name):
-                                    st.session_state.current_asado = None
+                    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+                    with col1:
+                        st.write(f"• **{asado.name}**" + (" (archivado)" if asado.archived_date else ""))
+                    with col2:
+                        st.write(f"Participantes: {asado.participants}, Gastos: {asado.expenses}")
+                    with col3:
+                        # Archivar pasa los datos a un Parquet y deja el asado de solo lectura
+                        if asado.archived_date:
+                            if st.button("Restaurar", key=f"restore_asado_{asado.name}"):
+                                service.restore_asado(asado.name)
                                 st.rerun()
-                    except Exception as e:
-                        st.write(f"• **{str(asado.name)}** (Error cargando datos)")
+                        elif st.button("Archivar", key=f"archive_asado_{asado.name}"):
+                            service.archive_asado(asado.name)
+                            st.rerun()
+                    with col4:
+                        if st.button("Eliminar", key=f"del_asado_{asado.name}"):
+                            service.delete_asado(asado.name)
+                            if st.session_state.current_asado == asado.name:
+                                st.session_state.current_asado = None
+                            st.rerun()
             else:
                 st.info("No hay asados creados")
         except Exception as e:
@@ -540,52 +761,16 @@ def show_settings_page():
     
     # Agregar categorías personalizadas
     st.subheader("Categorías Personalizadas")
-    
-    # Usar un contador para crear claves únicas y reiniciar el formulario
-    if 'category_counter' not in st.session_state:
-        st.session_state.category_counter = 0
-    
-    col1, col2 = st.columns([3, 1])
-    with col1:
-        new_category = st.text_input("Nueva categoría:", key=f"new_category_{st.session_state.category_counter}")
-    
-    with col2:
-        if st.button("Agregar Categoría"):
-            if new_category and new_category not in get_all_categories():
-                service = get_asado_service()
-                if service:
-                    service.add_custom_category(new_category)
-                    st.success(f"Categoría '{new_category}' agregada!")
-                    # Incrementar contador para reiniciar el campo
-                    st.session_state.category_counter += 1
-                    st.rerun()
-            else:
-                st.error("La categoría ya existe o está vacía")
-    
-    # Mostrar categorías personalizadas
-    service = get_asado_service()
-    if service:
-        custom_categories = service.get_custom_categories()
-        if custom_categories:
-            st.write("Categorías personalizadas:")
-            for i, category in enumerate(custom_categories):
-                col1, col2 = st.columns([4, 1])
-                with col1:
-                    st.write(f"• {category}")
-                with col2:
-                    if st.button("Eliminar", key=f"del_category_{i}"):
-                        service.remove_custom_category(str(category))
-                        st.rerun()
+    show_custom_categories()
     
     # Exportar/Importar datos
     st.subheader("Gestión de Datos")
     
     # Exportar datos del asado actual
     if st.session_state.current_asado:
-        asado_data = get_current_asado_data()
         if st.button("Exportar Datos del Asado Actual"):
-            if asado_data and asado_data['expenses']:
-                df = pd.DataFrame(asado_data['expenses'])
+            if asado_data and count_expenses(asado_data['expenses']):
+                df = get_expenses_frame(st.session_state.current_asado)
                 csv = df.to_csv(index=False)
                 st.download_button(
                     label="Descargar CSV",
@@ -596,6 +781,11 @@ def show_settings_page():
             else:
                 st.warning("No hay datos para exportar en este asado")
     
+    # Memoria de las sesiones de este proceso
+    st.subheader("Memoria")
+    with st.expander("Sesiones que más memoria retienen"):
+        show_memory_diagnostics()
+    
     # Limpiar datos
     st.subheader("Reiniciar Aplicación")
     st.warning("Esta acción eliminará todos los asados y datos registrados")
@@ -618,5 +808,112 @@ def show_settings_page():
                 st.success("Todos los datos han sido eliminados")
                 st.rerun()
 
+def show_memory_diagnostics():
+    """Diagnóstico del registro de sesiones de memory.py (solo este proceso)"""
+    import pandas as pd
+    
+    reports = sessions.report()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Sesiones", len(reports))
+    with col2:
+        st.metric("Cachés de sesión", format_bytes(sum(report.cache_bytes for report in reports)))
+    with col3:
+        st.metric("Pico de memoria del proceso", format_bytes(peak_rss()))
+    
+    st.dataframe(pd.DataFrame([
+        {
+            'Sesión': report.key[:8] + (" (esta)" if report.key == st.session_state.session_key else ""),
+            'Página': report.page,
+            'Inactiva (min)': round(report.idle_seconds / 60, 1),
+            'Reruns': report.reruns,
+            'Asados en caché': report.asados,
+            'Caché': format_bytes(report.cache_bytes),
+            'Último rerun': format_bytes(report.allocated),
+            'Pico del rerun': format_bytes(report.peak),
+            'Desalojos': report.evictions
+        }
+        for report in reports[:20]
+    ]), use_container_width=True)
+    
+    idle_minutes = sessions.idle_seconds / 60
+    st.caption(
+        (f"Las cachés de sesiones inactivas más de {idle_minutes:g} min se liberan. " if idle_minutes else "")
+        + (f"Límite total de cachés: {format_bytes(sessions.cache_limit)}." if sessions.cache_limit else "Sin límite total de cachés.")
+    )
+    
+    sections = sessions.page_report() + section_report()
+    if sections:
+        st.write("Memoria por página y por sección (tracemalloc):")
+        st.dataframe(pd.DataFrame([
+            {
+                'Página o sección': section.name,
+                'Veces': section.calls,
+                'Pico promedio': format_bytes(section.mean_peak),
+                'Pico máximo': format_bytes(section.max_peak),
+                'Asignado (última)': format_bytes(section.allocated)
+            }
+            for section in sections
+        ]), use_container_width=True)
+    else:
+        st.caption("Con ASADO_MEMORY_TRACE=1 se mide además la memoria de cada rerun, página y sección.")
+
+def submit_custom_category():
+    """Callback de "Agregar Categoría": escribe antes del rerun del fragmento"""
+    new_category = st.session_state.get(f"new_category_{st.session_state.category_counter}")
+    service = get_asado_service()
+    if new_category and service and new_category not in service.categories:
+        service.add_custom_category(new_category)
+        st.session_state.category_message = ('success', f"Categoría '{new_category}' agregada!")
+        # Incrementar contador para reiniciar el campo
+        st.session_state.category_counter += 1
+    else:
+        st.session_state.category_message = ('error', "La categoría ya existe o está vacía")
+
+def delete_custom_category(category):
+    """Callback para eliminar una categoría personalizada"""
+    service = get_asado_service()
+    if service:
+        service.remove_custom_category(category)
+
+@st.fragment
+def show_custom_categories():
+    # Las categorías solo se muestran acá: agregar o eliminar una (en callbacks)
+    # vuelve a ejecutar únicamente este fragmento.
+    
+    # Usar un contador para crear claves únicas y reiniciar el formulario
+    if 'category_counter' not in st.session_state:
+        st.session_state.category_counter = 0
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.text_input("Nueva categoría:", key=f"new_category_{st.session_state.category_counter}")
+    
+    with col2:
+        st.button("Agregar Categoría", on_click=submit_custom_category)
+    
+    message = st.session_state.pop('category_message', None)
+    if message:
+        level, text = message
+        if level == 'success':
+            st.success(text)
+        else:
+            st.error(text)
+    
+    # Mostrar categorías personalizadas
+    service = get_asado_service()
+    if service:
+        custom_categories = service.categories.custom()
+        if custom_categories:
+            st.write("Categorías personalizadas:")
+            for i, category in enumerate(custom_categories):
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    st.write(f"• {category}")
+                with col2:
+                    st.button("Eliminar", key=f"del_category_{i}", on_click=delete_custom_category, args=(str(category),))
+
 if __name__ == "__main__":
-    main()
+    # Cada rerun completo cuenta como actividad de la sesión y se mide
+    with sessions.rerun(st.session_state.session_key, st.session_state.expense_cache):
+        main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Archivo en frío de asados terminados
+
+Los asados viejos son de solo lectura, pero sus filas siguen pesando en
+cada índice, backup y vacuum. Archivar un asado mueve sus participantes,
+gastos y divisiones a un Parquet comprimido por asado (en ASADO_ARCHIVE_DIR)
+y deja en la base la fila del asado con un stub de totales precalculados
+(tabla asado_archives). AsadoService sirve las lecturas de un asado
+archivado desde su archivo, abierto con memory map, sin volver a
+importarlo; restaurarlo lo devuelve a las tablas.
+
+Uso:
+    python archive.py --idle-days 180
+    python archive.py --asado "Asado de fin de año"
+    python archive.py --restore "Asado de fin de año"
+"""
+
+import os
+import json
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import NamedTuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Versión del formato del archivo (va en los metadatos del Parquet)
+ARCHIVE_FORMAT = 1
+ARCHIVE_METADATA_KEY = b'asadoapp'
+
+class ArchivedAsado(NamedTuple):
+    """Contenido de un asado archivado, en los formatos columnares del servicio"""
+    asado_id: int
+    name: str
+    participants: list
+    expenses: dict
+    shares: dict
+
+def archive_dir():
+    return os.getenv('ASADO_ARCHIVE_DIR', 'archive')
+
+def archive_file(asado_id: int, shard: str = None):
+    """Ruta absoluta del Parquet de un asado (por id: el nombre puede tener cualquier carácter)
+    
+    Los ids son de cada base: con shards cada uno usa su subdirectorio.
+    """
+    return os.path.abspath(os.path.join(archive_dir(), shard or '', f"asado_{asado_id}.parquet"))
+
+def _schema(pa):
+    share = pa.struct([('participant', pa.string()), ('weight', pa.float64())])
+    return pa.schema([
+        ('id', pa.int64()), ('participant', pa.string()), ('category', pa.string()),
+        ('amount', pa.float64()), ('description', pa.string()), ('timestamp', pa.timestamp('us')),
+        ('shares', pa.list_(share))
+    ])
+
+def write_archive(path: str, metadata: dict, expenses: dict, shares: dict):
+    """Escribir un asado en un Parquet comprimido con zstd
+    
+    expenses y shares vienen en formato columnar (EXPENSE_COLUMNS y
+    SHARE_COLUMNS, ordenados por id de gasto); las divisiones van como una
+    columna lista por gasto. metadata (asado, participantes, totales) va en
+    los metadatos del archivo. Se escribe a un temporal y se renombra.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    # Posición de cada peso en la tabla de gastos y offsets de la columna lista
+    positions = np.searchsorted(expenses['id'], shares['expense_id'])
+    order = np.argsort(positions, kind='stable')
+    counts = np.bincount(positions, minlength=len(expenses['id']))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+    share_values = pa.StructArray.from_arrays(
+        [pa.array(shares['participant'][order], pa.string()), pa.array(shares['weight'][order], pa.float64())],
+        names=['participant', 'weight']
+    )
+    
+    schema = _schema(pa).with_metadata({
+        ARCHIVE_METADATA_KEY: json.dumps({'format': ARCHIVE_FORMAT, **metadata}, ensure_ascii=False, default=str)
+    })
+    table = pa.Table.from_arrays([
+        pa.array(expenses['id'], pa.int64()),
+        pa.array(expenses['participant'], pa.string()),
+        pa.array(expenses['category'], pa.string()),
+        pa.array(expenses['amount'], pa.float64()),
+        pa.array(expenses['description'], pa.string()),
+        pa.array(expenses['timestamp'], pa.timestamp('us')),
+        pa.ListArray.from_arrays(pa.array(offsets), share_values)
+    ], schema=schema)
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.tmp"
+    pq.write_table(table, temporary, compression='zstd')
+    os.replace(temporary, path)
+
+def read_archive_metadata(path: str):
+    """Metadatos de un asado archivado (solo lee el footer del Parquet)"""
+    import pyarrow.parquet as pq
+    return json.loads(pq.read_schema(path, memory_map=True).metadata[ARCHIVE_METADATA_KEY])
+
+def read_archive(path: str):
+    """Leer un asado archivado (memory map) como ArchivedAsado"""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    
+    table = pq.read_table(path, memory_map=True)
+    metadata = json.loads(table.schema.metadata[ARCHIVE_METADATA_KEY])
+    ids = table.column('id').to_numpy()
+    expenses = {
+        'id': ids,
+        'participant': table.column('participant').to_numpy().astype(object),
+        'category': table.column('category').to_numpy().astype(object),
+        'amount': table.column('amount').to_numpy(),
+        'description': table.column('description').to_numpy().astype(object),
+        'timestamp': table.column('timestamp').to_numpy()
+    }
+    
+    shares = table.column('shares').combine_chunks()
+    values = shares.flatten()
+    parents = pc.list_parent_indices(shares).to_numpy()
+    return ArchivedAsado(
+        asado_id=metadata['asado_id'],
+        name=metadata['name'],
+        participants=[tuple(participant) for participant in metadata['participants']],
+        expenses=expenses,
+        shares={
+            'expense_id': ids[parents],
+            'participant': values.field('participant').to_numpy(zero_copy_only=False).astype(object),
+            'weight': values.field('weight').to_numpy()
+        }
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--idle-days", type=int, help="Archivar los asados sin cambios hace más de N días")
+    group.add_argument("--asado", action="append", help="Archivar este asado (se puede repetir)")
+    group.add_argument("--restore", action="append", help="Restaurar este asado a las tablas (se puede repetir)")
+    args = parser.parse_args()
+    
+    # Sin initialize_database: no hace falta listener ni cola de escritura
+    from database import create_asado_service
+    service = create_asado_service()
+    if args.restore:
+        for name in args.restore:
+            if service.restore_asado(name):
+                logger.info(f"Asado {name} restaurado")
+            else:
+                logger.warning(f"No existe el asado archivado {name}")
+        return
+    
+    names = args.asado or service.get_idle_asados(datetime.now() - timedelta(days=args.idle_days))
+    for name in names:
+        if service.archive_asado(name):
+            logger.info(f"Asado {name} archivado")
+        else:
+            logger.warning(f"No existe el asado {name} o ya está archivado")
+
+if __name__ == "__main__":
+    main()
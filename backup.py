@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Backup y restauración de toda la base
+
+El backup lee cada tabla con COPY ... TO STDOUT (en SQLite, con un cursor
+en tandas) en el formato de texto de COPY y la escribe partida en chunks
+comprimidos con gzip dentro de un único archivo tar, junto con los Parquet
+de los asados archivados y un manifiesto con las columnas, las filas y el
+SHA-256 de cada chunk. Todo se lee en una misma transacción y la memoria
+no depende del tamaño de la base: se procesa un bloque de COPY por vez y
+cada chunk se comprime a un temporal en disco.
+
+La restauración carga las tablas en orden de dependencias con COPY ...
+FROM STDIN (en SQLite, INSERT en tandas) en una sola transacción y sobre
+una base vacía: borra los índices secundarios, los de búsqueda y las
+claves foráneas y los vuelve a crear al final, verifica cada checksum
+antes de confirmar y reinicia las secuencias de ids.
+
+Uso:
+    python backup.py backup asadoapp.backup
+    python backup.py backup asadoapp.backup --level 6 --chunk-mb 128
+    python backup.py restore asadoapp.backup
+    python backup.py backup shard_a.backup --shard a
+
+Con DATABASE_SHARDS cada shard se respalda por separado con --shard (la
+base global, DATABASE_URL, sin --shard).
+"""
+
+import io
+import os
+import re
+import json
+import gzip
+import time
+import hashlib
+import logging
+import argparse
+import tarfile
+import tempfile
+from datetime import datetime
+from sqlalchemy import select, literal, text
+from database import Base, AsadoArchive, DatabaseManager
+from archive import archive_file
+from search import setup_search, drop_search_indexes
+
+logger = logging.getLogger(__name__)
+
+BACKUP_FORMAT = 1
+MANIFEST_NAME = 'manifest.json'
+# Bytes sin comprimir por chunk y por bloque de lectura
+CHUNK_BYTES = 64 * 1024 * 1024
+BLOCK_BYTES = 1024 * 1024
+# Filas por tanda al leer de SQLite
+SQLITE_BATCH = 10000
+
+# Formato de texto de COPY: campos separados por tab, \N para NULL y
+# barra invertida para escapar tabs, saltos de línea y la barra misma
+_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v'}
+_ESCAPE_PATTERN = re.compile(r'[\\\t\n\r]')
+_UNESCAPE_PATTERN = re.compile(r'\\(.)')
+
+def format_value(value):
+    """Valor en el formato de texto de COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return _ESCAPE_PATTERN.sub(lambda match: _ESCAPES[match.group()], value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+def parse_value(field: str):
+    """Valor de un campo en el formato de texto de COPY (siempre texto o None)"""
+    if field == '\\N':
+        return None
+    if '\\' in field:
+        return _UNESCAPE_PATTERN.sub(lambda match: _UNESCAPES.get(match.group(1), match.group(1)), field)
+    return field
+
+class ChunkWriter:
+    """Recibe el texto de COPY de una tabla y lo escribe en chunks gzip dentro del tar
+    
+    Corta solo en fin de fila (un salto de línea dentro de un valor va
+    escapado), así cada chunk se puede cargar por separado.
+    """
+    
+    def __init__(self, tar, table: str, chunk_bytes: int, level: int):
+        self.tar = tar
+        self.table = table
+        self.chunk_bytes = chunk_bytes
+        self.level = level
+        self.chunks = []
+        self._partial = b''
+        self._file = None
+    
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        data = self._partial + bytes(data)
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end:]
+        if end:
+            self._write_rows(data[:end])
+    
+    def _write_rows(self, rows: bytes):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+            self._gzip = gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=self.level, mtime=0)
+            self._hash = hashlib.sha256()
+            self._bytes = 0
+            self._rows = 0
+        self._gzip.write(rows)
+        self._hash.update(rows)
+        self._bytes += len(rows)
+        self._rows += rows.count(b'\n')
+        if self._bytes >= self.chunk_bytes:
+            self._close_chunk()
+    
+    def _close_chunk(self):
+        self._gzip.close()
+        name = f"{self.table}/{len(self.chunks):05d}.tsv.gz"
+        info = tarfile.TarInfo(name)
+        info.size = self._file.tell()
+        info.mtime = int(time.time())
+        self._file.seek(0)
+        self.tar.addfile(info, self._file)
+        self._file.close()
+        self._file = None
+        self.chunks.append({'file': name, 'rows': self._rows, 'bytes': self._bytes, 'sha256': self._hash.hexdigest()})
+    
+    def close(self):
+        """Cerrar el último chunk y devolver la lista de chunks para el manifiesto"""
+        if self._partial:
+            raise ValueError(f"El volcado de {self.table} terminó a mitad de una fila")
+        if self._file is not None:
+            self._close_chunk()
+        return self.chunks
+
+class ChunkReader:
+    """Un chunk del backup descomprimido a medida que se lee, con su SHA-256"""
+    
+    def __init__(self, tar, chunk: dict):
+        self.chunk = chunk
+        self._gzip = gzip.GzipFile(fileobj=tar.extractfile(chunk['file']), mode='rb')
+        self._hash = hashlib.sha256()
+        self._bytes = 0
+    
+    def read(self, size: int = -1):
+        data = self._gzip.read(size)
+        self._hash.update(data)
+        self._bytes += len(data)
+        return data
+    
+    def blocks(self):
+        while True:
+            block = self.read(BLOCK_BYTES)
+            if not block:
+                return
+            yield block
+    
+    def verify(self):
+        """Verificar que se leyó el chunk completo y sin cambios"""
+        if self._bytes != self.chunk['bytes'] or self._hash.hexdigest() != self.chunk['sha256']:
+            raise ValueError(f"Checksum inválido en {self.chunk['file']}")
+
+def backup_tables():
+    """Tablas del modelo en orden de dependencias
+    
+    Solo se copian las columnas del modelo: las que agrega la base (como
+    expenses.search_vector, generada) se recalculan al restaurar.
+    """
+    return Base.metadata.sorted_tables
+
+def _copy_out(connection, table: str, columns, sink):
+    """Volcar una tabla en formato de texto de COPY sobre sink.write"""
+    column_list = ', '.join(columns)
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        if connection.dialect.name == 'postgresql':
+            sql = f"COPY {table} ({column_list}) TO STDOUT"
+            if hasattr(cursor, 'copy'):
+                # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for block in copy:
+                        sink.write(block)
+            else:
+                cursor.copy_expert(sql, sink, size=BLOCK_BYTES)
+        else:
+            cursor.execute(f"SELECT {column_list} FROM {table}")
+            while True:
+                rows = cursor.fetchmany(SQLITE_BATCH)
+                if not rows:
+                    break
+                sink.write(''.join('\t'.join(map(format_value, row)) + '\n' for row in rows).encode('utf-8'))
+    finally:
+        cursor.close()
+
+def _parse_rows(reader):
+    """Tandas de filas (listas de valores) de un chunk en formato de texto de COPY"""
+    partial = b''
+    for block in reader.blocks():
+        data = partial + block
+        end = data.rfind(b'\n') + 1
+        partial = data[end:]
+        lines = data[:end].decode('utf-8').split('\n')
+        yield [[parse_value(field) for field in line.split('\t')] for line in lines[:-1]]
+    if partial:
+        raise ValueError(f"{reader.chunk['file']} termina a mitad de una fila")
+
+def _copy_in(connection, table: str, columns, reader):
+    """Cargar un chunk en una tabla (COPY FROM STDIN en PostgreSQL)"""
+    column_list = ', '.join(columns)
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        if connection.dialect.name == 'postgresql':
+            sql = f"COPY {table} ({column_list}) FROM STDIN"
+            if hasattr(cursor, 'copy'):
+                with cursor.copy(sql) as copy:
+                    for block in reader.blocks():
+                        copy.write(block)
+            else:
+                cursor.copy_expert(sql, reader, size=BLOCK_BYTES)
+        else:
+            # Los valores llegan como texto: la afinidad de cada columna los convierte
+            sql = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join('?' * len(columns))})"
+            for rows in _parse_rows(reader):
+                cursor.executemany(sql, rows)
+    finally:
+        cursor.close()
+
+def _drop_foreign_keys(connection, tables):
+    """Borrar las claves foráneas de las tablas (PostgreSQL)
+    
+    Validarlas fila por fila durante COPY cuesta más que la carga misma;
+    al volver a crearlas se validan con una sola consulta por clave.
+    Devuelve (tabla, nombre, definición) de cada una para recrearlas.
+    """
+    foreign_keys = connection.execute(text(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE contype = 'f' AND conrelid::regclass::text = ANY(:tables)"
+    ), {'tables': list(tables)}).all()
+    for table, name, _ in foreign_keys:
+        connection.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+    return foreign_keys
+
+def _file_sha256(path: str):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def backup_database(engine, path: str, chunk_bytes: int = CHUNK_BYTES, level: int = 1):
+    """Escribir un backup completo de la base en path (ver el docstring del módulo)
+    
+    Devuelve el manifiesto.
+    """
+    manifest = {
+        'format': BACKUP_FORMAT,
+        'created': datetime.now().isoformat(),
+        'dialect': engine.dialect.name,
+        'tables': [],
+        'archives': []
+    }
+    temporary = f"{path}.tmp"
+    try:
+        with tarfile.open(temporary, 'w') as tar, engine.connect() as connection:
+            # Una sola foto de todas las tablas
+            if connection.dialect.name == 'postgresql':
+                connection.exec_driver_sql("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            else:
+                connection.exec_driver_sql("BEGIN")
+            
+            for table in backup_tables():
+                columns = [column.name for column in table.columns]
+                writer = ChunkWriter(tar, table.name, chunk_bytes, level)
+                _copy_out(connection, table.name, columns, writer)
+                manifest['tables'].append({'name': table.name, 'columns': columns, 'chunks': writer.close()})
+            
+            # Los datos de los asados archivados están fuera de la base
+            for asado_id, archive_path in connection.execute(select(AsadoArchive.asado_id, AsadoArchive.path)):
+                name = f"archives/asado_{asado_id}.parquet"
+                manifest['archives'].append({
+                    'asado_id': asado_id,
+                    'file': name,
+                    'bytes': os.path.getsize(archive_path),
+                    'sha256': _file_sha256(archive_path)
+                })
+                tar.add(archive_path, arcname=name)
+            
+            data = json.dumps(manifest, indent=2).encode('utf-8')
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            connection.rollback()
+        os.replace(temporary, path)
+    except Exception:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return manifest
+
+def restore_database(engine, path: str, shard: str = None):
+    """Cargar un backup en una base vacía (con las tablas ya creadas)
+    
+    Todo en una transacción: si un checksum no coincide o algo falla no
+    queda nada cargado. Los Parquet de asados archivados van al directorio
+    del shard (ver archive_file): se extraen con un nombre temporal y se
+    renombran a su lugar recién después del commit, sin pisar archivos que
+    ya existan. Devuelve {tabla: filas}.
+    """
+    tables = {table.name: table for table in backup_tables()}
+    # (archivo temporal, destino) de cada Parquet extraído
+    staged = []
+    with tarfile.open(path, 'r') as tar:
+        manifest = json.load(tar.extractfile(MANIFEST_NAME))
+        if manifest.get('format') != BACKUP_FORMAT:
+            raise ValueError(f"Formato de backup desconocido: {manifest.get('format')}")
+        unknown = [entry['name'] for entry in manifest['tables'] if entry['name'] not in tables]
+        if unknown:
+            raise ValueError(f"El backup tiene tablas que este modelo no conoce: {', '.join(unknown)}")
+        
+        counts = {}
+        try:
+            with engine.begin() as connection:
+                for table in tables.values():
+                    if connection.execute(select(literal(1)).select_from(table).limit(1)).first():
+                        raise ValueError(f"La base no está vacía ({table.name} tiene filas)")
+                
+                # Índices afuera durante la carga; se construyen una vez al final
+                for table in tables.values():
+                    for index in table.indexes:
+                        index.drop(bind=connection, checkfirst=True)
+                drop_search_indexes(connection)
+                foreign_keys = _drop_foreign_keys(connection, tables) if connection.dialect.name == 'postgresql' else []
+                
+                for entry in manifest['tables']:
+                    for chunk in entry['chunks']:
+                        reader = ChunkReader(tar, chunk)
+                        _copy_in(connection, entry['name'], entry['columns'], reader)
+                        reader.verify()
+                    counts[entry['name']] = sum(chunk['rows'] for chunk in entry['chunks'])
+                
+                for table, name, definition in foreign_keys:
+                    connection.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'))
+                for table in tables.values():
+                    for index in table.indexes:
+                        index.create(bind=connection)
+                
+                for archive in manifest['archives']:
+                    target = archive_file(archive['asado_id'], shard)
+                    if os.path.exists(target):
+                        raise ValueError(f"Ya existe {target}: no se sobrescribe el archivo de otro asado")
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    descriptor, temporary = tempfile.mkstemp(
+                        dir=os.path.dirname(target), prefix=f".{os.path.basename(target)}.", suffix='.restoring'
+                    )
+                    staged.append((temporary, target))
+                    with tar.extractfile(archive['file']) as source, os.fdopen(descriptor, 'wb') as output:
+                        for block in iter(lambda: source.read(BLOCK_BYTES), b''):
+                            output.write(block)
+                    if _file_sha256(temporary) != archive['sha256']:
+                        raise ValueError(f"Checksum inválido en {archive['file']}")
+                    connection.execute(
+                        AsadoArchive.__table__.update().where(
+                            AsadoArchive.asado_id == archive['asado_id']
+                        ).values(path=target)
+                    )
+                
+                if connection.dialect.name == 'postgresql':
+                    for table in tables.values():
+                        primary_key = list(table.primary_key.columns)
+                        if len(primary_key) == 1:
+                            # Sin secuencia (p. ej. asado_archives) setval recibe NULL y no hace nada
+                            connection.execute(text(
+                                f"SELECT setval(pg_get_serial_sequence('{table.name}', '{primary_key[0].name}'), "
+                                f"coalesce(max({primary_key[0].name}), 0) + 1, false) FROM {table.name}"
+                            ))
+                        connection.execute(text(f"ANALYZE {table.name}"))
+        except Exception:
+            for temporary, _ in staged:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+            raise
+    
+    # La base ya apunta a los destinos: recién ahora se ponen los archivos ahí
+    for temporary, target in staged:
+        os.replace(temporary, target)
+    setup_search(engine)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backup_parser = subparsers.add_parser('backup', help="Escribir un backup de toda la base")
+    backup_parser.add_argument("path", help="Archivo del backup")
+    backup_parser.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES // (1024 * 1024), help="MB sin comprimir por chunk")
+    backup_parser.add_argument("--level", type=int, default=1, help="Compresión gzip (1 = más rápido, 9 = más chico)")
+    restore_parser = subparsers.add_parser('restore', help="Cargar un backup en una base vacía")
+    restore_parser.add_argument("path", help="Archivo del backup")
+    for subparser in (backup_parser, restore_parser):
+        subparser.add_argument("--shard", help="Shard de DATABASE_SHARDS (por defecto, DATABASE_URL)")
+    args = parser.parse_args()
+    
+    if args.shard:
+        from shards import shard_urls
+        urls = shard_urls()
+        if args.shard not in urls:
+            parser.error(f"No existe el shard {args.shard} en DATABASE_SHARDS")
+        db_manager = DatabaseManager(urls[args.shard], shard=args.shard)
+    else:
+        db_manager = DatabaseManager()
+    start = time.perf_counter()
+    if args.command == 'backup':
+        manifest = backup_database(db_manager.engine, args.path, args.chunk_mb * 1024 * 1024, args.level)
+        counts = {entry['name']: sum(chunk['rows'] for chunk in entry['chunks']) for entry in manifest['tables']}
+    else:
+        db_manager.create_tables()
+        counts = restore_database(db_manager.engine, args.path, db_manager.shard)
+    logger.info(
+        f"{args.command} de {args.path} en {time.perf_counter() - start:.1f} s: "
+        + ', '.join(f"{table} {rows}" for table, rows in counts.items())
+    )
+
+if __name__ == "__main__":
+    main()
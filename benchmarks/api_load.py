@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de la API HTTP/JSON (api.py)
+
+Levanta la API en un proceso aparte sobre un SQLite temporal (o
+DATABASE_URL con --use-env) y la golpea con varios clientes con conexión
+persistente. Reporta peticiones por segundo y latencias para lecturas
+completas, lecturas con If-None-Match (304) y altas de gastos en lote.
+
+Uso:
+    python benchmarks/api_load.py --clients 8 --seconds 5
+    DATABASE_URL=postgresql://... python benchmarks/api_load.py --use-env
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+from common import create_service, seed_asado
+
+ASADO_NAME = "benchmark"
+API_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/categories")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("La API no arrancó a tiempo")
+
+
+def run_load(port, make_request, clients, seconds):
+    """Cada cliente repite make_request() hasta que pasa el tiempo; devuelve (latencias ms, errores)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        own = []
+        own_errors = 0
+        while time.monotonic() < deadline:
+            method, path, body, headers, expected = make_request()
+            start = time.perf_counter()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            own.append((time.perf_counter() - start) * 1000)
+            if response.status != expected:
+                own_errors += 1
+        connection.close()
+        with lock:
+            latencies.extend(own)
+            errors[0] += own_errors
+    
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8, help="Clientes concurrentes")
+    parser.add_argument("--seconds", type=float, default=5, help="Duración de cada escenario")
+    parser.add_argument("--expenses", type=int, default=1000, help="Gastos iniciales del asado")
+    parser.add_argument("--batch", type=int, default=50, help="Gastos por POST en el escenario de altas")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    args = parser.parse_args()
+    
+    # create_service deja DATABASE_URL en el entorno: la API hereda la misma base
+    service = create_service(os.getenv("DATABASE_URL") if args.use_env else None)
+    service.delete_asado(ASADO_NAME)
+    seed_asado(service, ASADO_NAME, 10, args.expenses)
+    # Un gasto por el servicio para que el asado tenga versión
+    service.add_expense(ASADO_NAME, "Participante 0", "Carne", 1.0)
+    
+    port = free_port()
+    # En 127.0.0.1 no hace falta token: se saca para no tener que mandarlo en cada petición
+    env = {key: value for key, value in os.environ.items() if key != "ASADO_API_TOKEN"}
+    server = subprocess.Popen([sys.executable, API_PATH, "--host", "127.0.0.1", "--port", str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    try:
+        wait_for_server(port)
+        asado_path = f"/asados/{quote(ASADO_NAME)}"
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        connection.request("GET", f"{asado_path}/expenses")
+        response = connection.getresponse()
+        full_size = len(response.read())
+        etag = response.getheader("ETag")
+        connection.request("GET", f"{asado_path}/summary")
+        response = connection.getresponse()
+        response.read()
+        summary_etag = response.getheader("ETag")
+        
+        batch = json.dumps({"expenses": [
+            {"participant": f"Participante {i % 10}", "category": "Carne", "amount": 100.0 + i}
+            for i in range(args.batch)
+        ]})
+        scenarios = [
+            (f"GET gastos completos ({full_size // 1024} KB)",
+             lambda: ("GET", f"{asado_path}/expenses", None, {}, 200)),
+            ("GET gastos con If-None-Match (304)",
+             lambda: ("GET", f"{asado_path}/expenses", None, {"If-None-Match": etag}, 304)),
+            ("GET resumen con If-None-Match (304)",
+             lambda: ("GET", f"{asado_path}/summary", None, {"If-None-Match": summary_etag}, 304)),
+            (f"POST lote de {args.batch} gastos",
+             lambda: ("POST", f"{asado_path}/expenses", batch, {"Content-Type": "application/json"}, 201)),
+        ]
+        
+        print(f"\n=== {args.clients} clientes, {args.seconds:g}s por escenario ===")
+        width = max(len(name) for name, _ in scenarios)
+        print(f"{'Escenario'.ljust(width)}  {'Pet/s':>8}  {'p50 (ms)':>9}  {'p95 (ms)':>9}  {'Errores':>8}")
+        for name, make_request in scenarios:
+            latencies, errors = run_load(port, make_request, args.clients, args.seconds)
+            quantiles = statistics.quantiles(latencies, n=20)
+            print(f"{name.ljust(width)}  {len(latencies) / args.seconds:8.0f}  "
+                  f"{statistics.median(latencies):9.2f}  {quantiles[18]:9.2f}  {errors:8d}")
+    finally:
+        server.terminate()
+        server.wait()
+        service.delete_asado(ASADO_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark: costo de una interacción con rerun completo vs. rerun de fragmento
+
+Antes de los fragmentos, cualquier interacción (tipear un monto, elegir
+una categoría) volvía a ejecutar todo app.py. Ahora solo se ejecuta el
+fragmento que contiene el widget. Este script mide consultas SQL y tiempo
+de ambos casos con el AppTest de Streamlit.
+
+Uso:
+    python benchmarks/app_reruns.py --expenses 5000
+"""
+
+import argparse
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from streamlit.testing.v1 import AppTest
+
+from common import create_service, seed_asado
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+ASADO_NAME = "benchmark"
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas por cualquier engine"""
+    
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+    
+    def _on_execute(self, *args):
+        self.count += 1
+
+def fragment_script():
+    """Script que ejecuta solo un fragmento de app.py (lo que corre en un rerun de fragmento)"""
+    import streamlit as st
+    import app
+    # Estado que en la app real ya dejó el rerun completo anterior
+    if 'expense_cache' not in st.session_state:
+        st.session_state.expense_cache = {}
+        app.sync_asado(st.session_state.current_asado)
+    fragment = getattr(app, st.session_state.bench_fragment)
+    fragment(*st.session_state.bench_args)
+
+def measure_runs(app_test, counter, repeat):
+    """Mejor tiempo (ms) y consultas de repeat ejecuciones (después de una de calentamiento)"""
+    app_test.run()
+    best = float("inf")
+    queries = 0
+    for _ in range(repeat):
+        before = counter.count
+        start = time.perf_counter()
+        app_test.run()
+        best = min(best, time.perf_counter() - start)
+        queries = counter.count - before
+    if app_test.exception:
+        raise RuntimeError(app_test.exception[0].message)
+    return best * 1000, queries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=2000, help="Cantidad de gastos a generar")
+    parser.add_argument("--participants", type=int, default=20, help="Cantidad de participantes")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por caso")
+    args = parser.parse_args()
+    
+    service = create_service()
+    seed_asado(service, ASADO_NAME, args.participants, args.expenses)
+    participants = service.get_participants(ASADO_NAME)
+    counter = QueryCounter()
+    
+    rows = []
+    full = AppTest.from_file(APP_PATH, default_timeout=120)
+    full.session_state.current_asado = ASADO_NAME
+    full.run()
+    for page in ["Participantes", "Gastos", "Resumen", "Configuración"]:
+        full.sidebar.selectbox[1].select(page)
+        rows.append((f"rerun completo: {page}", *measure_runs(full, counter, args.repeat)))
+    
+    expenses = service.get_expenses_columnar(ASADO_NAME)
+    shares = service.get_expense_shares(ASADO_NAME)
+    fragments = [
+        ("show_participants_fragment", (participants,)),
+        ("show_expense_form", (participants,)),
+        ("show_expense_table", (expenses, shares)),
+        ("show_custom_categories", ()),
+    ]
+    for name, fragment_args in fragments:
+        fragment = AppTest.from_function(fragment_script, default_timeout=120)
+        fragment.session_state.current_asado = ASADO_NAME
+        fragment.session_state.bench_fragment = name
+        fragment.session_state.bench_args = fragment_args
+        rows.append((f"rerun de fragmento: {name}", *measure_runs(fragment, counter, args.repeat)))
+    
+    print(f"\n=== Interacciones con {args.expenses} gastos, {args.participants} participantes ===")
+    width = max(len(name) for name, _, _ in rows)
+    print(f"{'Caso'.ljust(width)}  {'Tiempo (ms)':>12}  {'Consultas':>10}")
+    for name, elapsed, queries in rows:
+        print(f"{name.ljust(width)}  {elapsed:12.2f}  {queries:10d}")
+
+if __name__ == "__main__":
+    main()
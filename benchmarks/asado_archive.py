@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: asados archivados en Parquet vs. en las tablas
+
+Crea un asado con muchos gastos y mide, con el asado en las tablas y
+después de archivarlo:
+
+- lo que ocupa (filas vivas en la base vs. bytes del Parquet),
+- la lectura completa del asado (get_asado_snapshot, como la página de
+  Resumen o GET /asados/<asado>),
+- y el costo de archivar y restaurar.
+
+Uso:
+    python benchmarks/asado_archive.py --expenses 100000
+    DATABASE_URL=postgresql://... python benchmarks/asado_archive.py --use-env
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import func
+
+from common import create_service, seed_asado, measure, print_table
+from database import Asado, Participant, Expense
+from archive import archive_file
+
+ASADO_NAME = "benchmark-archive"
+
+
+def live_rows(service):
+    """Filas del asado en participants + expenses"""
+    session = service.db_manager.get_session()
+    try:
+        asado_id = session.query(Asado.id).filter(Asado.name == ASADO_NAME).scalar()
+        participants = session.query(func.count(Participant.id)).filter(Participant.asado_id == asado_id).scalar()
+        expenses = session.query(func.count(Expense.id)).filter(Expense.asado_id == asado_id).scalar()
+        return asado_id, participants + expenses
+    finally:
+        session.close()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=100000, help="Gastos del asado")
+    parser.add_argument("--participants", type=int, default=30, help="Participantes del asado")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por caso")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    args = parser.parse_args()
+
+    os.environ.setdefault("ASADO_ARCHIVE_DIR", tempfile.mkdtemp(prefix="asadoapp_archive_"))
+    service = create_service(os.getenv("DATABASE_URL") if args.use_env else None)
+    service.delete_asado(ASADO_NAME)
+    seed_asado(service, ASADO_NAME, args.participants, args.expenses)
+    try:
+        asado_id, rows = live_rows(service)
+        live = measure(lambda: service.get_asado_snapshot(ASADO_NAME), args.repeat)
+        archive_ms = timed(lambda: service.archive_asado(ASADO_NAME))
+        _, archived_rows = live_rows(service)
+        size = os.path.getsize(archive_file(asado_id))
+        archived = measure(lambda: service.get_asado_snapshot(ASADO_NAME), args.repeat)
+        restore_ms = timed(lambda: service.restore_asado(ASADO_NAME))
+        
+        print(f"\nFilas del asado en la base: {rows} -> {archived_rows} (Parquet de {size / 1024:.0f} KB)")
+        print_table(
+            f"Asado de {args.expenses} gastos ({service.db_manager.engine.url.drivername})",
+            [
+                ("Snapshot desde las tablas", *live),
+                ("Snapshot desde el Parquet", *archived),
+                ("Archivar (una vez)", archive_ms, 0.0),
+                ("Restaurar (una vez)", restore_ms, 0.0),
+            ]
+        )
+    finally:
+        # Archivado, borrarlo no tiene que cargar los gastos uno por uno
+        service.archive_asado(ASADO_NAME)
+        service.delete_asado(ASADO_NAME)
+
+if __name__ == "__main__":
+    main()
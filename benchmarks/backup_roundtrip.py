@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: backup y restauración completos con backup.py
+
+Carga un asado con muchos gastos y otro chico (con divisiones ponderadas,
+descripciones con tabs y saltos de línea, y archivado en Parquet), hace el
+backup, lo restaura en una base vacía y compara los snapshots de ambas
+bases. Mide el tiempo de cada paso, el tamaño del archivo y el pico de
+memoria de Python del backup.
+
+Uso:
+    python benchmarks/backup_roundtrip.py --expenses 1000000
+    DATABASE_URL=postgresql://.../origen python benchmarks/backup_roundtrip.py --use-env \\
+        --target-url postgresql://.../destino_vacio
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from common import create_service, seed_asado
+from backup import backup_database, restore_database
+
+ASADO_NAME = "benchmark-backup"
+SMALL_ASADO = "benchmark-backup-archivado"
+
+
+def seed_small_asado(service):
+    """Asado chico con los casos raros del formato de texto, archivado"""
+    service.create_asado(SMALL_ASADO)
+    for name in ("Ana", "Beto", "Carla\tTab"):
+        service.add_participant(SMALL_ASADO, name)
+    service.add_expense(SMALL_ASADO, "Ana", "Carne", 1234.5, "vacío\ny entraña \\ con barra")
+    service.add_expense(SMALL_ASADO, "Beto", "Vino", 800.0, "", shares={"Ana": 2, "Carla\tTab": 1})
+    service.add_expense(SMALL_ASADO, "Carla\tTab", "Hielo", 99.99, "\\N literal")
+    service.add_custom_category("Postre")
+    service.archive_asado(SMALL_ASADO)
+
+
+def same(a, b):
+    """Comparar snapshots (dicts, listas y arrays de NumPy anidados)"""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same(a[key], b[key]) for key in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray):
+        return isinstance(b, np.ndarray) and np.array_equal(a, b)
+    return a == b
+
+
+def snapshot(service, name):
+    data = service.get_asado_snapshot(name)
+    data.pop('version')
+    data.pop('reset', None)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=1000000, help="Gastos del asado grande")
+    parser.add_argument("--participants", type=int, default=30, help="Participantes del asado grande")
+    parser.add_argument("--level", type=int, default=1, help="Compresión gzip")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    parser.add_argument("--target-url", help="Base vacía donde restaurar (por defecto, un SQLite temporal)")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="asadoapp_backup_")
+    os.environ["ASADO_ARCHIVE_DIR"] = os.path.join(workdir, "archive")
+    source = create_service(os.getenv("DATABASE_URL") if args.use_env else None)
+    for name in (ASADO_NAME, SMALL_ASADO):
+        source.archive_asado(name)
+        source.delete_asado(name)
+    start = time.perf_counter()
+    seed_asado(source, ASADO_NAME, args.participants, args.expenses)
+    source.add_expense(ASADO_NAME, "Participante 0", "Vino", 500.0, "con\tdivisión", shares={"Participante 0": 1, "Participante 1": 3})
+    seed_small_asado(source)
+    print(f"Carga de {args.expenses} gastos: {time.perf_counter() - start:.1f} s")
+    
+    path = os.path.join(workdir, "asadoapp.backup")
+    start = time.perf_counter()
+    backup_database(source.db_manager.engine, path, level=args.level)
+    backup_s = time.perf_counter() - start
+    tracemalloc.start()
+    backup_database(source.db_manager.engine, path, level=args.level)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    # El destino lee los Parquet restaurados de su propio directorio
+    os.environ["ASADO_ARCHIVE_DIR"] = os.path.join(workdir, "restored")
+    target = create_service(args.target_url)
+    start = time.perf_counter()
+    counts = restore_database(target.db_manager.engine, path)
+    restore_s = time.perf_counter() - start
+    
+    equal = all(same(snapshot(source, name), snapshot(target, name)) for name in (ASADO_NAME, SMALL_ASADO))
+    print(f"\n=== Backup de {sum(counts.values())} filas ({source.db_manager.engine.url.drivername}) ===")
+    print(f"Backup:       {backup_s:6.1f} s  ({os.path.getsize(path) / (1024 * 1024):.1f} MB, pico {peak / (1024 * 1024):.1f} MB)")
+    print(f"Restauración: {restore_s:6.1f} s")
+    print(f"Filas por tabla: {counts}")
+    print(f"Snapshots iguales: {'sí' if equal else 'NO'}")
+    
+    for service in (source, target):
+        for name in (ASADO_NAME, SMALL_ASADO):
+            service.archive_asado(name)
+            service.delete_asado(name)
+        service.remove_custom_category("Postre")
+
+if __name__ == "__main__":
+    main()
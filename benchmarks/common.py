@@ -0,0 +1,83 @@
+"""
+Utilidades compartidas por los benchmarks de AsadoApp
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Permitir ejecutar los scripts como `python benchmarks/<script>.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from database import DatabaseManager, AsadoService, Asado, Participant, Expense
+
+CATEGORIES = ["Carne", "Achuras", "Chorizo", "Vino", "Cerveza", "Carbón", "Pan", "Hielo"]
+
+
+def create_service(database_url=None):
+    """Crear un servicio sobre DATABASE_URL o sobre un SQLite temporal"""
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="asadoapp_bench_"), "bench.db")
+        database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = database_url
+    db_manager = DatabaseManager()
+    db_manager.create_tables()
+    return AsadoService(db_manager)
+
+
+def seed_asado(service, name, num_participants, num_expenses, seed=42):
+    """Crear un asado con participantes y gastos insertados en bloque"""
+    rng = random.Random(seed)
+    service.create_asado(name)
+    for i in range(num_participants):
+        service.add_participant(name, f"Participante {i}")
+    
+    session = service.db_manager.get_session()
+    try:
+        asado = session.query(Asado).filter(Asado.name == name).one()
+        participant_ids = [p.id for p in session.query(Participant.id).filter(Participant.asado_id == asado.id)]
+        start = datetime(2024, 1, 1)
+        session.execute(insert(Expense), [
+            {
+                'participant_id': rng.choice(participant_ids),
+                'asado_id': asado.id,
+                'category': rng.choice(CATEGORIES),
+                'amount': round(rng.uniform(100, 50000), 2),
+                'description': f"Compra {i}",
+                'timestamp': start + timedelta(minutes=i)
+            }
+            for i in range(num_expenses)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+
+def measure(func, repeat=5):
+    """Ejecutar func varias veces y devolver (mejor tiempo en ms, pico de memoria en MB)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / (1024 * 1024)
+
+
+def print_table(title, rows):
+    """Imprimir resultados como tabla de texto"""
+    print(f"\n=== {title} ===")
+    width = max(len(name) for name, _, _ in rows)
+    print(f"{'Caso'.ljust(width)}  {'Tiempo (ms)':>12}  {'Pico (MB)':>10}")
+    for name, elapsed, peak in rows:
+        print(f"{name.ljust(width)}  {elapsed:12.2f}  {peak:10.2f}")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark: gastos como dict por fila vs. formato columnar (NumPy / Arrow)
+
+Compara tiempo y pico de memoria de cargar los gastos de un asado y
+armar el DataFrame con los totales que usa la página de Resumen.
+
+Uso:
+    python benchmarks/expense_formats.py --expenses 100000
+    DATABASE_URL=postgresql://... python benchmarks/expense_formats.py --use-env
+"""
+
+import argparse
+import os
+
+import pandas as pd
+
+from common import create_service, seed_asado, measure, print_table
+
+ASADO_NAME = "benchmark"
+
+
+def aggregate(df):
+    """Las agregaciones de calculate_totals"""
+    return (
+        df['amount'].sum(),
+        df.groupby('participant')['amount'].sum(),
+        df.groupby('category')['amount'].sum()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=50000, help="Cantidad de gastos a generar")
+    parser.add_argument("--participants", type=int, default=30, help="Cantidad de participantes")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por caso")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    args = parser.parse_args()
+    
+    service = create_service(os.getenv("DATABASE_URL") if args.use_env else None)
+    service.delete_asado(ASADO_NAME)
+    seed_asado(service, ASADO_NAME, args.participants, args.expenses)
+    
+    cases = [
+        ("dict por fila (get_expenses)",
+         lambda: aggregate(pd.DataFrame(service.get_expenses(ASADO_NAME)))),
+        ("columnar NumPy (get_expenses_columnar)",
+         lambda: aggregate(pd.DataFrame(service.get_expenses_columnar(ASADO_NAME)))),
+    ]
+    try:
+        import pyarrow  # noqa: F401
+        cases.append(("Arrow (get_expenses_columnar as_arrow)",
+                      lambda: aggregate(service.get_expenses_columnar(ASADO_NAME, as_arrow=True).to_pandas())))
+    except ImportError:
+        print("pyarrow no está instalado: se omite el caso Arrow")
+    
+    rows = [(name, *measure(func, args.repeat)) for name, func in cases]
+    print_table(f"{args.expenses} gastos, {args.participants} participantes", rows)
+    
+    service.delete_asado(ASADO_NAME)
+
+
+if __name__ == "__main__":
+    main()
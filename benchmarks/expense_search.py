@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: búsqueda de gastos con LIKE vs. índice de texto (FTS5 / tsvector)
+
+Genera muchos gastos con descripciones variadas y mide la latencia de
+buscar una palabra poco frecuente, un prefijo y un nombre con un error de
+tipeo, con un ILIKE '%...%' sobre todas las filas (lo que habría que hacer
+sin índice) y con AsadoService.search_expenses.
+
+Uso:
+    python benchmarks/expense_search.py --expenses 200000
+    DATABASE_URL=postgresql://... python benchmarks/expense_search.py --use-env
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from common import create_service, CATEGORIES
+from database import Asado, Participant, Expense
+
+ASADO_NAME = "benchmark-search"
+WORDS = [
+    "vacío", "entraña", "matambre", "mollejas", "chinchulines", "provoleta", "chimichurri", "quebracho",
+    "fernet", "malbec", "cerveza", "hielo", "pan", "ensalada", "tomate", "lechuga", "carbón", "leña",
+    "supermercado", "carnicería", "verdulería", "almacén", "kiosco", "bolsa", "kilo", "docena", "promo",
+]
+RARE_WORD = "achicoria"
+
+
+def seed_expenses(service, num_expenses, num_participants, seed=42):
+    """Insertar en bloque un asado con descripciones al azar (unas pocas con RARE_WORD)"""
+    rng = random.Random(seed)
+    service.create_asado(ASADO_NAME)
+    for i in range(num_participants):
+        service.add_participant(ASADO_NAME, f"Participante {i}")
+    service.add_participant(ASADO_NAME, "Martina")
+    
+    session = service.db_manager.get_session()
+    try:
+        asado_id = session.query(Asado.id).filter(Asado.name == ASADO_NAME).scalar()
+        participant_ids = [p.id for p in session.query(Participant.id).filter(Participant.asado_id == asado_id)]
+        start = datetime(2024, 1, 1)
+        batch = 50000
+        for offset in range(0, num_expenses, batch):
+            session.execute(insert(Expense), [
+                {
+                    'participant_id': rng.choice(participant_ids),
+                    'asado_id': asado_id,
+                    'category': rng.choice(CATEGORIES),
+                    'amount': round(rng.uniform(100, 50000), 2),
+                    'description': ' '.join(rng.sample(WORDS, 4) + ([RARE_WORD] if i % 10000 == 0 else [])),
+                    'timestamp': start + timedelta(minutes=i)
+                }
+                for i in range(offset, min(offset + batch, num_expenses))
+            ])
+        session.commit()
+    finally:
+        session.close()
+
+
+def delete_expenses(service):
+    """Borrar en bloque los gastos generados (delete_asado los cargaría uno por uno)"""
+    session = service.db_manager.get_session()
+    try:
+        asado_id = session.query(Asado.id).filter(Asado.name == ASADO_NAME).scalar()
+        session.query(Expense).filter(Expense.asado_id == asado_id).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+
+def like_search(service, term, limit):
+    """Búsqueda sin índice: ILIKE sobre descripción, categoría y participante"""
+    pattern = f"%{term}%"
+    session = service.db_manager.get_session()
+    try:
+        return session.execute(
+            select(Expense.id).join(Participant, Expense.participant_id == Participant.id).where(
+                Expense.description.ilike(pattern) | Expense.category.ilike(pattern) | Participant.name.ilike(pattern)
+            ).order_by(Expense.id.desc()).limit(limit)
+        ).all()
+    finally:
+        session.close()
+
+
+def latency_ms(func, calls):
+    """Mediana de la latencia en ms, después de calentar"""
+    func()
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=200000, help="Cantidad de gastos")
+    parser.add_argument("--participants", type=int, default=30, help="Cantidad de participantes")
+    parser.add_argument("--calls", type=int, default=20, help="Búsquedas por caso")
+    parser.add_argument("--limit", type=int, default=20, help="Resultados por búsqueda")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    args = parser.parse_args()
+    
+    service = create_service(os.getenv("DATABASE_URL") if args.use_env else None)
+    service.delete_asado(ASADO_NAME)
+    start = time.perf_counter()
+    seed_expenses(service, args.expenses, args.participants)
+    print(f"Carga de {args.expenses} gastos (con índices de búsqueda): {time.perf_counter() - start:.1f} s")
+    
+    cases = [
+        ("Palabra poco frecuente", RARE_WORD, RARE_WORD),
+        ("Prefijo", "chinchu", "chinchu"),
+        ("Nombre con error de tipeo", "Martna", "martna"),
+    ]
+    print(f"\n=== {args.expenses} gastos ({service.db_manager.engine.url.drivername}) ===")
+    print(f"{'Caso':<26}  {'ILIKE (ms)':>11}  {'Índice (ms)':>12}  {'Resultados':>10}")
+    for name, like_term, query in cases:
+        like = latency_ms(lambda: like_search(service, like_term, args.limit), args.calls)
+        indexed = latency_ms(lambda: service.search_expenses(query, limit=args.limit), args.calls)
+        found = len(service.search_expenses(query, limit=args.limit))
+        print(f"{name:<26}  {like:11.2f}  {indexed:12.2f}  {found:10d}")
+    
+    delete_expenses(service)
+    service.delete_asado(ASADO_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: altas de gastos directas vs. cola de escritura diferida
+
+Simula varios participantes tocando "Agregar Gasto" a la vez (un hilo por
+participante) y mide la latencia de cada alta vista por la interfaz y la
+cantidad de commits que llegan a la base, con AsadoService.add_expense
+directo y con submit_expense sobre ExpenseWriteQueue.
+
+Uso:
+    python benchmarks/expense_writes.py --clients 8 --expenses 200
+    DATABASE_URL=postgresql://... python benchmarks/expense_writes.py --use-env
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+
+from common import create_service
+
+ASADO_NAME = "benchmark"
+
+
+def run_clients(submit, clients, expenses):
+    """Alta concurrente de gastos; devuelve la latencia de cada alta en ms"""
+    latencies = []
+    lock = threading.Lock()
+    
+    def client(index):
+        participant = f"Participante {index}"
+        own = []
+        for i in range(expenses):
+            start = time.perf_counter()
+            submit(ASADO_NAME, participant, "Carne", 100.0 + i, f"Compra {i}")
+            own.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(own)
+    
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8, help="Participantes agregando gastos a la vez")
+    parser.add_argument("--expenses", type=int, default=200, help="Gastos por participante")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    args = parser.parse_args()
+    
+    os.environ.setdefault("EXPENSE_SPOOL_PATH", os.path.join(tempfile.mkdtemp(prefix="asadoapp_bench_"), "spool.jsonl"))
+    service = create_service(os.getenv("DATABASE_URL") if args.use_env else None)
+    commits = [0]
+    event.listen(service.db_manager.engine, "commit", lambda connection: commits.__setitem__(0, commits[0] + 1))
+    
+    total = args.clients * args.expenses
+    print(f"\n=== {args.clients} clientes x {args.expenses} gastos ({service.db_manager.engine.url.drivername}) ===")
+    print(f"{'Caso':<24}  {'p50 (ms)':>9}  {'p95 (ms)':>9}  {'Altas/s':>9}  {'Commits':>8}")
+    
+    for name, write_behind in (("add_expense directo", False), ("cola write-behind", True)):
+        service.delete_asado(ASADO_NAME)
+        service.create_asado(ASADO_NAME)
+        for index in range(args.clients):
+            service.add_participant(ASADO_NAME, f"Participante {index}")
+        if write_behind:
+            service.start_write_behind()
+        
+        commits[0] = 0
+        start = time.perf_counter()
+        latencies = run_clients(service.submit_expense, args.clients, args.expenses)
+        # El tiempo cuenta hasta que todo está en la base, no solo encolado
+        service.stop_write_behind()
+        elapsed = time.perf_counter() - start
+        written = len(service.get_expenses(ASADO_NAME))
+        assert written == total, f"Se escribieron {written} de {total} gastos"
+        
+        quantiles = statistics.quantiles(latencies, n=20)
+        print(f"{name:<24}  {statistics.median(latencies):9.2f}  {quantiles[18]:9.2f}  "
+              f"{total / elapsed:9.0f}  {commits[0]:8d}")
+    
+    service.delete_asado(ASADO_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: analítica entre asados cargando cada asado vs. rollups en SQL
+
+Genera años de historia (un asado por semana, con participantes de un
+mismo grupo de amigos) y mide el tiempo de calcular lo pagado y lo que le
+tocó a cada uno más los totales por categoría y mes:
+
+- cargando los gastos de cada asado con get_expenses y agregando en pandas
+  (lo único posible antes),
+- con get_participant_analytics y get_category_trends (agregado en la base),
+- y el costo por rerun con la página memoizada (solo get_data_version).
+
+Uso:
+    python benchmarks/history_analytics.py --years 5
+    DATABASE_URL=postgresql://... python benchmarks/history_analytics.py --use-env
+"""
+
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import insert
+
+from common import create_service, measure, print_table, CATEGORIES
+from database import Asado, Participant, Expense
+
+PREFIX = "benchmark-history"
+
+
+def seed_history(service, years, participants, expenses, friends=20, seed=42):
+    """Insertar en bloque un asado por semana durante years años"""
+    rng = random.Random(seed)
+    names = [f"Amigo {i}" for i in range(friends)]
+    start = datetime(2020, 1, 4)
+    weeks = years * 52
+    session = service.db_manager.get_session()
+    try:
+        asado_ids = session.scalars(
+            insert(Asado).returning(Asado.id, sort_by_parameter_order=True),
+            [{'name': f"{PREFIX} {week}", 'created_date': start + timedelta(weeks=week)} for week in range(weeks)]
+        ).all()
+        guests = [rng.sample(names, participants) for _ in asado_ids]
+        participant_ids = session.scalars(
+            insert(Participant).returning(Participant.id, sort_by_parameter_order=True),
+            [{'name': name, 'asado_id': asado_id} for asado_id, group in zip(asado_ids, guests) for name in group]
+        ).all()
+        session.execute(insert(Expense), [
+            {
+                'participant_id': participant_ids[week * participants + rng.randrange(participants)],
+                'asado_id': asado_id,
+                'category': rng.choice(CATEGORIES),
+                'amount': round(rng.uniform(100, 50000), 2),
+                'description': "",
+                'timestamp': start + timedelta(weeks=week, minutes=k)
+            }
+            for week, asado_id in enumerate(asado_ids)
+            for k in range(expenses)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+
+def load_every_asado(service):
+    """Analítica cargando asado por asado (división en partes iguales)"""
+    frames = []
+    for asado in service.get_all_asados():
+        participants = service.get_participants(asado.name)
+        expenses = pd.DataFrame(service.get_expenses(asado.name))
+        if expenses.empty:
+            continue
+        expenses['month'] = expenses['timestamp'].dt.strftime('%Y-%m')
+        owed = expenses.groupby('month')['amount'].sum() / len(participants)
+        frames.append(expenses.groupby(['participant', 'month'])['amount'].sum().rename('paid').reset_index())
+        frames.append(pd.DataFrame([
+            {'participant': name, 'month': month, 'owed': amount}
+            for name in participants for month, amount in owed.items()
+        ]))
+        frames.append(expenses.groupby(['month', 'category'])['amount'].sum().rename('category_total').reset_index())
+    return pd.concat(frames)
+
+
+def rollups(service):
+    return service.get_participant_analytics(), service.get_category_trends()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=5, help="Años de historia (un asado por semana)")
+    parser.add_argument("--participants", type=int, default=10, help="Participantes por asado")
+    parser.add_argument("--expenses", type=int, default=30, help="Gastos por asado")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    args = parser.parse_args()
+    
+    service = create_service(os.getenv("DATABASE_URL") if args.use_env else None)
+    seed_history(service, args.years, args.participants, args.expenses)
+    try:
+        print_table(
+            f"{args.years} años, {args.years * 52} asados, {args.years * 52 * args.expenses} gastos "
+            f"({service.db_manager.engine.url.drivername})",
+            [
+                ("Cargar cada asado y agregar en pandas", *measure(lambda: load_every_asado(service), args.repeat)),
+                ("Rollups en SQL", *measure(lambda: rollups(service), args.repeat)),
+                ("Rerun memoizado (get_data_version)", *measure(service.get_data_version, args.repeat)),
+            ]
+        )
+    finally:
+        for asado in service.get_all_asados():
+            if asado.name.startswith(PREFIX):
+                service.delete_asado(asado.name)
+
+
+if __name__ == "__main__":
+    main()
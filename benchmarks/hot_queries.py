@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: consultas frecuentes con Query del ORM vs. select() precompilados
+
+Mide CPU y latencia por llamada de las consultas que se repiten en cada
+rerun (id del asado por nombre, participantes y gastos del asado),
+armando la Query del ORM en cada llamada (como antes) y con los
+statements de módulo de database.py. Con PostgreSQL + psycopg 3 compara
+además con y sin prepared statements del servidor.
+
+Uso:
+    python benchmarks/hot_queries.py --calls 2000
+    DATABASE_URL=postgresql://... python benchmarks/hot_queries.py --use-env
+"""
+
+import argparse
+import os
+import time
+
+from common import create_service, seed_asado
+from database import Asado, Participant, Expense, ExpenseRow, expense_column_entities
+
+ASADO_NAME = "benchmark"
+
+
+def orm_query_call(service):
+    """Las tres consultas armando la Query del ORM en cada llamada"""
+    session = service.db_manager.get_session()
+    try:
+        asado_id = session.query(Asado.id).filter(Asado.name == ASADO_NAME).scalar()
+        participants = [name for (name,) in session.query(Participant.name).filter(
+            Participant.asado_id == asado_id
+        ).order_by(Participant.id)]
+        expenses = [ExpenseRow._make(row) for row in session.query(*expense_column_entities()).join(
+            Participant, Expense.participant_id == Participant.id
+        ).filter(Expense.asado_id == asado_id).order_by(Expense.id)]
+        return participants, expenses
+    finally:
+        session.close()
+
+
+def prebuilt_call(service):
+    """Las mismas consultas con los select() armados una vez en database.py"""
+    session = service.db_manager.get_session()
+    try:
+        asado_id = service._get_asado_id(session, ASADO_NAME)
+        participants = service._query_participant_names(session, asado_id)
+        expenses = service._query_expense_rows(session, asado_id)
+        return participants, expenses
+    finally:
+        session.close()
+
+
+def measure_calls(func, calls):
+    """(CPU en µs, latencia en µs) promedio por llamada, después de calentar"""
+    for _ in range(min(50, calls)):
+        func()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    return cpu / calls * 1e6, wall / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000, help="Llamadas por caso")
+    parser.add_argument("--expenses", type=int, default=40, help="Gastos del asado")
+    parser.add_argument("--participants", type=int, default=8, help="Participantes del asado")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    args = parser.parse_args()
+    
+    database_url = os.getenv("DATABASE_URL") if args.use_env else None
+    service = create_service(database_url)
+    service.delete_asado(ASADO_NAME)
+    seed_asado(service, ASADO_NAME, args.participants, args.expenses)
+    
+    cases = [
+        ("Query del ORM por llamada", lambda: orm_query_call(service)),
+        ("select() precompilado", lambda: prebuilt_call(service)),
+    ]
+    if service.db_manager.engine.dialect.driver == 'psycopg':
+        os.environ["DATABASE_PREPARE_THRESHOLD"] = "off"
+        unprepared = create_service(database_url)
+        cases.insert(1, ("select() precompilado, sin prepared statements", lambda: prebuilt_call(unprepared)))
+    
+    print(f"\n=== {args.calls} llamadas, {args.participants} participantes, {args.expenses} gastos "
+          f"({service.db_manager.engine.url.drivername}) ===")
+    width = max(len(name) for name, _ in cases)
+    print(f"{'Caso'.ljust(width)}  {'CPU (µs)':>10}  {'Latencia (µs)':>14}")
+    for name, func in cases:
+        cpu, wall = measure_calls(func, args.calls)
+        print(f"{name.ljust(width)}  {cpu:10.1f}  {wall:14.1f}")
+    
+    service.delete_asado(ASADO_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pool_pre_ping vs. prueba en segundo plano de las conexiones
+
+Con cada DATABASE_POOL_CHECK mide la latencia de las lecturas de un
+rerun típico (asados, snapshot, participantes, versión) y cuántos
+SELECT 1 extra hace (con pre_ping, uno por checkout del pool). En una red
+real cada uno cuesta un round trip; contra un PostgreSQL local casi nada.
+Después corta todas las conexiones del servidor (pg_terminate_backend,
+como un reinicio o un failover) y cuenta cuántas lecturas fallan.
+
+Uso (solo PostgreSQL):
+    DATABASE_URL=postgresql://... python benchmarks/pool_health.py
+    DATABASE_URL=postgresql://... DATABASE_PGBOUNCER=1 python benchmarks/pool_health.py
+"""
+
+import argparse
+import os
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+
+from common import seed_asado, measure, print_table
+from database import DatabaseManager, AsadoService
+
+ASADO_NAME = "benchmark-pool"
+
+
+def rerun(service):
+    """Lecturas de un rerun de la página de Gastos"""
+    service.get_all_asados()
+    service.get_asado_snapshot(ASADO_NAME)
+    service.get_participants(ASADO_NAME)
+    service.get_asado_version(ASADO_NAME)
+
+
+def terminate_backends(database_url):
+    """Cortar todas las demás conexiones a la base"""
+    engine = create_engine(database_url, poolclass=NullPool)
+    with engine.connect() as connection:
+        killed = connection.execute(text(
+            "SELECT count(pg_terminate_backend(pid)) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND pid <> pg_backend_pid() AND backend_type = 'client backend'"
+        )).scalar()
+    engine.dispose()
+    return killed
+
+
+def run_mode(mode, args):
+    os.environ["DATABASE_POOL_CHECK"] = mode
+    db_manager = DatabaseManager()
+    service = AsadoService(db_manager)
+    checkouts = []
+    event.listen(db_manager.engine, "checkout", lambda *_: checkouts.append(1))
+    
+    rerun(service)
+    checkouts.clear()
+    best_ms, _ = measure(lambda: [rerun(service) for _ in range(args.reruns)], args.repeat)
+    pings = len(checkouts) / (args.reruns * (args.repeat + 1)) if mode == "pre_ping" else 0
+    
+    # Conexiones ociosas en el pool que el servidor corta
+    terminate_backends(db_manager.database_url)
+    failures = 0
+    for _ in range(args.reruns):
+        if service.get_asado_snapshot(ASADO_NAME) is None or not service.get_participants(ASADO_NAME):
+            failures += 1
+    db_manager.engine.dispose()
+    return best_ms / args.reruns, pings, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=200, help="Reruns por medición")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por modo")
+    args = parser.parse_args()
+    
+    setup = AsadoService(DatabaseManager())
+    setup.db_manager.create_tables()
+    setup.delete_asado(ASADO_NAME)
+    seed_asado(setup, ASADO_NAME, 10, 100)
+    
+    rows = []
+    try:
+        for mode in ("pre_ping", "background"):
+            per_rerun_ms, pings, failures = run_mode(mode, args)
+            print(f"{mode}: {pings:.0f} SELECT 1 por rerun, {failures} lecturas fallidas tras cortar las conexiones")
+            rows.append((f"{mode} (rerun)", per_rerun_ms, 0.0))
+        print_table(f"Latencia de un rerun ({setup.db_manager.engine.url.drivername})", rows)
+    finally:
+        setup.delete_asado(ASADO_NAME)
+
+
+if __name__ == "__main__":
+    main()
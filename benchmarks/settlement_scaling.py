@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark: liquidación en lote (settlement.py) según cantidad de procesos
+
+Genera muchos asados chicos y mide el tiempo de leer los totales de la
+base (la parte secuencial) y de liquidarlos todos con 1, 2, 4, ...
+procesos.
+
+Con --use-env conviene una base descartable: los asados generados se
+borran al final.
+
+Uso:
+    python benchmarks/settlement_scaling.py --asados 20000
+    DATABASE_URL=postgresql://... python benchmarks/settlement_scaling.py --use-env
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from common import create_service
+from database import Asado, Participant, Expense
+import settlement
+
+PREFIX = "benchmark-settlement"
+
+
+def seed_asados(service, num_asados, participants, expenses, seed=42):
+    """Insertar en bloque num_asados asados con sus participantes y gastos"""
+    rng = random.Random(seed)
+    session = service.db_manager.get_session()
+    try:
+        start = datetime(2024, 1, 1)
+        asado_ids = session.scalars(
+            insert(Asado).returning(Asado.id, sort_by_parameter_order=True),
+            [{'name': f"{PREFIX} {i}", 'created_date': start} for i in range(num_asados)]
+        ).all()
+        participant_ids = session.scalars(
+            insert(Participant).returning(Participant.id, sort_by_parameter_order=True),
+            [{'name': f"Participante {j}", 'asado_id': asado_id} for asado_id in asado_ids for j in range(participants)]
+        ).all()
+        session.execute(insert(Expense), [
+            {
+                'participant_id': participant_ids[index * participants + rng.randrange(participants)],
+                'asado_id': asado_id,
+                'category': "Carne",
+                'amount': round(rng.uniform(100, 50000), 2),
+                'description': "",
+                'timestamp': start + timedelta(minutes=k)
+            }
+            for index, asado_id in enumerate(asado_ids)
+            for k in range(expenses)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+
+def delete_asados(service):
+    session = service.db_manager.get_session()
+    try:
+        asado_ids = session.query(Asado.id).filter(Asado.name.like(f"{PREFIX} %"))
+        session.query(Expense).filter(Expense.asado_id.in_(asado_ids)).delete(synchronize_session=False)
+        session.query(Participant).filter(Participant.asado_id.in_(asado_ids)).delete(synchronize_session=False)
+        session.query(Asado).filter(Asado.name.like(f"{PREFIX} %")).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--asados", type=int, default=20000, help="Cantidad de asados")
+    parser.add_argument("--participants", type=int, default=8, help="Participantes por asado")
+    parser.add_argument("--expenses", type=int, default=10, help="Gastos por asado")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Asados por tanda")
+    parser.add_argument("--use-env", action="store_true", help="Usar DATABASE_URL en lugar de un SQLite temporal")
+    args = parser.parse_args()
+    
+    service = create_service(os.getenv("DATABASE_URL") if args.use_env else None)
+    delete_asados(service)
+    seed_asados(service, args.asados, args.participants, args.expenses)
+    
+    print(f"\n=== {args.asados} asados x {args.participants} participantes x {args.expenses} gastos ===")
+    start = time.perf_counter()
+    for _ in settlement.read_asados(service, args.chunk_size):
+        pass
+    read_seconds = time.perf_counter() - start
+    print(f"{'Solo lectura de totales':<28}  {read_seconds:8.2f} s")
+    
+    workers = 1
+    baseline = None
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        count = sum(1 for _ in settlement.settle_all(service, workers, args.chunk_size))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{f'{workers} proceso(s)':<28}  {elapsed:8.2f} s  {count / elapsed:10.0f} asados/s  x{baseline / elapsed:.2f}")
+        workers *= 2
+    
+    delete_asados(service)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark: asados repartidos en shards vs. una sola base
+
+Carga los mismos asados en una base sola y en N shards (ShardedAsadoService)
+y mide los listados de todos los asados, que en shards son scatter-gather
+en paralelo, y una operación de un asado, que va a un solo shard.
+Verifica que los listados y la analítica den lo mismo en ambos casos.
+Después agrega un shard, rebalancea y cuenta cuántos asados se movieron
+(con hashing consistente, alrededor de 1/(N+1)) y que sus datos no cambiaron.
+
+Uso:
+    python benchmarks/shard_scaling.py --shards 4 --asados 200
+    python benchmarks/shard_scaling.py --baseline-url postgresql://.../base \\
+        --urls postgresql://.../s1,postgresql://.../s2,postgresql://.../s3
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from common import create_service, seed_asado, measure, print_table
+from database import DatabaseManager
+from shards import ShardedAsadoService, rebalance
+
+PREFIX = "benchmark-shard"
+
+
+def sqlite_url(workdir, name):
+    return f"sqlite:///{os.path.join(workdir, f'{name}.db')}"
+
+
+def sharded_service(global_url, urls):
+    service = ShardedAsadoService(DatabaseManager(global_url), {f"s{index}": url for index, url in enumerate(urls)})
+    for manager in service.db_managers():
+        manager.create_tables()
+    return service
+
+
+def names(args):
+    return [f"{PREFIX} {index}" for index in range(args.asados)]
+
+
+def clear(service, args):
+    for name in names(args):
+        service.archive_asado(name)
+        service.delete_asado(name)
+
+
+def listing(service):
+    return sorted((row.name, row.participants, row.expenses, round(row.total, 2)) for row in service.get_asado_stats())
+
+
+def analytics(service):
+    result = service.get_participant_analytics()
+    return (
+        [(row.participant, row.month, round(row.paid, 2), round(row.owed, 2), row.asados) for row in result['months']],
+        sorted((row.participant, round(row.paid, 2), round(row.owed, 2), row.asados, row.expenses) for row in result['totals'])
+    )
+
+
+def contents(service, name):
+    """Gastos y participantes de un asado, sin los ids (cambian al mover el asado)"""
+    snapshot = service.get_asado_snapshot(name)
+    expenses = snapshot['expenses']['inserted']
+    return (
+        sorted(zip(expenses['participant'].tolist(), expenses['category'].tolist(), expenses['amount'].tolist())),
+        sorted(snapshot['participants'])
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=4, help="Shards SQLite (sin --urls)")
+    parser.add_argument("--asados", type=int, default=200, help="Asados a repartir")
+    parser.add_argument("--participants", type=int, default=10, help="Participantes por asado")
+    parser.add_argument("--expenses", type=int, default=200, help="Gastos por asado")
+    parser.add_argument("--baseline-url", help="Base sola de comparación (por defecto, un SQLite temporal)")
+    parser.add_argument("--urls", help="URLs de los shards separadas por coma; la última se agrega al rebalancear")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="asadoapp_shards_")
+    os.environ["ASADO_ARCHIVE_DIR"] = os.path.join(workdir, "archive")
+    if args.urls:
+        urls = [url.strip() for url in args.urls.split(',') if url.strip()]
+    else:
+        urls = [sqlite_url(workdir, f"shard{index}") for index in range(args.shards + 1)]
+    global_url = args.baseline_url or sqlite_url(workdir, "global")
+    
+    baseline = create_service(args.baseline_url)
+    sharded = sharded_service(global_url, urls[:-1])
+    grown = sharded_service(global_url, urls)
+    for service in (baseline, grown):
+        clear(service, args)
+    
+    start = time.perf_counter()
+    for index, name in enumerate(names(args)):
+        seed_asado(baseline, name, args.participants, args.expenses, seed=index)
+        seed_asado(sharded.shard_for(name), name, args.participants, args.expenses, seed=index)
+    print(f"Carga de {args.asados} asados x {args.expenses} gastos: {time.perf_counter() - start:.1f} s")
+    
+    print(f"Listados iguales: {'sí' if listing(baseline) == listing(sharded) else 'NO'}")
+    print(f"Analítica igual: {'sí' if analytics(baseline) == analytics(sharded) else 'NO'}")
+    
+    one = names(args)[0]
+    rows = []
+    for label, service in (("base sola", baseline), (f"{len(urls) - 1} shards", sharded)):
+        for case, func in (
+            ("get_all_asados", service.get_all_asados),
+            ("get_asado_stats", service.get_asado_stats),
+            ("get_participant_analytics", service.get_participant_analytics),
+            ("search_expenses", lambda: service.search_expenses("Compra 17")),
+            ("get_asado_snapshot", lambda: service.get_asado_snapshot(one)),
+        ):
+            elapsed, peak = measure(func, args.repeat)
+            rows.append((f"{case} ({label})", elapsed, peak))
+    print_table(f"Listados y lecturas ({sharded.db_manager.engine.url.drivername})", rows)
+    
+    # Agregar un shard y mover lo que le toca
+    before = {name: contents(sharded, name) for name in names(args)}
+    start = time.perf_counter()
+    moved = rebalance(grown)
+    elapsed = time.perf_counter() - start
+    unchanged = all(contents(grown, name) == before[name] for name in names(args))
+    print(f"\nRebalanceo a {len(urls)} shards: {len(moved)}/{args.asados} asados movidos en {elapsed:.1f} s "
+          f"(esperado ~{args.asados / len(urls):.0f})")
+    print(f"Datos iguales tras mover: {'sí' if unchanged else 'NO'}")
+    
+    for service in (baseline, grown):
+        clear(service, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark: arranque en frío de app.py (imports y tiempo hasta el primer render)
+
+Lanza un proceso nuevo con `python -X importtime`, ejecuta app.py una vez
+con el AppTest de Streamlit (página por defecto: Participantes) y reporta:
+- tiempo hasta el primer render
+- los paquetes que más tardan en importarse durante ese render
+- si se cargaron pandas o Plotly
+
+Termina con código 1 si la primera página cargó Plotly.
+
+Uso:
+    python benchmarks/startup.py
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+MARKER = "--- asadoapp: inicio del render ---"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+WATCHED_MODULES = ["pandas", "plotly", "pyarrow"]
+
+def run_child():
+    """Proceso hijo: render de app.py y medición (AppTest se importa antes de medir)"""
+    import tempfile
+    from streamlit.testing.v1 import AppTest
+    
+    # Base vacía: app.py crea las tablas, igual que en un worker nuevo
+    path = os.path.join(tempfile.mkdtemp(prefix="asadoapp_bench_"), "startup.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    
+    # AppTest ya importa Plotly: se descarga (solo en este proceso descartable)
+    # para que un import desde app.py vuelva a aparecer y se pueda medir.
+    for name in list(sys.modules):
+        if name.split('.')[0] in WATCHED_MODULES:
+            del sys.modules[name]
+    
+    print(MARKER, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    
+    print(json.dumps({
+        'first_render_ms': elapsed * 1000,
+        'exception': at.exception[0].message if at.exception else None,
+        'loaded': {name: name in sys.modules for name in WATCHED_MODULES}
+    }))
+
+def parse_importtime(stderr):
+    """Tiempo propio de import (ms) por paquete raíz, solo después del marcador"""
+    _, _, after = stderr.partition(MARKER)
+    totals = {}
+    for line in after.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            root = match.group(4).split('.')[0]
+            totals[root] = totals.get(root, 0) + int(match.group(1)) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10, help="Cantidad de paquetes a listar")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child()
+        return 0
+    
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-4000:], file=sys.stderr)
+        return result.returncode
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    if report['exception']:
+        print(f"Error en app.py: {report['exception']}", file=sys.stderr)
+        return 1
+    
+    print("\n=== Arranque en frío de app.py (página Participantes) ===")
+    print(f"Tiempo hasta el primer render: {report['first_render_ms']:.1f} ms")
+    print(f"\nPaquetes importados durante el render (top {args.top}, ms propios):")
+    for package, ms in parse_importtime(result.stderr)[:args.top]:
+        print(f"  {package.ljust(24)} {ms:8.1f}")
+    print("\nMódulos pesados cargados por app.py:")
+    for name, loaded in report['loaded'].items():
+        print(f"  {name.ljust(24)} {'sí' if loaded else 'no'}")
+    
+    if report['loaded']['plotly']:
+        print("\nERROR: la primera página no debería depender de Plotly", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: división ponderada por gasto con bucles anidados vs. matriz rala
+
+Genera gastos con divisiones explícitas (cada uno entre algunos
+participantes, con pesos) y mide cuánto tarda calcular lo que le toca a
+cada participante recorriendo participantes x gastos en Python y con
+summary.calculate_owed (producto de la matriz rala de pesos en formato COO
+por el vector de montos). Verifica que ambos den lo mismo.
+
+Uso:
+    python benchmarks/weighted_split.py --expenses 5000 --participants 300
+"""
+
+import argparse
+import random
+
+import numpy as np
+
+from common import measure, print_table
+from summary import calculate_owed
+
+
+def generate(num_expenses, num_participants, split_size, shared_fraction, seed=42):
+    """Gastos columnares y divisiones explícitas (expense_id, participant, weight)"""
+    rng = random.Random(seed)
+    participants = [f"Participante {i}" for i in range(num_participants)]
+    expense_ids = np.arange(1, num_expenses + 1, dtype=np.int64)
+    amounts = np.array([round(rng.uniform(100, 50000), 2) for _ in range(num_expenses)])
+    
+    rows = []
+    for expense_id in expense_ids.tolist():
+        if rng.random() < shared_fraction:
+            for participant in rng.sample(participants, split_size):
+                rows.append((expense_id, participant, float(rng.choice((0.5, 1, 1, 2)))))
+    shares = {
+        'expense_id': np.array([row[0] for row in rows], dtype=np.int64),
+        'participant': np.array([row[1] for row in rows], dtype=object),
+        'weight': np.array([row[2] for row in rows], dtype=np.float64)
+    }
+    return participants, expense_ids, amounts, shares
+
+
+def nested_loops(participants, expense_ids, amounts, shares):
+    """Lo mismo que calculate_owed, gasto por gasto y participante por participante"""
+    weights_by_expense = {}
+    for expense_id, participant, weight in zip(shares['expense_id'].tolist(), shares['participant'], shares['weight'].tolist()):
+        weights_by_expense.setdefault(expense_id, {})[participant] = weight
+    
+    owed = {}
+    for participant in participants:
+        total = 0.0
+        for expense_id, amount in zip(expense_ids.tolist(), amounts.tolist()):
+            weights = weights_by_expense.get(expense_id)
+            if weights is None:
+                total += amount / len(participants)
+            elif participant in weights:
+                total += amount * weights[participant] / sum(weights.values())
+        owed[participant] = total
+    return owed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=5000, help="Cantidad de gastos")
+    parser.add_argument("--participants", type=int, default=300, help="Cantidad de participantes")
+    parser.add_argument("--split-size", type=int, default=10, help="Participantes por gasto con división explícita")
+    parser.add_argument("--shared", type=float, default=0.8, help="Fracción de gastos con división explícita")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso")
+    args = parser.parse_args()
+    
+    data = generate(args.expenses, args.participants, min(args.split_size, args.participants), args.shared)
+    loops = nested_loops(*data)
+    sparse = calculate_owed(*data)
+    assert all(abs(loops[name] - sparse[name]) < 1e-6 for name in data[0]), "Los resultados no coinciden"
+    
+    print_table(
+        f"{args.expenses} gastos x {args.participants} participantes, {len(data[3]['expense_id'])} pesos",
+        [
+            ("Bucles anidados en Python", *measure(lambda: nested_loops(*data), args.repeat)),
+            ("Matriz rala (calculate_owed)", *measure(lambda: calculate_owed(*data), args.repeat)),
+        ]
+    )
+
+
+if __name__ == "__main__":
+    main()
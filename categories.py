@@ -0,0 +1,72 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Categorías predefinidas para asados argentinos
+DEFAULT_CATEGORIES = [
+    "Carne", "Achuras", "Chorizo", "Morcilla", "Pollo",
+    "Bebidas", "Vino", "Cerveza", "Gaseosas", "Agua",
+    "Carbón", "Leña", "Encendedor",
+    "Verduras", "Ensalada", "Tomate", "Lechuga", "Cebolla",
+    "Condimentos", "Sal", "Chimichurri", "Salsa criolla",
+    "Pan", "Postre", "Helado", "Fruta",
+    "Varios", "Hielo", "Servilletas", "Platos", "Vasos"
+]
+
+class CategoryRegistry:
+    """Registro de categorías compartido por todo el proceso
+    
+    Carga las categorías personalizadas una sola vez y mantiene la lista
+    combinada ya ordenada y un set para consultas de pertenencia. Solo se
+    recarga después de invalidate() (al agregar o eliminar una categoría).
+    Si load_custom_categories falla, esa consulta usa solo las predefinidas
+    y no se guarda nada: la próxima vuelve a intentar.
+    """
+    
+    def __init__(self, load_custom_categories):
+        self._load_custom_categories = load_custom_categories
+        self._lock = threading.Lock()
+        # (personalizadas, combinadas ordenadas, set de nombres); None = sin cargar
+        self._state = None
+        # Crece con cada invalidate(): una carga que empezó antes no se guarda
+        self._generation = 0
+    
+    @staticmethod
+    def _build_state(custom):
+        merged = sorted(DEFAULT_CATEGORIES + custom)
+        return (custom, merged, frozenset(merged))
+    
+    def _get_state(self):
+        state = self._state
+        if state is not None:
+            return state
+        with self._lock:
+            if self._state is not None:
+                return self._state
+            generation = self._generation
+            try:
+                custom = list(self._load_custom_categories())
+            except Exception as e:
+                logger.error(f"Error cargando categorías personalizadas: {e}")
+                return self._build_state([])
+            state = self._build_state(custom)
+            if generation == self._generation:
+                self._state = state
+            return state
+    
+    def all(self):
+        """Lista ordenada de categorías predefinidas y personalizadas (no modificar)"""
+        return self._get_state()[1]
+    
+    def custom(self):
+        """Categorías personalizadas en orden de creación (no modificar)"""
+        return self._get_state()[0]
+    
+    def __contains__(self, name):
+        return name in self._get_state()[2]
+    
+    def invalidate(self):
+        """Descartar lo cargado; la próxima consulta vuelve a leer la base"""
+        self._generation += 1
+        self._state = None
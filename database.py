@@ -1,9 +1,24 @@
 import os
+import heapq
+import itertools
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+import shutil
+import time
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, ForeignKey, UniqueConstraint, func, and_, case, text, select, bindparam, insert, delete, exists, literal
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from datetime import datetime
+from operator import itemgetter
+from typing import NamedTuple
+import numpy as np
+from categories import CategoryRegistry
+from notifications import AsadoVersions, ChangeListener, notify_change
+from expense_queue import ExpenseWriteQueue
+from pool_health import RetryingSession, PoolProbe
+from search import setup_search, search_expenses
+from archive import archive_file, write_archive, read_archive, read_archive_metadata
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -23,32 +38,92 @@ class Asado(Base):
     # Relaciones
     participants = relationship("Participant", back_populates="asado", cascade="all, delete-orphan")
     expenses = relationship("Expense", back_populates="asado", cascade="all, delete-orphan")
+    changes = relationship("AsadoChange", back_populates="asado", cascade="all, delete-orphan")
+    archive = relationship("AsadoArchive", back_populates="asado", uselist=False, cascade="all, delete-orphan")
 
 class Participant(Base):
     __tablename__ = 'participants'
     
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
-    asado_id = Column(Integer, ForeignKey('asados.id'), nullable=False)
+    asado_id = Column(Integer, ForeignKey('asados.id'), nullable=False, index=True)
     
     # Relaciones
     asado = relationship("Asado", back_populates="participants")
     expenses = relationship("Expense", back_populates="participant")
+    shares = relationship("ExpenseShare", back_populates="participant", cascade="all, delete-orphan")
 
 class Expense(Base):
     __tablename__ = 'expenses'
+    # Sin AUTOINCREMENT, SQLite reusa el id del último gasto si se elimina
+    # y el log de cambios lo confundiría con el gasto anterior
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = Column(Integer, primary_key=True)
-    participant_id = Column(Integer, ForeignKey('participants.id'), nullable=False)
-    asado_id = Column(Integer, ForeignKey('asados.id'), nullable=False)
+    participant_id = Column(Integer, ForeignKey('participants.id'), nullable=False, index=True)
+    asado_id = Column(Integer, ForeignKey('asados.id'), nullable=False, index=True)
     category = Column(String(50), nullable=False)
     amount = Column(Float, nullable=False)
     description = Column(Text, default="")
-    timestamp = Column(DateTime, default=datetime.now)
+    timestamp = Column(DateTime, default=datetime.now, index=True)
     
     # Relaciones
     participant = relationship("Participant", back_populates="expenses")
     asado = relationship("Asado", back_populates="expenses")
+    shares = relationship("ExpenseShare", back_populates="expense", cascade="all, delete-orphan")
+
+class ExpenseShare(Base):
+    """Peso de un participante en la división de un gasto
+    
+    Un gasto sin filas acá se divide en partes iguales entre todos los
+    participantes del asado; con filas, solo entre los listados y en
+    proporción a su peso.
+    """
+    __tablename__ = 'expense_shares'
+    __table_args__ = (UniqueConstraint('expense_id', 'participant_id'),)
+    
+    id = Column(Integer, primary_key=True)
+    expense_id = Column(Integer, ForeignKey('expenses.id'), nullable=False, index=True)
+    participant_id = Column(Integer, ForeignKey('participants.id'), nullable=False, index=True)
+    weight = Column(Float, nullable=False, default=1.0)
+    
+    # Relaciones
+    expense = relationship("Expense", back_populates="shares")
+    participant = relationship("Participant", back_populates="shares")
+
+class AsadoChange(Base):
+    """Registro de cambios de un asado (altas y bajas) con secuencia monotónica"""
+    __tablename__ = 'asado_changes'
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = Column(Integer, primary_key=True)
+    asado_id = Column(Integer, ForeignKey('asados.id'), nullable=False, index=True)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    operation = Column(String(10), nullable=False)
+    timestamp = Column(DateTime, default=datetime.now)
+    
+    # Relaciones
+    asado = relationship("Asado", back_populates="changes")
+
+class AsadoArchive(Base):
+    """Stub de un asado archivado: sus datos están en un Parquet (ver archive.py)
+    
+    La fila del asado queda (nombre, fecha y log de cambios, para que la
+    versión siga creciendo); acá van la ruta del archivo y los totales
+    precalculados para los listados.
+    """
+    __tablename__ = 'asado_archives'
+    
+    asado_id = Column(Integer, ForeignKey('asados.id'), primary_key=True)
+    path = Column(String(500), nullable=False)
+    participants = Column(Integer, nullable=False)
+    expenses = Column(Integer, nullable=False)
+    total = Column(Float, nullable=False)
+    archived_date = Column(DateTime, default=datetime.now)
+    
+    # Relaciones
+    asado = relationship("Asado", back_populates="archive")
 
 class CustomCategory(Base):
     __tablename__ = 'custom_categories'
@@ -57,25 +132,477 @@ class CustomCategory(Base):
     name = Column(String(50), unique=True, nullable=False)
     created_date = Column(DateTime, default=datetime.now)
 
+# Filas livianas (inmutables, sin estado ORM) que devuelven las lecturas del servicio
+class AsadoRow(NamedTuple):
+    id: int
+    name: str
+    created_date: datetime
+
+class ParticipantRow(NamedTuple):
+    id: int
+    name: str
+    asado_id: int
+
+class ExpenseRow(NamedTuple):
+    id: int
+    participant: str
+    category: str
+    amount: float
+    description: str
+    timestamp: datetime
+
+class AsadoStatsRow(NamedTuple):
+    id: int
+    name: str
+    created_date: datetime
+    participants: int
+    expenses: int
+    total: float
+    archived_date: datetime
+
+class CategoryRow(NamedTuple):
+    id: int
+    name: str
+    created_date: datetime
+
+class ParticipantMonthRow(NamedTuple):
+    participant: str
+    month: str
+    paid: float
+    owed: float
+    asados: int
+
+class ParticipantRollupRow(NamedTuple):
+    participant: str
+    name: str
+    paid: float
+    owed: float
+    asados: int
+    expenses: int
+
+class CategoryTrendRow(NamedTuple):
+    month: str
+    category: str
+    total: float
+    expenses: int
+    share: float
+    previous: float
+    cumulative: float
+
+ASADO_ROW_COLUMNS = (Asado.id, Asado.name, Asado.created_date)
+PARTICIPANT_ROW_COLUMNS = (Participant.id, Participant.name, Participant.asado_id)
+
+# Formato columnar de gastos (una lista/array por columna en lugar de un dict por fila)
+EXPENSE_COLUMNS = ['id', 'participant', 'category', 'amount', 'description', 'timestamp']
+
+def expense_column_entities():
+    """Columnas a proyectar en las consultas de gastos, en el orden de EXPENSE_COLUMNS"""
+    return (
+        Expense.id,
+        Participant.name,
+        Expense.category,
+        Expense.amount,
+        Expense.description,
+        Expense.timestamp
+    )
+
+def expense_rows_to_columns(rows):
+    """Transponer filas del cursor a arrays NumPy tipados por columna"""
+    count = len(rows)
+    ids, participants, categories, amounts, descriptions, timestamps = (
+        zip(*rows) if rows else ((), (), (), (), (), ())
+    )
+    return {
+        'id': np.fromiter(ids, dtype=np.int64, count=count),
+        'participant': np.array(participants, dtype=object),
+        'category': np.array(categories, dtype=object),
+        'amount': np.fromiter(amounts, dtype=np.float64, count=count),
+        'description': np.array(descriptions, dtype=object),
+        'timestamp': np.array(timestamps, dtype='datetime64[us]')
+    }
+
+# Pesos de división por gasto en formato columnar (solo gastos con división explícita)
+SHARE_COLUMNS = ['expense_id', 'participant', 'weight']
+
+def share_rows_to_columns(rows):
+    """Transponer filas (gasto, participante, peso) a arrays NumPy tipados"""
+    count = len(rows)
+    expense_ids, participants, weights = zip(*rows) if rows else ((), (), ())
+    return {
+        'expense_id': np.fromiter(expense_ids, dtype=np.int64, count=count),
+        'participant': np.array(participants, dtype=object),
+        'weight': np.fromiter(weights, dtype=np.float64, count=count)
+    }
+
+# Consultas frecuentes armadas una sola vez a nivel de módulo. SQLAlchemy
+# guarda su forma compilada en el caché del engine (la clave de caché de un
+# statement fijo se calcula una vez) y con psycopg 3 el SQL, siempre idéntico,
+# se ejecuta como prepared statement del servidor.
+ASADO_ID_BY_NAME = select(Asado.id).where(Asado.name == bindparam('asado_name'))
+
+ASADO_ROW_BY_NAME = select(*ASADO_ROW_COLUMNS).where(Asado.name == bindparam('asado_name'))
+
+# Id del asado y ruta de su archivo (None si no está archivado)
+ASADO_WITH_ARCHIVE = select(Asado.id, AsadoArchive.path).outerjoin(
+    AsadoArchive, AsadoArchive.asado_id == Asado.id
+).where(Asado.name == bindparam('asado_name'))
+
+ARCHIVED_ASADOS = select(Asado.id, Asado.name, AsadoArchive.path).join(
+    AsadoArchive, AsadoArchive.asado_id == Asado.id
+).order_by(Asado.id)
+
+ARCHIVED_COUNT = select(func.count()).select_from(AsadoArchive)
+
+ASADO_VERSION = select(func.max(AsadoChange.id)).where(AsadoChange.asado_id == bindparam('asado_id'))
+
+# Última versión de gastos y último archivo/restauración del asado (obliga a
+# releer todo: los gastos restaurados no tienen altas en el log)
+EXPENSE_VERSION = select(
+    func.max(case((AsadoChange.entity == 'expense', AsadoChange.id))),
+    func.max(case((AsadoChange.entity == 'asado', AsadoChange.id)))
+).where(
+    AsadoChange.asado_id == bindparam('asado_id'),
+    AsadoChange.entity.in_(('expense', 'asado'))
+)
+
+PARTICIPANT_NAMES_BY_ASADO = select(Participant.name).where(
+    Participant.asado_id == bindparam('asado_id')
+).order_by(Participant.id)
+
+PARTICIPANT_ROWS_BY_ASADO = select(*PARTICIPANT_ROW_COLUMNS).where(
+    Participant.asado_id == bindparam('asado_id')
+).order_by(Participant.id)
+
+EXPENSES_BY_ASADO = select(*expense_column_entities()).join(
+    Participant, Expense.participant_id == Participant.id
+).where(Expense.asado_id == bindparam('asado_id')).order_by(Expense.id)
+
+# Gastos dados de alta después de una versión (delta). Con EXISTS cada
+# gasto sale una sola vez aunque su id tenga varias altas en el log (bases
+# SQLite creadas antes de AUTOINCREMENT reusan ids de gastos eliminados)
+EXPENSES_INSERTED_SINCE = select(*expense_column_entities()).join(
+    Participant, Expense.participant_id == Participant.id
+).where(
+    Expense.asado_id == bindparam('asado_id'),
+    exists().where(
+        AsadoChange.entity_id == Expense.id,
+        AsadoChange.entity == 'expense',
+        AsadoChange.operation == 'insert',
+        AsadoChange.asado_id == bindparam('asado_id'),
+        AsadoChange.id > bindparam('since_version')
+    )
+).order_by(Expense.id)
+
+EXPENSES_DELETED_SINCE = select(AsadoChange.entity_id).where(
+    AsadoChange.asado_id == bindparam('asado_id'),
+    AsadoChange.entity == 'expense',
+    AsadoChange.operation == 'delete',
+    AsadoChange.id > bindparam('since_version')
+)
+
+def psycopg_available():
+    """Si psycopg 3 está instalado"""
+    try:
+        import psycopg  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+SHARES_BY_ASADO = select(ExpenseShare.expense_id, Participant.name, ExpenseShare.weight).join(
+    Participant, ExpenseShare.participant_id == Participant.id
+).where(Participant.asado_id == bindparam('asado_id')).order_by(ExpenseShare.expense_id, ExpenseShare.id)
+
+# Suma de los pesos de cada gasto, para normalizar sus divisiones
+_share_weight_totals = select(
+    ExpenseShare.expense_id, func.sum(ExpenseShare.weight).label('total_weight')
+).group_by(ExpenseShare.expense_id).subquery()
+
+def _participant_totals(asado_id=None):
+    """Totales por participante de cada asado, ordenados por asado para poder
+    procesarlos en streaming: pagado, parte de los gastos con división
+    explícita y total del asado que se divide en partes iguales
+    
+    Con asado_id el filtro va también dentro de cada subconsulta, para no
+    agregar las tablas enteras y quedarse con un solo asado.
+    """
+    # Filtro de cada subconsulta: ninguno, o solo los gastos del asado
+    def scoped(query):
+        return query if asado_id is None else query.where(Expense.asado_id == asado_id)
+    
+    paid = scoped(
+        select(Expense.participant_id, func.sum(Expense.amount).label('paid'))
+    ).group_by(Expense.participant_id).subquery()
+    
+    share_totals = select(ExpenseShare.expense_id, func.sum(ExpenseShare.weight).label('total_weight'))
+    if asado_id is not None:
+        share_totals = scoped(share_totals.join(Expense, Expense.id == ExpenseShare.expense_id))
+    share_totals = share_totals.group_by(ExpenseShare.expense_id).subquery()
+    
+    weighted = scoped(
+        select(
+            ExpenseShare.participant_id,
+            func.sum(Expense.amount * ExpenseShare.weight / share_totals.c.total_weight).label('owed')
+        ).join(
+            Expense, Expense.id == ExpenseShare.expense_id
+        ).join(
+            share_totals, share_totals.c.expense_id == ExpenseShare.expense_id
+        )
+    ).group_by(ExpenseShare.participant_id).subquery()
+    
+    equal = scoped(
+        select(Expense.asado_id, func.sum(Expense.amount).label('amount')).where(
+            ~exists().where(ExpenseShare.expense_id == Expense.id)
+        )
+    ).group_by(Expense.asado_id).subquery()
+    
+    query = select(
+        Asado.id,
+        Asado.name,
+        Participant.name,
+        func.coalesce(paid.c.paid, 0.0),
+        func.coalesce(weighted.c.owed, 0.0),
+        func.coalesce(equal.c.amount, 0.0)
+    ).join(
+        Participant, Participant.asado_id == Asado.id
+    ).outerjoin(
+        paid, paid.c.participant_id == Participant.id
+    ).outerjoin(
+        weighted, weighted.c.participant_id == Participant.id
+    ).outerjoin(
+        equal, equal.c.asado_id == Asado.id
+    )
+    if asado_id is not None:
+        query = query.where(Asado.id == asado_id)
+    return query.order_by(Asado.id, Participant.id)
+
+PARTICIPANT_TOTALS = _participant_totals()
+
+# Los mismos totales para un solo asado (se guardan al archivarlo)
+ASADO_PARTICIPANT_TOTALS = _participant_totals(bindparam('asado_id'))
+
+# Asados sin archivar cuyo último cambio (o su creación) es anterior a una fecha
+_last_change_by_asado = select(
+    AsadoChange.asado_id, func.max(AsadoChange.timestamp).label('timestamp')
+).group_by(AsadoChange.asado_id).subquery()
+
+IDLE_ASADOS = select(Asado.name).outerjoin(
+    _last_change_by_asado, _last_change_by_asado.c.asado_id == Asado.id
+).outerjoin(
+    AsadoArchive, AsadoArchive.asado_id == Asado.id
+).where(
+    AsadoArchive.asado_id.is_(None),
+    func.coalesce(_last_change_by_asado.c.timestamp, Asado.created_date) < bindparam('before')
+).order_by(Asado.id)
+
+# Analítica entre asados: los participantes se identifican por nombre
+# normalizado (el mismo "Juan" en distintos asados) y se agrupa por mes
+class year_month(FunctionElement):
+    """Mes 'YYYY-MM' de una fecha, calculado en la base"""
+    type = String()
+    name = 'year_month'
+    inherit_cache = True
+
+@compiles(year_month)
+def _year_month_postgresql(element, compiler, **kw):
+    return "to_char(date_trunc('month', %s), 'YYYY-MM')" % compiler.process(element.clauses, **kw)
+
+@compiles(year_month, 'sqlite')
+def _year_month_sqlite(element, compiler, **kw):
+    return "strftime('%%Y-%%m', %s)" % compiler.process(element.clauses, **kw)
+
+def participant_key(name):
+    """Nombre de participante normalizado para juntarlo entre asados"""
+    return func.lower(func.trim(name))
+
+# Gastos del período [start, end)
+_in_period = and_(Expense.timestamp >= bindparam('start'), Expense.timestamp < bindparam('end'))
+
+_equal_split_by_asado_month = select(
+    Expense.asado_id, year_month(Expense.timestamp).label('month'), func.sum(Expense.amount).label('amount')
+).where(
+    _in_period, ~exists().where(ExpenseShare.expense_id == Expense.id)
+).group_by(Expense.asado_id, year_month(Expense.timestamp)).subquery()
+
+_participant_counts = select(
+    Participant.asado_id, func.count(Participant.id).label('count')
+).group_by(Participant.asado_id).subquery()
+
+# Una fila por (participante, mes, asado) con lo pagado y lo que le toca:
+# lo pagado sale de sus gastos, lo que le toca de los gastos divididos por
+# igual (total del asado en el mes / participantes) y de sus pesos
+_participant_activity = select(
+    participant_key(Participant.name).label('participant'),
+    Participant.name.label('name'),
+    year_month(Expense.timestamp).label('month'),
+    Expense.asado_id.label('asado_id'),
+    Expense.amount.label('paid'),
+    literal(0.0).label('owed'),
+    literal(1).label('expenses')
+).join(
+    Participant, Expense.participant_id == Participant.id
+).where(_in_period).union_all(
+    select(
+        participant_key(Participant.name),
+        Participant.name,
+        _equal_split_by_asado_month.c.month,
+        Participant.asado_id,
+        literal(0.0),
+        _equal_split_by_asado_month.c.amount / _participant_counts.c.count,
+        literal(0)
+    ).join(
+        _equal_split_by_asado_month, _equal_split_by_asado_month.c.asado_id == Participant.asado_id
+    ).join(
+        _participant_counts, _participant_counts.c.asado_id == Participant.asado_id
+    ),
+    select(
+        participant_key(Participant.name),
+        Participant.name,
+        year_month(Expense.timestamp),
+        Expense.asado_id,
+        literal(0.0),
+        Expense.amount * ExpenseShare.weight / _share_weight_totals.c.total_weight,
+        literal(0)
+    ).select_from(ExpenseShare).join(
+        Expense, Expense.id == ExpenseShare.expense_id
+    ).join(
+        Participant, Participant.id == ExpenseShare.participant_id
+    ).join(
+        _share_weight_totals, _share_weight_totals.c.expense_id == ExpenseShare.expense_id
+    ).where(_in_period)
+).subquery()
+
+PARTICIPANT_MONTHS = select(
+    _participant_activity.c.participant,
+    _participant_activity.c.month,
+    func.sum(_participant_activity.c.paid),
+    func.sum(_participant_activity.c.owed),
+    func.count(func.distinct(_participant_activity.c.asado_id))
+).group_by(
+    _participant_activity.c.participant, _participant_activity.c.month
+).order_by(_participant_activity.c.participant, _participant_activity.c.month)
+
+PARTICIPANT_ROLLUP = select(
+    _participant_activity.c.participant,
+    func.min(func.trim(_participant_activity.c.name)),
+    func.sum(_participant_activity.c.paid),
+    func.sum(_participant_activity.c.owed),
+    func.count(func.distinct(_participant_activity.c.asado_id)),
+    func.sum(_participant_activity.c.expenses)
+).group_by(_participant_activity.c.participant).order_by(func.sum(_participant_activity.c.paid).desc())
+
+# Totales por categoría y mes con ventanas: participación en el mes, mes
+# anterior de la misma categoría y acumulado
+_category_months = select(
+    year_month(Expense.timestamp).label('month'),
+    Expense.category,
+    func.sum(Expense.amount).label('total'),
+    func.count(Expense.id).label('expenses')
+).where(_in_period).group_by(year_month(Expense.timestamp), Expense.category).subquery()
+
+CATEGORY_TRENDS = select(
+    _category_months.c.month,
+    _category_months.c.category,
+    _category_months.c.total,
+    _category_months.c.expenses,
+    _category_months.c.total / func.sum(_category_months.c.total).over(partition_by=_category_months.c.month),
+    func.lag(_category_months.c.total).over(partition_by=_category_months.c.category, order_by=_category_months.c.month),
+    func.sum(_category_months.c.total).over(partition_by=_category_months.c.category, order_by=_category_months.c.month)
+).order_by(_category_months.c.month, _category_months.c.category)
+
+EXPENSE_PERIOD = select(func.min(Expense.timestamp), func.max(Expense.timestamp))
+
+# (último id, cantidad) del log de cambios: cambia con cada alta o baja de
+# cualquier asado, también al eliminar un asado entero (baja la cantidad)
+DATA_VERSION = select(func.coalesce(func.max(AsadoChange.id), 0), func.count(AsadoChange.id))
+
 # Configuración de la base de datos
+# Claves de read-your-writes para lecturas que no son de un asado puntual
+ALL_ASADOS_KEY = '*'
+CATEGORIES_KEY = 'custom_categories'
+
 class DatabaseManager:
-    def __init__(self):
-        self.database_url = os.getenv('DATABASE_URL')
+    def __init__(self, database_url: str = None, read_urls=None, shard: str = None):
+        """Conexiones a una base; sin argumentos, la de DATABASE_URL con sus réplicas
+        
+        Con database_url explícita (un shard de DATABASE_SHARDS) las réplicas
+        son read_urls y LISTEN va a la misma base. shard es el nombre del
+        shard: separa sus archivos de asados archivados de los de los demás.
+        """
+        self.database_url = database_url or os.getenv('DATABASE_URL')
         if not self.database_url:
             raise ValueError("DATABASE_URL environment variable not set")
+        self.shard = shard
+        
+        # Salud de las conexiones del pool: "background" (un hilo prueba las
+        # ociosas cada DATABASE_POOL_CHECK_SECONDS y la primera consulta se
+        # reintenta si la conexión estaba cortada) o "pre_ping" (SELECT 1 en
+        # cada checkout)
+        self.pool_check = os.getenv('DATABASE_POOL_CHECK', 'background').lower()
+        if self.pool_check not in ('background', 'pre_ping'):
+            raise ValueError(f"DATABASE_POOL_CHECK inválido: {self.pool_check} (background o pre_ping)")
+        self.pool_check_seconds = float(os.getenv('DATABASE_POOL_CHECK_SECONDS', '30'))
+        self.pool_probe = None
+        # Detrás de PgBouncer en modo transacción: sin prepared statements del
+        # servidor ni estado de sesión (LISTEN va directo a DATABASE_LISTEN_URL)
+        self.pgbouncer = os.getenv('DATABASE_PGBOUNCER', '').lower() in ('1', 'true')
+        
+        self.engine = self._create_engine(self.database_url)
+        self.SessionLocal = sessionmaker(class_=RetryingSession, autocommit=False, autoflush=False, bind=self.engine)
         
-        self.engine = create_engine(
-            self.database_url,
-            pool_pre_ping=True,
+        # Réplicas de lectura opcionales: DATABASE_READ_URLS separadas por coma
+        if read_urls is None and database_url is None:
+            read_urls = [url.strip() for url in os.getenv('DATABASE_READ_URLS', '').split(',') if url.strip()]
+        read_urls = read_urls or []
+        self.read_engines = [self._create_engine(url) for url in read_urls]
+        self.ReadSessionLocals = [
+            sessionmaker(class_=RetryingSession, autocommit=False, autoflush=False, bind=engine)
+            for engine in self.read_engines
+        ]
+        # Segundos que una réplica caída queda fuera de la rotación
+        self.replica_retry_seconds = float(os.getenv('DATABASE_REPLICA_RETRY_SECONDS', '30'))
+        # Segundos que las lecturas de una clave escrita van a la primaria
+        self.read_your_writes_seconds = float(os.getenv('DATABASE_READ_YOUR_WRITES_SECONDS', '5'))
+        self._replica_down_until = [0.0] * len(self.read_engines)
+        self._recent_writes = {}
+        self._next_replica = itertools.count()
+        
+        # Conexión para LISTEN: la misma base salvo detrás de PgBouncer
+        listen_url = os.getenv('DATABASE_LISTEN_URL') if database_url is None else None
+        if listen_url:
+            self.listen_engine = self._create_engine(listen_url, pool_size=1)
+        else:
+            self.listen_engine = None if self.pgbouncer else self.engine
+    
+    def _create_engine(self, url, **pool_options):
+        url = make_url(url)
+        connect_args = {}
+        if url.get_backend_name() == 'postgresql':
+            # connect_timeout es propio de PostgreSQL; SQLite no lo acepta
+            connect_args["connect_timeout"] = 10
+            if url.drivername == 'postgresql' and psycopg_available():
+                # Sin driver explícito se prefiere psycopg 3 (prepared statements del servidor)
+                url = url.set(drivername='postgresql+psycopg')
+            if url.get_driver_name() == 'psycopg':
+                # Ejecuciones de una misma consulta antes de prepararla en el servidor ("off" desactiva)
+                threshold = 'off' if self.pgbouncer else os.getenv('DATABASE_PREPARE_THRESHOLD', '1')
+                connect_args["prepare_threshold"] = None if threshold.lower() == 'off' else int(threshold)
+        return create_engine(
+            url,
+            pool_pre_ping=self.pool_check == 'pre_ping',
             pool_recycle=300,
-            connect_args={"connect_timeout": 10}
+            connect_args=connect_args,
+            **pool_options
         )
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        
+    
     def create_tables(self):
         """Crear todas las tablas"""
         try:
             Base.metadata.create_all(bind=self.engine, checkfirst=True)
+            # Índices agregados a tablas que ya existían
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=self.engine, checkfirst=True)
+            setup_search(self.engine)
             logger.info("Tablas creadas exitosamente")
         except Exception as e:
             logger.error(f"Error creando tablas: {e}")
@@ -83,17 +610,83 @@ class DatabaseManager:
             if "already exists" not in str(e):
                 raise
     
+    def start_pool_probe(self):
+        """Probar en segundo plano las conexiones ociosas de la primaria y las réplicas"""
+        if self.pool_probe is not None or self.pool_check != 'background':
+            return
+        self.pool_probe = PoolProbe([self.engine] + self.read_engines, self.pool_check_seconds)
+        self.pool_probe.start()
+    
+    def stop_pool_probe(self):
+        if self.pool_probe is not None:
+            self.pool_probe.stop()
+            self.pool_probe = None
+    
     def get_session(self):
         """Obtener una sesión de base de datos"""
         return self.SessionLocal()
     
+    def get_read_session(self, *keys):
+        """Obtener una sesión de solo lectura
+        
+        Usa las réplicas sanas en round-robin. Va a la primaria si no hay
+        réplicas disponibles o si alguna de las claves (nombre de asado,
+        ALL_ASADOS_KEY, CATEGORIES_KEY) se escribió hace menos de read_your_writes_seconds.
+        """
+        if not self.ReadSessionLocals or self._recently_written(keys):
+            return self.get_session()
+        
+        now = time.monotonic()
+        count = len(self.ReadSessionLocals)
+        for _ in range(count):
+            index = next(self._next_replica) % count
+            if self._replica_down_until[index] <= now:
+                return self.ReadSessionLocals[index]()
+        return self.get_session()
+    
+    def record_write(self, *keys):
+        """Registrar una escritura para que las lecturas de esas claves vayan a la primaria"""
+        if not self.read_engines:
+            return
+        deadline = time.monotonic() + self.read_your_writes_seconds
+        for key in keys:
+            self._recent_writes[key] = deadline
+    
+    def _recently_written(self, keys):
+        now = time.monotonic()
+        return any(self._recent_writes.get(key, 0) > now for key in keys)
+    
+    def mark_replica_failed(self, session):
+        """Sacar de la rotación la réplica de una sesión que falló (si era réplica)"""
+        engine = session.get_bind()
+        for index, read_engine in enumerate(self.read_engines):
+            if read_engine is engine:
+                self._replica_down_until[index] = time.monotonic() + self.replica_retry_seconds
+                logger.warning(f"Réplica de lectura {index} fuera de servicio por {self.replica_retry_seconds}s")
+    
+    def check_replicas(self):
+        """Probar cada réplica y actualizar su estado; devuelve cuántas están sanas"""
+        healthy = 0
+        for index, engine in enumerate(self.read_engines):
+            try:
+                with engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+                self._replica_down_until[index] = 0.0
+                healthy += 1
+            except Exception as e:
+                logger.error(f"Error de conexión con réplica {index}: {e}")
+                self._replica_down_until[index] = time.monotonic() + self.replica_retry_seconds
+        return healthy
+    
     def test_connection(self):
         """Probar la conexión a la base de datos"""
         try:
             with self.engine.connect() as connection:
-                from sqlalchemy import text
                 connection.execute(text("SELECT 1"))
             logger.info("Conexión a base de datos exitosa")
+            if self.read_engines:
+                healthy = self.check_replicas()
+                logger.info(f"Réplicas de lectura sanas: {healthy}/{len(self.read_engines)}")
             return True
         except Exception as e:
             logger.error(f"Error de conexión: {e}")
@@ -103,21 +696,85 @@ class DatabaseManager:
 class AsadoService:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
+        # Categorías cacheadas para todo el proceso; se invalidan al modificarlas
+        self.categories = CategoryRegistry(self._load_custom_categories)
+        # Versiones de asados conocidas, mantenidas al día por el listener de avisos
+        self.versions = AsadoVersions()
+        self.listener = None
+        # Cola de escritura diferida de gastos (None = escritura directa)
+        self.expense_queue = None
+    
+    def start_listener(self):
+        """Escuchar los avisos de escritura de otros procesos (solo PostgreSQL)
+        
+        El hilo ocupa una conexión de listen_engine mientras corre. Detrás de
+        PgBouncer sin DATABASE_LISTEN_URL no hay listener: cada lectura
+        consulta la versión del asado.
+        """
+        engine = self.db_manager.listen_engine
+        if self.listener is not None or engine is None or engine.dialect.name != 'postgresql':
+            return
+        self.listener = ChangeListener(engine, self._on_change, self._on_listener_reset)
+        self.listener.start()
+    
+    def stop_listener(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+    
+    def start_write_behind(self):
+        """Escribir los gastos en lotes desde un hilo (ver ExpenseWriteQueue)"""
+        if self.expense_queue is not None:
+            return
+        self.expense_queue = ExpenseWriteQueue(
+            self,
+            max_size=int(os.getenv('EXPENSE_QUEUE_SIZE', '1000')),
+            batch_size=int(os.getenv('EXPENSE_BATCH_SIZE', '200')),
+            flush_seconds=float(os.getenv('EXPENSE_FLUSH_SECONDS', '0.2')),
+            put_timeout=float(os.getenv('EXPENSE_QUEUE_TIMEOUT_SECONDS', '2')),
+            spool_path=os.getenv('EXPENSE_SPOOL_PATH', 'expense_spool.jsonl')
+        )
+        self.expense_queue.start()
+    
+    def stop_write_behind(self):
+        """Escribir lo pendiente y volver a la escritura directa"""
+        if self.expense_queue is not None:
+            self.expense_queue.stop()
+            self.expense_queue = None
+    
+    def _on_change(self, payload):
+        """Aviso de escritura (de este u otro proceso): invalidar lo cacheado"""
+        if payload['kind'] == 'categories':
+            self.categories.invalidate()
+        elif payload['kind'] == 'asado':
+            self.versions.invalidate(payload['asado'])
+    
+    def _on_listener_reset(self, connected: bool):
+        # Sin listener no hay forma de saber qué cambió: se descarta todo
+        self.versions.reset(connected)
+        self.categories.invalidate()
+    
+    def db_managers(self):
+        """Bases que usa el servicio (con shards, la global y la de cada shard)"""
+        return [self.db_manager]
     
     def create_asado(self, name: str):
         """Crear un nuevo asado"""
         session = self.db_manager.get_session()
         try:
             # Verificar si ya existe
-            existing = session.query(Asado).filter(Asado.name == name).first()
-            if existing:
+            if self._get_asado_id(session, name) is not None:
                 return None
             
             asado = Asado(name=name)
             session.add(asado)
+            session.flush()
+            row = AsadoRow(asado.id, asado.name, asado.created_date)
+            notify_change(session, 'asado', asado=name, asado_id=asado.id, version=0)
             session.commit()
-            session.refresh(asado)
-            return asado
+            self.db_manager.record_write(name, ALL_ASADOS_KEY)
+            self.versions.invalidate(name)
+            return row
         except Exception as e:
             session.rollback()
             logger.error(f"Error creando asado: {e}")
@@ -127,42 +784,240 @@ class AsadoService:
     
     def get_all_asados(self):
         """Obtener todos los asados"""
-        session = self.db_manager.get_session()
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
         try:
-            asados = session.query(Asado).all()
-            return asados
+            return self._query_asado_rows(session)
         except Exception as e:
             session.rollback()
+            self.db_manager.mark_replica_failed(session)
             logger.error(f"Error obteniendo asados: {e}")
             # Reintentar con nueva sesión
             try:
                 session.close()
                 session = self.db_manager.get_session()
-                asados = session.query(Asado).all()
-                return asados
+                return self._query_asado_rows(session)
             except Exception as e2:
                 logger.error(f"Error en reintento: {e2}")
                 return []
         finally:
             session.close()
     
+    def get_asado_stats(self):
+        """Obtener todos los asados con cantidad de participantes, gastos y total"""
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
+        try:
+            participant_counts = session.query(
+                Participant.asado_id, func.count(Participant.id).label('count')
+            ).group_by(Participant.asado_id).subquery()
+            expense_totals = session.query(
+                Expense.asado_id,
+                func.count(Expense.id).label('count'),
+                func.sum(Expense.amount).label('total')
+            ).group_by(Expense.asado_id).subquery()
+            
+            # Los asados archivados no tienen filas: sus totales salen del stub
+            rows = session.query(
+                *ASADO_ROW_COLUMNS,
+                func.coalesce(participant_counts.c.count, AsadoArchive.participants, 0),
+                func.coalesce(expense_totals.c.count, AsadoArchive.expenses, 0),
+                func.coalesce(expense_totals.c.total, AsadoArchive.total, 0.0),
+                AsadoArchive.archived_date
+            ).outerjoin(
+                participant_counts, participant_counts.c.asado_id == Asado.id
+            ).outerjoin(
+                expense_totals, expense_totals.c.asado_id == Asado.id
+            ).outerjoin(
+                AsadoArchive, AsadoArchive.asado_id == Asado.id
+            ).order_by(Asado.id).all()
+            return [AsadoStatsRow._make(row) for row in rows]
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo estadísticas de asados: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def search_expenses(self, query: str, asado_name: str = None, limit: int = 20):
+        """Buscar gastos por descripción, categoría o participante (tolera errores de tipeo)
+        
+        Sin asado_name busca en todos los asados. Devuelve hasta limit
+        SearchResultRow ordenados por relevancia.
+        """
+        session = self.db_manager.get_read_session(asado_name or ALL_ASADOS_KEY)
+        try:
+            asado_id = None
+            if asado_name is not None:
+                asado_id = self._get_asado_id(session, asado_name)
+                if asado_id is None:
+                    return []
+            return search_expenses(session, query, asado_id, limit, self.categories.all())
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error buscando gastos: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def get_data_version(self):
+        """Versión de todos los datos: cambia con cada alta o baja en cualquier asado"""
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
+        try:
+            return tuple(session.execute(DATA_VERSION).one())
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo versión de los datos: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def get_expense_years(self):
+        """Años con gastos registrados, del más reciente al más antiguo"""
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
+        try:
+            first, last = session.execute(EXPENSE_PERIOD).one()
+            if first is None:
+                return []
+            return list(range(last.year, first.year - 1, -1))
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo años con gastos: {e}")
+            return []
+        finally:
+            session.close()
+    
+    @staticmethod
+    def _period(year=None):
+        """Parámetros start/end de las consultas de analítica (un año o todo)"""
+        if year is None:
+            return {'start': datetime(1900, 1, 1), 'end': datetime(3000, 1, 1)}
+        return {'start': datetime(year, 1, 1), 'end': datetime(year + 1, 1, 1)}
+    
+    def get_participant_analytics(self, year=None):
+        """Pagado y lo que le toca a cada participante entre todos los asados, por mes y en total
+        
+        Los participantes se juntan por nombre normalizado (sin mayúsculas
+        ni espacios de más). Todo se agrega en la base, así que los asados
+        archivados (que solo están en su Parquet) no se cuentan. Devuelve
+        {'months': [ParticipantMonthRow], 'totals': [ParticipantRollupRow]}.
+        """
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
+        try:
+            params = self._period(year)
+            return {
+                'months': [ParticipantMonthRow._make(row) for row in session.execute(PARTICIPANT_MONTHS, params)],
+                'totals': [ParticipantRollupRow._make(row) for row in session.execute(PARTICIPANT_ROLLUP, params)]
+            }
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo analítica de participantes: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def get_category_trends(self, year=None):
+        """Total por categoría y mes con su participación en el mes, el mes anterior y el acumulado"""
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
+        try:
+            return [CategoryTrendRow._make(row) for row in session.execute(CATEGORY_TRENDS, self._period(year))]
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo tendencias por categoría: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def stream_participant_totals(self, batch_size: int = 5000):
+        """Generar los totales por participante de todos los asados, ordenados por asado
+        
+        Cada fila es (asado_id, asado, participante, pagado, parte de los
+        gastos con división explícita, total del asado a dividir en partes iguales).
+        
+        Lee en tandas de batch_size filas (cursor del servidor en PostgreSQL)
+        sin cargar todo en memoria. Asados sin participantes no aparecen. Los
+        asados archivados se intercalan en orden con los totales guardados
+        en su archivo.
+        """
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
+        try:
+            archived = self._archived_totals(session.execute(ARCHIVED_ASADOS).all())
+            result = session.execute(PARTICIPANT_TOTALS.execution_options(yield_per=batch_size))
+            yield from heapq.merge((tuple(row) for row in result), archived, key=itemgetter(0))
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error leyendo totales por participante: {e}")
+            raise
+        finally:
+            session.close()
+    
+    @staticmethod
+    def _archived_totals(archived):
+        """Filas de totales (como PARTICIPANT_TOTALS) de los asados archivados, leídas del footer de cada archivo"""
+        for asado_id, asado_name, path in archived:
+            metadata = read_archive_metadata(path)
+            for participant, paid, weighted in metadata['totals']:
+                yield asado_id, asado_name, participant, paid, weighted, metadata['equal_split']
+    
     def get_asado_by_name(self, name: str):
-        """Obtener asado por nombre"""
-        session = self.db_manager.get_session()
+        """Obtener asado por nombre (None si no existe)
+        
+        Si falla la réplica se saca de la rotación y se reintenta en la
+        primaria; si también falla ahí, el error llega al que llamó (None
+        significaría que el asado no existe).
+        """
+        session = self.db_manager.get_read_session(name)
         try:
-            asado = session.query(Asado).filter(Asado.name == name).first()
-            return asado
+            return self._query_asado_by_name(session, name)
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo asado por nombre: {e}")
+            session.close()
+            session = self.db_manager.get_session()
+            try:
+                return self._query_asado_by_name(session, name)
+            except Exception as e2:
+                session.rollback()
+                logger.error(f"Error en reintento obteniendo asado por nombre: {e2}")
+                raise
         finally:
             session.close()
     
+    def _query_asado_by_name(self, session, name: str):
+        row = session.execute(ASADO_ROW_BY_NAME, {'asado_name': name}).first()
+        return AsadoRow._make(row) if row else None
+    
+    def _query_asado_rows(self, session):
+        return [AsadoRow._make(row) for row in session.query(*ASADO_ROW_COLUMNS).order_by(Asado.id)]
+    
+    def _get_asado_id(self, session, asado_name: str):
+        """Id del asado con ese nombre (o None) sin hidratar el objeto ORM"""
+        return session.execute(ASADO_ID_BY_NAME, {'asado_name': asado_name}).scalar()
+    
+    def _get_asado(self, session, asado_name: str):
+        """(id, ruta del archivo o None si no está archivado) del asado, o None si no existe"""
+        return session.execute(ASADO_WITH_ARCHIVE, {'asado_name': asado_name}).first()
+    
     def delete_asado(self, name: str):
         """Eliminar un asado"""
         session = self.db_manager.get_session()
         try:
             asado = session.query(Asado).filter(Asado.name == name).first()
             if asado:
+                archive_path = asado.archive.path if asado.archive else None
+                notify_change(session, 'asado', asado=name, asado_id=asado.id, version=None)
                 session.delete(asado)
                 session.commit()
+                self.db_manager.record_write(name, ALL_ASADOS_KEY)
+                self.versions.invalidate(name)
+                if archive_path:
+                    self._remove_archive_file(archive_path)
                 return True
             return False
         except Exception as e:
@@ -172,27 +1027,261 @@ class AsadoService:
         finally:
             session.close()
     
+    def archive_asado(self, name: str):
+        """Archivar un asado: mover participantes, gastos y divisiones a un Parquet
+        
+        Deja la fila del asado con un stub en asado_archives (ruta y totales)
+        y solo el último cambio del log; desde entonces el asado es de solo
+        lectura y se lee del archivo. Devuelve False si no existe o ya está
+        archivado.
+        """
+        session = self.db_manager.get_session()
+        path = None
+        try:
+            # FOR UPDATE en PostgreSQL: bloquea altas que referencien al asado hasta el commit
+            asado = session.execute(
+                select(Asado.id, Asado.name, Asado.created_date).where(Asado.name == name).with_for_update()
+            ).first()
+            if asado is None or session.get(AsadoArchive, asado.id) is not None:
+                return False
+            
+            params = {'asado_id': asado.id}
+            participants = session.execute(PARTICIPANT_ROWS_BY_ASADO, params).all()
+            expenses = expense_rows_to_columns(session.execute(EXPENSES_BY_ASADO, params).all())
+            shares = self._query_shares(session, asado.id)
+            totals = session.execute(ASADO_PARTICIPANT_TOTALS, params).all()
+            version = self._record_change(session, asado.id, 'asado', asado.id, 'archive')
+            
+            path = archive_file(asado.id, self.db_manager.shard)
+            write_archive(path, {
+                'asado_id': asado.id,
+                'name': asado.name,
+                'created_date': asado.created_date,
+                'participants': [[participant_id, participant_name] for participant_id, participant_name, _ in participants],
+                'totals': [[participant, paid, weighted] for _, _, participant, paid, weighted, _ in totals],
+                'equal_split': totals[0][5] if totals else 0.0
+            }, expenses, shares)
+            
+            expense_ids = select(Expense.id).where(Expense.asado_id == asado.id)
+            session.execute(delete(ExpenseShare).where(ExpenseShare.expense_id.in_(expense_ids)))
+            session.execute(delete(Expense).where(Expense.asado_id == asado.id))
+            session.execute(delete(Participant).where(Participant.asado_id == asado.id))
+            # La versión sigue siendo la del último cambio, que queda
+            session.execute(delete(AsadoChange).where(AsadoChange.asado_id == asado.id, AsadoChange.id < version))
+            session.add(AsadoArchive(
+                asado_id=asado.id,
+                path=path,
+                participants=len(participants),
+                expenses=len(expenses['id']),
+                total=float(expenses['amount'].sum())
+            ))
+            notify_change(session, 'asado', asado=name, asado_id=asado.id, version=version)
+            session.commit()
+            self.db_manager.record_write(name, ALL_ASADOS_KEY)
+            self.versions.invalidate(name)
+            return True
+        except Exception as e:
+            session.rollback()
+            if path is not None:
+                self._remove_archive_file(path)
+            logger.error(f"Error archivando asado: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def restore_asado(self, name: str):
+        """Devolver un asado archivado a las tablas (los gastos reciben ids nuevos)
+        
+        Devuelve False si no existe o no está archivado.
+        """
+        session = self.db_manager.get_session()
+        try:
+            asado = session.execute(
+                select(Asado.id).where(Asado.name == name).with_for_update()
+            ).first()
+            archive = session.get(AsadoArchive, asado.id) if asado else None
+            if archive is None:
+                return False
+            
+            archived = read_archive(archive.path)
+            participant_ids = {}
+            if archived.participants:
+                inserted = session.scalars(
+                    insert(Participant).returning(Participant.id, sort_by_parameter_order=True),
+                    [{'name': participant_name, 'asado_id': asado.id} for _, participant_name in archived.participants]
+                ).all()
+                participant_ids = {
+                    participant_name: participant_id
+                    for (_, participant_name), participant_id in zip(archived.participants, inserted)
+                }
+            
+            expenses = archived.expenses
+            expense_ids = {}
+            if len(expenses['id']):
+                inserted = session.scalars(
+                    insert(Expense).returning(Expense.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            'participant_id': participant_ids[participant],
+                            'asado_id': asado.id,
+                            'category': category,
+                            'amount': amount,
+                            'description': description,
+                            'timestamp': timestamp
+                        }
+                        for participant, category, amount, description, timestamp in zip(
+                            expenses['participant'].tolist(), expenses['category'].tolist(), expenses['amount'].tolist(),
+                            expenses['description'].tolist(), expenses['timestamp'].tolist()
+                        )
+                    ]
+                ).all()
+                expense_ids = dict(zip(expenses['id'].tolist(), inserted))
+            
+            shares = archived.shares
+            if len(shares['expense_id']):
+                session.execute(insert(ExpenseShare), [
+                    {'expense_id': expense_ids[expense_id], 'participant_id': participant_ids[participant], 'weight': weight}
+                    for expense_id, participant, weight in zip(
+                        shares['expense_id'].tolist(), shares['participant'].tolist(), shares['weight'].tolist()
+                    )
+                ])
+            
+            # Los clientes releen todo el asado (ver EXPENSE_VERSION)
+            version = self._record_change(session, asado.id, 'asado', asado.id, 'restore')
+            path = archive.path
+            session.delete(archive)
+            notify_change(session, 'asado', asado=name, asado_id=asado.id, version=version)
+            session.commit()
+            self.db_manager.record_write(name, ALL_ASADOS_KEY)
+            self.versions.invalidate(name)
+            self._remove_archive_file(path)
+            return True
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error restaurando asado: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def get_archive_path(self, name: str):
+        """Ruta del Parquet de un asado archivado (None si no existe o no está archivado)"""
+        session = self.db_manager.get_session()
+        try:
+            asado = self._get_asado(session, name)
+            return asado.path if asado else None
+        finally:
+            session.close()
+    
+    def import_archive(self, path: str):
+        """Dar de alta, archivado, un asado exportado por archive_asado en otra base
+        
+        Copia el Parquet al directorio de archivos de esta base y crea la
+        fila del asado (mismo nombre y fecha) con su stub; restore_asado lo
+        devuelve a las tablas. Lo usa el rebalanceo de shards (ver
+        shards.py). Devuelve el AsadoRow o None si ya hay un asado con ese nombre.
+        """
+        metadata = read_archive_metadata(path)
+        archived = read_archive(path)
+        session = self.db_manager.get_session()
+        target = None
+        try:
+            if self._get_asado_id(session, archived.name) is not None:
+                return None
+            
+            asado = Asado(name=archived.name)
+            if metadata['created_date']:
+                asado.created_date = datetime.fromisoformat(metadata['created_date'])
+            session.add(asado)
+            session.flush()
+            target = archive_file(asado.id, self.db_manager.shard)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(path, f"{target}.tmp")
+            os.replace(f"{target}.tmp", target)
+            session.add(AsadoArchive(
+                asado_id=asado.id,
+                path=target,
+                participants=len(archived.participants),
+                expenses=len(archived.expenses['id']),
+                total=float(archived.expenses['amount'].sum())
+            ))
+            version = self._record_change(session, asado.id, 'asado', asado.id, 'archive')
+            row = AsadoRow(asado.id, asado.name, asado.created_date)
+            notify_change(session, 'asado', asado=asado.name, asado_id=asado.id, version=version)
+            session.commit()
+            self.db_manager.record_write(asado.name, ALL_ASADOS_KEY)
+            self.versions.invalidate(asado.name)
+            return row
+        except Exception as e:
+            session.rollback()
+            if target is not None:
+                self._remove_archive_file(target)
+            logger.error(f"Error importando asado archivado: {e}")
+            raise
+        finally:
+            session.close()
+    
+    @staticmethod
+    def _remove_archive_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"No se pudo borrar el archivo {path}: {e}")
+    
+    def get_idle_asados(self, before: datetime):
+        """Nombres de los asados sin archivar cuyo último cambio es anterior a before"""
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
+        try:
+            return session.execute(IDLE_ASADOS, {'before': before}).scalars().all()
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo asados inactivos: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def count_archived_asados(self):
+        """Cantidad de asados archivados (quedan fuera de la búsqueda y del Historial)"""
+        session = self.db_manager.get_read_session(ALL_ASADOS_KEY)
+        try:
+            return session.execute(ARCHIVED_COUNT).scalar()
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error contando asados archivados: {e}")
+            return 0
+        finally:
+            session.close()
+    
     def add_participant(self, asado_name: str, participant_name: str):
-        """Agregar participante a un asado"""
+        """Agregar participante a un asado (no archivado)"""
         session = self.db_manager.get_session()
         try:
-            asado = session.query(Asado).filter(Asado.name == asado_name).first()
-            if not asado:
+            asado = self._get_asado(session, asado_name)
+            if asado is None or asado.path is not None:
                 return None
+            asado_id = asado.id
             
             # Verificar si ya existe
-            existing = session.query(Participant).filter(
+            existing = session.query(Participant.id).filter(
                 Participant.name == participant_name,
-                Participant.asado_id == asado.id
+                Participant.asado_id == asado_id
             ).first()
             if existing:
                 return None
             
-            participant = Participant(name=participant_name, asado_id=asado.id)
+            participant = Participant(name=participant_name, asado_id=asado_id)
             session.add(participant)
+            session.flush()
+            version = self._record_change(session, asado_id, 'participant', participant.id, 'insert')
+            row = ParticipantRow(participant.id, participant_name, asado_id)
+            notify_change(session, 'asado', asado=asado_name, asado_id=asado_id, version=version)
             session.commit()
-            session.refresh(participant)
-            return participant
+            self.db_manager.record_write(asado_name, ALL_ASADOS_KEY)
+            self.versions.invalidate(asado_name)
+            return row
         except Exception as e:
             session.rollback()
             logger.error(f"Error agregando participante: {e}")
@@ -202,47 +1291,79 @@ class AsadoService:
     
     def get_participants(self, asado_name: str):
         """Obtener participantes de un asado"""
-        session = self.db_manager.get_session()
+        session = self.db_manager.get_read_session(asado_name)
         try:
-            asado = session.query(Asado).filter(Asado.name == asado_name).first()
-            if not asado:
+            asado = self._get_asado(session, asado_name)
+            if asado is None:
                 return []
             
-            participants = session.query(Participant).filter(Participant.asado_id == asado.id).all()
-            return [p.name for p in participants]
+            return self._query_participant_names(session, *asado)
         except Exception as e:
             session.rollback()
+            self.db_manager.mark_replica_failed(session)
             logger.error(f"Error obteniendo participantes: {e}")
             try:
                 session.close()
                 session = self.db_manager.get_session()
-                asado = session.query(Asado).filter(Asado.name == asado_name).first()
-                if not asado:
+                asado = self._get_asado(session, asado_name)
+                if asado is None:
                     return []
-                participants = session.query(Participant).filter(Participant.asado_id == asado.id).all()
-                return [p.name for p in participants]
+                return self._query_participant_names(session, *asado)
             except Exception as e2:
                 logger.error(f"Error en reintento obteniendo participantes: {e2}")
                 return []
         finally:
             session.close()
     
+    def get_participant_rows(self, asado_name: str):
+        """Obtener participantes de un asado como ParticipantRow"""
+        session = self.db_manager.get_read_session(asado_name)
+        try:
+            asado = self._get_asado(session, asado_name)
+            if asado is None:
+                return []
+            if asado.path is not None:
+                return [
+                    ParticipantRow(participant_id, name, asado.id)
+                    for participant_id, name in read_archive_metadata(asado.path)['participants']
+                ]
+            return [
+                ParticipantRow._make(row)
+                for row in session.execute(PARTICIPANT_ROWS_BY_ASADO, {'asado_id': asado.id})
+            ]
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo participantes: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def _query_participant_names(self, session, asado_id: int, archive_path: str = None):
+        if archive_path is not None:
+            return [name for _, name in read_archive_metadata(archive_path)['participants']]
+        return session.execute(PARTICIPANT_NAMES_BY_ASADO, {'asado_id': asado_id}).scalars().all()
+    
     def remove_participant(self, asado_name: str, participant_name: str):
         """Eliminar participante de un asado"""
         session = self.db_manager.get_session()
         try:
-            asado = session.query(Asado).filter(Asado.name == asado_name).first()
-            if not asado:
+            asado_id = self._get_asado_id(session, asado_name)
+            if asado_id is None:
                 return False
             
             participant = session.query(Participant).filter(
                 Participant.name == participant_name,
-                Participant.asado_id == asado.id
+                Participant.asado_id == asado_id
             ).first()
             
             if participant:
+                version = self._record_change(session, asado_id, 'participant', participant.id, 'delete')
+                notify_change(session, 'asado', asado=asado_name, asado_id=asado_id, version=version)
                 session.delete(participant)
                 session.commit()
+                self.db_manager.record_write(asado_name, ALL_ASADOS_KEY)
+                self.versions.invalidate(asado_name)
                 return True
             return False
         except Exception as e:
@@ -252,32 +1373,49 @@ class AsadoService:
         finally:
             session.close()
     
-    def add_expense(self, asado_name: str, participant_name: str, category: str, amount: float, description: str = ""):
-        """Agregar gasto"""
+    def add_expense(self, asado_name: str, participant_name: str, category: str, amount: float, description: str = "", shares=None):
+        """Agregar gasto
+        
+        shares es un mapeo participante -> peso para dividir el gasto solo
+        entre esos participantes; sin shares se divide entre todos por igual.
+        """
         session = self.db_manager.get_session()
         try:
-            asado = session.query(Asado).filter(Asado.name == asado_name).first()
-            if not asado:
+            asado_id = self._get_asado_id(session, asado_name)
+            if asado_id is None:
                 return None
             
-            participant = session.query(Participant).filter(
+            participant_id = session.query(Participant.id).filter(
                 Participant.name == participant_name,
-                Participant.asado_id == asado.id
-            ).first()
-            if not participant:
+                Participant.asado_id == asado_id
+            ).scalar()
+            if participant_id is None:
+                return None
+            
+            share_rows = self._resolve_shares(session, asado_id, shares)
+            if share_rows is None:
                 return None
             
             expense = Expense(
-                participant_id=participant.id,
-                asado_id=asado.id,
+                participant_id=participant_id,
+                asado_id=asado_id,
                 category=category,
                 amount=amount,
                 description=description
             )
             session.add(expense)
+            session.flush()
+            self._insert_shares(session, expense.id, share_rows)
+            version = self._record_change(session, asado_id, 'expense', expense.id, 'insert')
+            row = ExpenseRow(
+                expense.id, participant_name, expense.category,
+                expense.amount, expense.description, expense.timestamp
+            )
+            notify_change(session, 'asado', asado=asado_name, asado_id=asado_id, version=version)
             session.commit()
-            session.refresh(expense)
-            return expense
+            self.db_manager.record_write(asado_name, ALL_ASADOS_KEY)
+            self.versions.invalidate(asado_name)
+            return row
         except Exception as e:
             session.rollback()
             logger.error(f"Error agregando gasto: {e}")
@@ -285,67 +1423,463 @@ class AsadoService:
         finally:
             session.close()
     
-    def get_expenses(self, asado_name: str):
-        """Obtener gastos de un asado"""
+    def submit_expense(self, asado_name: str, participant_name: str, category: str, amount: float, description: str = "", shares=None):
+        """Agregar gasto por la cola de escritura diferida si está activa
+        
+        Con la cola devuelve el id provisorio (negativo) del gasto pendiente;
+        sin ella, lo mismo que add_expense.
+        """
+        if self.expense_queue is None:
+            return self.add_expense(asado_name, participant_name, category, amount, description, shares)
+        return self.expense_queue.submit(asado_name, participant_name, category, amount, description, shares)
+    
+    def _resolve_shares(self, session, asado_id: int, shares):
+        """[(participant_id, peso), ...] de un mapeo participante -> peso
+        
+        Devuelve [] sin shares (división en partes iguales) y None si algún
+        participante no es del asado. Los pesos 0 se omiten.
+        """
+        if not shares:
+            return []
+        if not self._valid_weights(shares):
+            raise ValueError("Los pesos deben ser positivos (0 excluye al participante)")
+        
+        participant_ids = dict(session.execute(
+            select(Participant.name, Participant.id).where(
+                Participant.asado_id == asado_id,
+                Participant.name.in_(list(shares))
+            )
+        ).all())
+        if len(participant_ids) != len(shares):
+            return None
+        return [(participant_ids[name], float(weight)) for name, weight in shares.items() if weight > 0]
+    
+    @staticmethod
+    def _valid_weights(shares):
+        """Si los pesos de una división sirven: ninguno negativo y al menos uno positivo"""
+        return all(weight >= 0 for weight in shares.values()) and any(weight > 0 for weight in shares.values())
+    
+    def _insert_shares(self, session, expense_id: int, share_rows):
+        if share_rows:
+            session.execute(insert(ExpenseShare), [
+                {'expense_id': expense_id, 'participant_id': participant_id, 'weight': weight}
+                for participant_id, weight in share_rows
+            ])
+    
+    def set_expense_shares(self, expense_id: int, shares=None, asado_name: str = None):
+        """Cambiar entre quiénes (y con qué pesos) se divide un gasto; sin shares, entre todos
+        
+        Con asado_name solo cambia el gasto si es de ese asado.
+        """
         session = self.db_manager.get_session()
         try:
-            asado = session.query(Asado).filter(Asado.name == asado_name).first()
-            if not asado:
-                return []
+            query = session.query(Expense.id, Expense.asado_id).filter(Expense.id == expense_id)
+            if asado_name is not None:
+                query = query.join(Asado, Asado.id == Expense.asado_id).filter(Asado.name == asado_name)
+            expense = query.first()
+            if expense is None:
+                return False
+            share_rows = self._resolve_shares(session, expense.asado_id, shares)
+            if share_rows is None:
+                return False
+            
+            session.query(ExpenseShare).filter(ExpenseShare.expense_id == expense_id).delete(synchronize_session=False)
+            self._insert_shares(session, expense_id, share_rows)
+            asado_name = session.query(Asado.name).filter(Asado.id == expense.asado_id).scalar()
+            version = self._record_change(session, expense.asado_id, 'share', expense_id, 'update')
+            notify_change(session, 'asado', asado=asado_name, asado_id=expense.asado_id, version=version)
+            session.commit()
+            self.db_manager.record_write(asado_name, ALL_ASADOS_KEY)
+            self.versions.invalidate(asado_name)
+            return True
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error cambiando la división del gasto: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def get_expense_shares(self, asado_name: str):
+        """Pesos de división de los gastos del asado en formato columnar (ver SHARE_COLUMNS)"""
+        session = self.db_manager.get_read_session(asado_name)
+        try:
+            asado = self._get_asado(session, asado_name)
+            if asado is None:
+                return share_rows_to_columns([])
+            if asado.path is not None:
+                return read_archive(asado.path).shares
+            return self._query_shares(session, asado.id)
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo divisiones de gastos: {e}")
+            return share_rows_to_columns([])
+        finally:
+            session.close()
+    
+    def _query_shares(self, session, asado_id: int):
+        return share_rows_to_columns(session.execute(SHARES_BY_ASADO, {'asado_id': asado_id}).all())
+    
+    def get_pending_expenses(self, asado_name: str, written_ids=()):
+        """Gastos del asado encolados y todavía no escritos (filas en el orden de EXPENSE_COLUMNS)
+        
+        written_ids son los ids de gastos ya leídos de la base, para no repetirlos.
+        """
+        if self.expense_queue is None:
+            return []
+        return self.expense_queue.pending(asado_name, written_ids)
+    
+    def get_pending_shares(self, asado_name: str, written_ids=()):
+        """Divisiones de los gastos encolados, en formato columnar (ver SHARE_COLUMNS)"""
+        if self.expense_queue is None:
+            return share_rows_to_columns([])
+        return share_rows_to_columns(self.expense_queue.pending_shares(asado_name, written_ids))
+    
+    def add_expenses(self, items):
+        """Agregar varios gastos con un INSERT multi-fila y un solo commit
+        
+        items son dicts con asado, participant, category, amount, description,
+        timestamp y opcionalmente shares (participante -> peso); a cada uno
+        se le agrega expense_id antes del commit. Los que apuntan a un asado
+        o participante inexistente, o cuya división tiene pesos inválidos
+        (como en _resolve_shares), se descartan.
+        Devuelve los ids creados (None para los descartados).
+        """
+        session = self.db_manager.get_session()
+        try:
+            asado_names = {item['asado'] for item in items}
+            asado_ids = dict(session.execute(
+                select(Asado.name, Asado.id).where(Asado.name.in_(asado_names))
+            ).all())
+            participant_ids = {
+                (asado_id, name): participant_id
+                for participant_id, name, asado_id in session.execute(
+                    select(*PARTICIPANT_ROW_COLUMNS).where(Participant.asado_id.in_(asado_ids.values()))
+                )
+            }
             
-            expenses = session.query(Expense).join(Participant).filter(
-                Expense.asado_id == asado.id
+            valid = []
+            share_rows = {}
+            for index, item in enumerate(items):
+                asado_id = asado_ids.get(item['asado'])
+                participant_id = participant_ids.get((asado_id, item['participant']))
+                if participant_id is None:
+                    logger.warning(f"Gasto descartado: no existe {item['participant']} en {item['asado']}")
+                    continue
+                shares = item.get('shares') or {}
+                if shares and not self._valid_weights(shares):
+                    logger.warning(f"Gasto descartado: pesos de división negativos o todos en 0 en {item['asado']}")
+                    continue
+                if any((asado_id, name) not in participant_ids for name in shares):
+                    logger.warning(f"Gasto descartado: división con participantes que no son de {item['asado']}")
+                    continue
+                share_rows[index] = [
+                    (participant_ids[(asado_id, name)], float(weight))
+                    for name, weight in shares.items() if weight > 0
+                ]
+                valid.append((index, asado_id, {
+                    'participant_id': participant_id,
+                    'asado_id': asado_id,
+                    'category': item['category'],
+                    'amount': item['amount'],
+                    'description': item['description'],
+                    'timestamp': item['timestamp']
+                }))
+            
+            expense_ids = [None] * len(items)
+            if not valid:
+                return expense_ids
+            
+            inserted = session.scalars(
+                insert(Expense).returning(Expense.id, sort_by_parameter_order=True),
+                [values for _, _, values in valid]
+            ).all()
+            shares = [
+                {'expense_id': expense_id, 'participant_id': participant_id, 'weight': weight}
+                for (index, _, _), expense_id in zip(valid, inserted)
+                for participant_id, weight in share_rows[index]
+            ]
+            if shares:
+                session.execute(insert(ExpenseShare), shares)
+            change_ids = session.scalars(
+                insert(AsadoChange).returning(AsadoChange.id, sort_by_parameter_order=True),
+                [
+                    {'asado_id': asado_id, 'entity': 'expense', 'entity_id': expense_id, 'operation': 'insert'}
+                    for (_, asado_id, _), expense_id in zip(valid, inserted)
+                ]
             ).all()
             
-            expense_list = []
-            for expense in expenses:
-                expense_list.append({
-                    'id': expense.id,
-                    'participant': expense.participant.name,
-                    'category': expense.category,
-                    'amount': expense.amount,
-                    'description': expense.description,
-                    'timestamp': expense.timestamp
-                })
+            # Un aviso por asado con su última versión
+            versions = {}
+            for (index, asado_id, _), expense_id, change_id in zip(valid, inserted, change_ids):
+                expense_ids[index] = expense_id
+                # Antes del commit: quien lea el gasto de la base ya puede reconocerlo
+                items[index]['expense_id'] = expense_id
+                versions[items[index]['asado']] = (asado_id, change_id)
+            for asado_name, (asado_id, version) in versions.items():
+                notify_change(session, 'asado', asado=asado_name, asado_id=asado_id, version=version)
+            session.commit()
+            
+            self.db_manager.record_write(*versions, ALL_ASADOS_KEY)
+            for asado_name in versions:
+                self.versions.invalidate(asado_name)
+            return expense_ids
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error agregando gastos: {e}")
+            raise
+        finally:
+            session.close()
+    
+    def get_expenses(self, asado_name: str):
+        """Obtener gastos de un asado"""
+        session = self.db_manager.get_read_session(asado_name)
+        try:
+            asado = self._get_asado(session, asado_name)
+            if asado is None:
+                return []
             
-            return expense_list
+            return self._query_expense_rows(session, *asado)
         except Exception as e:
             session.rollback()
+            self.db_manager.mark_replica_failed(session)
             logger.error(f"Error obteniendo gastos: {e}")
             try:
                 session.close()
                 session = self.db_manager.get_session()
-                asado = session.query(Asado).filter(Asado.name == asado_name).first()
-                if not asado:
+                asado = self._get_asado(session, asado_name)
+                if asado is None:
                     return []
-                expenses = session.query(Expense).join(Participant).filter(
-                    Expense.asado_id == asado.id
-                ).all()
-                expense_list = []
-                for expense in expenses:
-                    expense_list.append({
-                        'id': expense.id,
-                        'participant': expense.participant.name,
-                        'category': expense.category,
-                        'amount': expense.amount,
-                        'description': expense.description,
-                        'timestamp': expense.timestamp
-                    })
-                return expense_list
+                return self._query_expense_rows(session, *asado)
             except Exception as e2:
                 logger.error(f"Error en reintento obteniendo gastos: {e2}")
                 return []
         finally:
             session.close()
     
-    def remove_expense(self, expense_id: int):
-        """Eliminar un gasto"""
+    def _query_expense_rows(self, session, asado_id: int, archive_path: str = None):
+        if archive_path is not None:
+            expenses = read_archive(archive_path).expenses
+            return [ExpenseRow._make(row) for row in zip(*(expenses[column].tolist() for column in EXPENSE_COLUMNS))]
+        return [ExpenseRow._make(row) for row in session.execute(EXPENSES_BY_ASADO, {'asado_id': asado_id})]
+    
+    def get_expenses_columnar(self, asado_name: str, as_arrow: bool = False):
+        """Obtener gastos de un asado en formato columnar
+        
+        Devuelve un dict de arrays NumPy (ver EXPENSE_COLUMNS) o, con
+        as_arrow=True, una pyarrow.Table. No arma un dict por fila.
+        """
+        session = self.db_manager.get_read_session(asado_name)
+        try:
+            columns = self._query_expenses_columnar(session, asado_name)
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo gastos: {e}")
+            try:
+                session.close()
+                session = self.db_manager.get_session()
+                columns = self._query_expenses_columnar(session, asado_name)
+            except Exception as e2:
+                logger.error(f"Error en reintento obteniendo gastos: {e2}")
+                columns = expense_rows_to_columns([])
+        finally:
+            session.close()
+        
+        if as_arrow:
+            import pyarrow as pa
+            return pa.table(columns)
+        return columns
+    
+    def _query_expenses_columnar(self, session, asado_name: str):
+        asado = self._get_asado(session, asado_name)
+        if asado is None:
+            return expense_rows_to_columns([])
+        if asado.path is not None:
+            return read_archive(asado.path).expenses
+        
+        rows = session.execute(EXPENSES_BY_ASADO, {'asado_id': asado.id}).all()
+        return expense_rows_to_columns(rows)
+    
+    def get_expense_changes(self, asado_name: str, since_version: int = 0):
+        """Obtener gastos agregados y eliminados desde una versión dada
+        
+        Con since_version=0 devuelve todos los gastos del asado (reset=True).
+        Los gastos agregados vienen en formato columnar (ver EXPENSE_COLUMNS).
+        """
+        session = self.db_manager.get_read_session(asado_name)
+        try:
+            return self._query_expense_changes(session, asado_name, since_version)
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo cambios de gastos: {e}")
+            try:
+                session.close()
+                session = self.db_manager.get_session()
+                return self._query_expense_changes(session, asado_name, since_version)
+            except Exception as e2:
+                logger.error(f"Error en reintento obteniendo cambios de gastos: {e2}")
+                return None
+        finally:
+            session.close()
+    
+    def _query_expense_changes(self, session, asado_name: str, since_version: int):
+        asado = self._get_asado(session, asado_name)
+        if asado is None:
+            return None
+        if asado.path is not None:
+            version = session.execute(ASADO_VERSION, {'asado_id': asado.id}).scalar() or 0
+            return self._archived_snapshot(asado.id, version, since_version, asado.path)['expenses']
+        return self._query_expense_changes_by_id(session, asado.id, since_version)
+    
+    def _query_expense_changes_by_id(self, session, asado_id: int, since_version: int):
+        # La versión se lee antes que los datos: si se cuela un gasto más nuevo
+        # volverá a llegar en el próximo delta y el cliente lo reemplaza por id.
+        version, reset_version = session.execute(EXPENSE_VERSION, {'asado_id': asado_id}).one()
+        version = max(version or 0, reset_version or 0)
+        
+        # Después de archivar o restaurar el asado no sirve un delta
+        reset = not since_version or (reset_version or 0) > since_version
+        if reset:
+            rows = session.execute(EXPENSES_BY_ASADO, {'asado_id': asado_id}).all()
+            deleted = []
+        else:
+            params = {'asado_id': asado_id, 'since_version': since_version}
+            rows = session.execute(EXPENSES_INSERTED_SINCE, params).all()
+            deleted = session.execute(EXPENSES_DELETED_SINCE, params).scalars().all()
+        
+        return {
+            'asado_id': asado_id,
+            'version': max(version, since_version or 0),
+            'reset': reset,
+            'inserted': expense_rows_to_columns(rows),
+            'deleted': deleted
+        }
+    
+    def get_asado_snapshot(self, asado_name: str, since_version: int = 0):
+        """Obtener versión, participantes y cambios de gastos de un asado juntos
+        
+        Todo se lee con la misma sesión (la primaria o una misma réplica), así
+        la versión nunca es más nueva que los datos que la acompañan.
+        Devuelve {'version': (shard, asado_id, versión), 'participants': [...],
+        'expenses': <resultado de get_expense_changes>, 'shares': <todas las
+        divisiones explícitas, ver SHARE_COLUMNS>, 'archived': bool} o None.
+        El shard (None sin shards) va en la versión porque los ids y las
+        versiones son de cada base: sin él, el mismo asado_id y versión de
+        dos shards darían la misma clave de caché o ETag.
+        """
+        token = self.versions.token(asado_name)
+        session = self.db_manager.get_read_session(asado_name)
+        try:
+            return self._query_asado_snapshot(session, asado_name, since_version, token)
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo datos del asado: {e}")
+            try:
+                session.close()
+                session = self.db_manager.get_session()
+                return self._query_asado_snapshot(session, asado_name, since_version, token)
+            except Exception as e2:
+                logger.error(f"Error en reintento obteniendo datos del asado: {e2}")
+                return None
+        finally:
+            session.close()
+    
+    def _query_asado_snapshot(self, session, asado_name: str, since_version: int, token):
+        asado = self._get_asado(session, asado_name)
+        if asado is None:
+            return None
+        
+        asado_id, archive_path = asado
+        version = session.execute(ASADO_VERSION, {'asado_id': asado_id}).scalar() or 0
+        if archive_path is not None:
+            snapshot = self._archived_snapshot(asado_id, version, since_version, archive_path)
+        else:
+            snapshot = {
+                'version': (self.db_manager.shard, asado_id, version),
+                'participants': self._query_participant_names(session, asado_id),
+                'expenses': self._query_expense_changes_by_id(session, asado_id, since_version),
+                'shares': self._query_shares(session, asado_id),
+                'archived': False
+            }
+        # Lo leído de una réplica puede estar atrasado respecto de los avisos
+        if session.get_bind() is self.db_manager.engine:
+            self.versions.observe(asado_name, snapshot['version'], token)
+        return snapshot
+    
+    def _archived_snapshot(self, asado_id: int, version: int, since_version: int, archive_path: str):
+        """Snapshot de un asado archivado, leído de su archivo
+        
+        El archivo no cambia mientras el asado esté archivado (restaurarlo
+        cambia la versión): si el cliente ya tiene esta versión no se le
+        reenvían los gastos.
+        """
+        archived = read_archive(archive_path)
+        reset = not since_version or since_version < version
+        return {
+            'version': (self.db_manager.shard, asado_id, version),
+            'participants': [name for _, name in archived.participants],
+            'expenses': {
+                'asado_id': asado_id,
+                'version': version,
+                'reset': reset,
+                'inserted': archived.expenses if reset else expense_rows_to_columns([]),
+                'deleted': []
+            },
+            'shares': archived.shares,
+            'archived': True
+        }
+    
+    def get_asado_version(self, asado_name: str):
+        """Obtener (shard, id, versión) del asado; la versión cambia con cada alta o baja"""
+        session = self.db_manager.get_read_session(asado_name)
+        try:
+            asado_id = self._get_asado_id(session, asado_name)
+            if asado_id is None:
+                return None
+            version = session.execute(ASADO_VERSION, {'asado_id': asado_id}).scalar() or 0
+            return self.db_manager.shard, asado_id, version
+        except Exception as e:
+            session.rollback()
+            self.db_manager.mark_replica_failed(session)
+            logger.error(f"Error obteniendo versión del asado: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def _record_change(self, session, asado_id: int, entity: str, entity_id: int, operation: str):
+        """Registrar un alta o baja en el log de cambios (dentro de la transacción)
+        
+        Devuelve el id del cambio, que es la nueva versión del asado.
+        """
+        change = AsadoChange(
+            asado_id=asado_id,
+            entity=entity,
+            entity_id=entity_id,
+            operation=operation
+        )
+        session.add(change)
+        session.flush()
+        return change.id
+    
+    def remove_expense(self, expense_id: int, asado_name: str = None):
+        """Eliminar un gasto (con asado_name, solo si es de ese asado)"""
         session = self.db_manager.get_session()
         try:
-            expense = session.query(Expense).filter(Expense.id == expense_id).first()
+            query = session.query(Expense).filter(Expense.id == expense_id)
+            if asado_name is not None:
+                query = query.join(Asado, Asado.id == Expense.asado_id).filter(Asado.name == asado_name)
+            expense = query.first()
             if expense:
+                asado_name = session.query(Asado.name).filter(Asado.id == expense.asado_id).scalar()
+                version = self._record_change(session, expense.asado_id, 'expense', expense.id, 'delete')
+                notify_change(session, 'asado', asado=asado_name, asado_id=expense.asado_id, version=version)
                 session.delete(expense)
                 session.commit()
+                self.db_manager.record_write(asado_name, ALL_ASADOS_KEY)
+                self.versions.invalidate(asado_name)
                 return True
             return False
         except Exception as e:
@@ -357,21 +1891,30 @@ class AsadoService:
     
     def get_custom_categories(self):
         """Obtener categorías personalizadas"""
-        session = self.db_manager.get_session()
         try:
-            categories = session.query(CustomCategory).all()
-            return [c.name for c in categories]
+            return self._load_custom_categories()
+        except Exception:
+            return []
+    
+    def _load_custom_categories(self):
+        """Categorías personalizadas; si también falla el reintento en la primaria, relanza
+        
+        Es el cargador de CategoryRegistry: un error no debe quedar cacheado como "sin categorías".
+        """
+        session = self.db_manager.get_read_session(CATEGORIES_KEY)
+        try:
+            return [name for (name,) in session.query(CustomCategory.name).order_by(CustomCategory.id)]
         except Exception as e:
             session.rollback()
+            self.db_manager.mark_replica_failed(session)
             logger.error(f"Error obteniendo categorías: {e}")
             try:
                 session.close()
                 session = self.db_manager.get_session()
-                categories = session.query(CustomCategory).all()
-                return [c.name for c in categories]
+                return [name for (name,) in session.query(CustomCategory.name).order_by(CustomCategory.id)]
             except Exception as e2:
                 logger.error(f"Error en reintento obteniendo categorías: {e2}")
-                return []
+                raise
         finally:
             session.close()
     
@@ -379,15 +1922,19 @@ class AsadoService:
         """Agregar categoría personalizada"""
         session = self.db_manager.get_session()
         try:
-            existing = session.query(CustomCategory).filter(CustomCategory.name == name).first()
+            existing = session.query(CustomCategory.id).filter(CustomCategory.name == name).first()
             if existing:
                 return None
             
             category = CustomCategory(name=name)
             session.add(category)
+            session.flush()
+            row = CategoryRow(category.id, category.name, category.created_date)
+            notify_change(session, 'categories')
             session.commit()
-            session.refresh(category)
-            return category
+            self.db_manager.record_write(CATEGORIES_KEY)
+            self.categories.invalidate()
+            return row
         except Exception as e:
             session.rollback()
             logger.error(f"Error agregando categoría: {e}")
@@ -401,8 +1948,11 @@ class AsadoService:
         try:
             category = session.query(CustomCategory).filter(CustomCategory.name == name).first()
             if category:
+                notify_change(session, 'categories')
                 session.delete(category)
                 session.commit()
+                self.db_manager.record_write(CATEGORIES_KEY)
+                self.categories.invalidate()
                 return True
             return False
         except Exception as e:
@@ -416,14 +1966,37 @@ class AsadoService:
 db_manager = None
 asado_service = None
 
+def create_asado_service():
+    """Servicio sobre DATABASE_URL o, con DATABASE_SHARDS, sobre todos los shards
+    
+    Sin listener ni cola de escritura: lo que necesitan los scripts de lote.
+    """
+    db_manager = DatabaseManager()
+    if os.getenv('DATABASE_SHARDS'):
+        from shards import ShardedAsadoService, shard_urls
+        return ShardedAsadoService(db_manager, shard_urls())
+    return AsadoService(db_manager)
+
 def initialize_database():
     """Inicializar la base de datos"""
     global db_manager, asado_service
     try:
-        db_manager = DatabaseManager()
-        db_manager.test_connection()
-        db_manager.create_tables()
-        asado_service = AsadoService(db_manager)
+        service = create_asado_service()
+        for manager in service.db_managers():
+            manager.test_connection()
+            manager.create_tables()
+        if asado_service is not None:
+            asado_service.stop_listener()
+            asado_service.stop_write_behind()
+            for manager in asado_service.db_managers():
+                manager.stop_pool_probe()
+        for manager in service.db_managers():
+            manager.start_pool_probe()
+        db_manager = service.db_manager
+        asado_service = service
+        asado_service.start_listener()
+        if os.getenv('EXPENSE_WRITE_BEHIND', '').lower() in ('1', 'true'):
+            asado_service.start_write_behind()
         logger.info("Base de datos inicializada correctamente")
         return True
     except Exception as e:
@@ -0,0 +1,274 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+class ExpenseWriteQueue:
+    """Cola de escritura diferida (write-behind) para altas de gastos
+    
+    submit() deja el gasto en una cola acotada y vuelve enseguida; un hilo
+    lo escribe junto con otros en un solo INSERT multi-fila y un solo commit
+    cuando se juntan batch_size gastos o pasan flush_seconds desde el primero.
+    
+    - Contrapresión: si la cola está llena, submit() espera hasta
+      put_timeout segundos y después escribe el gasto directamente.
+    - Read-your-writes: pending(asado) devuelve los gastos aún no escritos.
+    - Durabilidad: al cerrar se escribe lo pendiente; si la base no responde
+      queda en spool_path (JSON por línea) y se reintenta al volver a arrancar.
+    - Gastos que no se pueden escribir: un lote que falla max_attempts veces
+      por algo que no es la conexión (p. ej. una restricción) se parte en
+      mitades hasta aislar los gastos culpables. Esos, y los que add_expenses
+      descarta (asado o participante que ya no existe), van con el error a
+      spool_path + ".rejected" y quedan contados en rejected; no se reintentan.
+    """
+    
+    def __init__(self, service, max_size: int = 1000, batch_size: int = 200,
+                 flush_seconds: float = 0.2, put_timeout: float = 2.0, spool_path: str = 'expense_spool.jsonl',
+                 max_attempts: int = 3):
+        self.service = service
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.put_timeout = put_timeout
+        self.spool_path = spool_path
+        self.rejected_path = f"{spool_path}.rejected"
+        self.max_attempts = max_attempts
+        # Gastos rechazados desde que arrancó la cola
+        self.rejected = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        # Gastos encolados o en escritura, por nombre de asado
+        self._pending = {}
+        self._sequence = itertools.count(1)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="asadoapp-expense-writer", daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+    
+    def submit(self, asado_name: str, participant_name: str, category: str, amount: float, description: str = "", shares=None):
+        """Encolar un gasto; devuelve su id provisorio (negativo) o el ExpenseRow si se escribió directo"""
+        item = {
+            'seq': next(self._sequence),
+            'asado': asado_name,
+            'participant': participant_name,
+            'category': category,
+            'amount': float(amount),
+            'description': description,
+            'timestamp': datetime.now(),
+            'shares': {name: float(weight) for name, weight in (shares or {}).items()}
+        }
+        if self._stop_event.is_set():
+            return self.service.add_expense(asado_name, participant_name, category, amount, description, shares)
+        
+        with self._lock:
+            self._pending.setdefault(asado_name, []).append(item)
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+            return -item['seq']
+        except queue.Full:
+            logger.warning("Cola de gastos llena: se escribe el gasto directamente")
+            self._discard([item])
+            return self.service.add_expense(asado_name, participant_name, category, amount, description, shares)
+    
+    def pending(self, asado_name: str, written_ids=()):
+        """Gastos del asado todavía no escritos, como filas (id provisorio negativo)
+        
+        written_ids son los ids ya leídos de la base: un gasto del lote en
+        escritura que ya figura ahí no se repite.
+        """
+        with self._lock:
+            items = list(self._pending.get(asado_name, ()))
+        if not items:
+            return []
+        written_ids = set(written_ids)
+        return [
+            (-item['seq'], item['participant'], item['category'], item['amount'], item['description'], item['timestamp'])
+            for item in items
+            if item.get('expense_id') not in written_ids
+        ]
+    
+    def pending_shares(self, asado_name: str, written_ids=()):
+        """Divisiones de los gastos pendientes, como filas (id provisorio, participante, peso)"""
+        written_ids = set(written_ids)
+        with self._lock:
+            items = list(self._pending.get(asado_name, ()))
+        return [
+            (-item['seq'], participant, weight)
+            for item in items
+            if item.get('expense_id') not in written_ids
+            for participant, weight in item['shares'].items()
+            if weight > 0
+        ]
+    
+    def stop(self):
+        """Dejar de aceptar gastos y escribir (o guardar en el spool) lo pendiente"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        try:
+            # Despertar al hilo si está esperando el primer gasto
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self._thread.is_alive():
+            self._thread.join()
+        # Lo que se haya encolado mientras el hilo terminaba
+        self._drain()
+        atexit.unregister(self.stop)
+    
+    def _run(self):
+        self._replay_spool()
+        while not self._stop_event.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write_with_retry(batch)
+        self._drain()
+    
+    def _drain(self):
+        """Cierre: escribir lo que quedó en la cola o guardarlo en el spool"""
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                remaining.append(item)
+        if remaining and self._write(remaining) is not None:
+            self._spool(remaining)
+    
+    def _next_batch(self):
+        """Esperar el primer gasto y juntar más hasta batch_size o flush_seconds"""
+        try:
+            item = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        if item is None:
+            return []
+        batch = [item]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+    
+    @staticmethod
+    def _is_transient(error):
+        """Errores de conexión o de bloqueo: se reintentan sin límite"""
+        return isinstance(error, (OperationalError, InterfaceError)) or (
+            isinstance(error, DBAPIError) and error.connection_invalidated
+        )
+    
+    def _write_with_retry(self, batch, max_attempts: int = None):
+        """Escribir el lote reintentando; si falla siempre, partirlo y rechazar solo los gastos culpables"""
+        max_attempts = max_attempts or self.max_attempts
+        backoff = 0.5
+        attempts = 0
+        while True:
+            error = self._write(batch)
+            if error is None:
+                return
+            if not self._is_transient(error):
+                attempts += 1
+                if attempts >= max_attempts:
+                    if len(batch) == 1:
+                        self._reject(batch, error)
+                        return
+                    # El error es de los datos: cada mitad se prueba una sola vez
+                    middle = len(batch) // 2
+                    self._write_with_retry(batch[:middle], max_attempts=1)
+                    self._write_with_retry(batch[middle:], max_attempts=1)
+                    return
+            if self._stop_event.wait(backoff):
+                # Cerrando con la base caída: al spool para no perderlos
+                self._spool(batch)
+                return
+            backoff = min(backoff * 2, 10.0)
+    
+    def _write(self, batch):
+        """Escribir el lote; devuelve None o la excepción si falló"""
+        try:
+            ids = self.service.add_expenses(batch)
+        except Exception as e:
+            logger.error(f"Error escribiendo lote de {len(batch)} gastos: {e}")
+            for item in batch:
+                item['expense_id'] = None
+            return e
+        dropped = [item for item, expense_id in zip(batch, ids) if expense_id is None]
+        if dropped:
+            self._reject(dropped, "no existe el asado, el participante o alguno de la división")
+        self._discard(batch)
+        return None
+    
+    def _reject(self, items, error):
+        """Guardar gastos que no se pueden escribir, con el error, para revisarlos a mano"""
+        try:
+            with open(self.rejected_path, 'a', encoding='utf-8') as rejected:
+                for item in items:
+                    rejected.write(json.dumps(
+                        {**item, 'timestamp': item['timestamp'].isoformat(), 'error': str(error)},
+                        ensure_ascii=False
+                    ) + '\n')
+        except Exception as e:
+            logger.error(f"Error guardando gastos rechazados en {self.rejected_path}: {e}")
+        self.rejected += len(items)
+        logger.error(f"{len(items)} gastos rechazados ({error}); quedan en {self.rejected_path}")
+        self._discard(items)
+    
+    def _discard(self, items):
+        """Sacar gastos de los pendientes (ya escritos o guardados en el spool)"""
+        sequences = {item['seq'] for item in items}
+        with self._lock:
+            for asado_name in {item['asado'] for item in items}:
+                pending = [item for item in self._pending.get(asado_name, ()) if item['seq'] not in sequences]
+                if pending:
+                    self._pending[asado_name] = pending
+                else:
+                    self._pending.pop(asado_name, None)
+    
+    def _spool(self, items):
+        try:
+            with open(self.spool_path, 'a', encoding='utf-8') as spool:
+                for item in items:
+                    spool.write(json.dumps({**item, 'timestamp': item['timestamp'].isoformat()}) + '\n')
+            logger.warning(f"{len(items)} gastos guardados en {self.spool_path} para escribir al reiniciar")
+        except Exception as e:
+            logger.error(f"Error guardando gastos en {self.spool_path}: {e}")
+        self._discard(items)
+    
+    def _replay_spool(self):
+        """Escribir los gastos que quedaron en el spool de una ejecución anterior"""
+        # Renombrarlo primero: si hay varios procesos, solo uno lo toma
+        claimed_path = f"{self.spool_path}.{os.getpid()}"
+        try:
+            os.replace(self.spool_path, claimed_path)
+        except FileNotFoundError:
+            return
+        
+        with open(claimed_path, encoding='utf-8') as spool:
+            items = [json.loads(line) for line in spool if line.strip()]
+        for item in items:
+            item['timestamp'] = datetime.fromisoformat(item['timestamp'])
+            # No están entre los pendientes de esta ejecución
+            item['seq'] = 0
+        if items:
+            self._write_with_retry(items)
+        os.remove(claimed_path)
+        logger.info(f"{len(items)} gastos del spool escritos")
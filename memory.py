@@ -0,0 +1,312 @@
+"""
+Memoria por sesión de Streamlit y desalojo de las cachés de sesiones inactivas
+
+Cada pestaña del navegador tiene su propio st.session_state con la copia
+columnar de los gastos de cada asado que miró (expense_cache) y su
+DataFrame. El registro de este módulo (uno por proceso) anota por sesión
+la página actual, la última actividad y cuánto ocupa su caché, y vacía la
+caché de las sesiones que pasan SESSION_IDLE_MINUTES sin actividad o, si
+el total supera SESSION_CACHE_MB, de las menos recientes. Una sesión
+desalojada vuelve a traer el snapshot completo en su próximo rerun.
+
+Con ASADO_MEMORY_TRACE=1 además se activa tracemalloc y se mide la
+memoria asignada y el pico de cada rerun (por sesión y por página) y de
+las secciones marcadas con measure() o traced(), como calculate_totals y
+el armado de DataFrames. tracemalloc cuenta todo el proceso: con reruns
+simultáneos las cifras se mezclan, sirven para comparar y no como
+contabilidad exacta. El tamaño de las cachés no depende de tracemalloc.
+"""
+
+import os
+import sys
+import time
+import uuid
+import weakref
+import logging
+import functools
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+class SessionCache(dict):
+    """expense_cache de una sesión (un dict que admite weakref)
+    
+    El registro solo guarda una referencia débil: cuando Streamlit descarta
+    la sesión, su caché se libera y la sesión desaparece del registro.
+    """
+
+class SessionReport(NamedTuple):
+    """Una sesión en el diagnóstico de memoria (bytes; None sin tracemalloc)"""
+    key: str
+    page: str
+    idle_seconds: float
+    reruns: int
+    asados: int
+    cache_bytes: int
+    allocated: int
+    peak: int
+    evictions: int
+
+class SectionReport(NamedTuple):
+    """Una página o sección medida con tracemalloc (bytes)"""
+    name: str
+    calls: int
+    allocated: int
+    mean_peak: int
+    max_peak: int
+
+class Measurement:
+    """Memoria de una sección: asignada al salir (neta) y pico, en bytes desde el inicio"""
+    __slots__ = ('start', 'peak', 'allocated')
+    
+    def __init__(self, start: int):
+        self.start = start
+        self.peak = start
+        self.allocated = 0
+
+class SectionStats:
+    """Acumulado de las mediciones de una sección"""
+    __slots__ = ('calls', 'allocated', 'total_peak', 'max_peak')
+    
+    def __init__(self):
+        self.calls = 0
+        self.allocated = 0
+        self.total_peak = 0
+        self.max_peak = 0
+    
+    def add(self, measurement: Measurement):
+        self.calls += 1
+        self.allocated = measurement.allocated
+        self.total_peak += measurement.peak
+        self.max_peak = max(self.max_peak, measurement.peak)
+    
+    def report(self, name: str):
+        return SectionReport(name, self.calls, self.allocated, self.total_peak // max(self.calls, 1), self.max_peak)
+
+# Secciones medidas (calculate_totals, DataFrames, ...) de todo el proceso
+_sections = {}
+_sections_lock = threading.Lock()
+# Mediciones en curso del hilo, para que una sección anidada no pierda el pico de la de afuera
+_local = threading.local()
+
+def start_tracing():
+    """Activar tracemalloc si ASADO_MEMORY_TRACE lo pide (se puede llamar en cada rerun)"""
+    if os.getenv('ASADO_MEMORY_TRACE', '').lower() in ('1', 'true') and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        logger.info("tracemalloc activo: se mide la memoria por rerun y por sección")
+
+@contextmanager
+def measure(label: str = None):
+    """Medir la memoria asignada y el pico del bloque (None si tracemalloc no está activo)
+    
+    Con label se acumula en las secciones del diagnóstico.
+    """
+    if not tracemalloc.is_tracing():
+        yield None
+        return
+    stack = _local.__dict__.setdefault('stack', [])
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1].peak = max(stack[-1].peak, peak)
+    tracemalloc.reset_peak()
+    measurement = Measurement(current)
+    stack.append(measurement)
+    try:
+        yield measurement
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        stack.pop()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        measurement.peak = max(measurement.peak, peak) - measurement.start
+        measurement.allocated = current - measurement.start
+        if label:
+            with _sections_lock:
+                _sections.setdefault(label, SectionStats()).add(measurement)
+
+def traced(label: str):
+    """Decorador: medir cada llamada con measure(label)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def section_report():
+    """Secciones medidas, de mayor a menor pico"""
+    with _sections_lock:
+        reports = [stats.report(name) for name, stats in _sections.items()]
+    return sorted(reports, key=lambda report: report.max_peak, reverse=True)
+
+def array_bytes(values):
+    """Bytes de un array de NumPy, contando los objetos de las columnas de texto"""
+    if values.dtype == object:
+        return values.nbytes + sum(map(sys.getsizeof, values))
+    return values.nbytes
+
+def entry_bytes(entry: dict):
+    """Bytes de una entrada de expense_cache (se recalcula solo si cambió)"""
+    key = (entry['version'], entry['asado_version'], entry['frame'] is not None)
+    cached = entry.get('size')
+    if cached and cached[0] == key:
+        return cached[1]
+    size = sum(array_bytes(values) for values in entry['columns'].values())
+    size += sum(array_bytes(values) for values in entry['shares'].values())
+    size += sum(map(sys.getsizeof, entry['participants']))
+    if entry['frame'] is not None:
+        size += int(entry['frame'].memory_usage(index=True, deep=True).sum())
+    entry['size'] = (key, size)
+    return size
+
+def peak_rss():
+    """Pico de memoria residente del proceso en bytes (None si la plataforma no lo informa)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def format_bytes(size):
+    """Tamaño legible (B, KB, MB, GB)"""
+    if size is None:
+        return "-"
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+class SessionStats:
+    """Lo que el registro sabe de una sesión"""
+    
+    def __init__(self, cache: SessionCache, now: float):
+        self.cache = weakref.ref(cache)
+        self.page = None
+        self.last_seen = now
+        self.running = False
+        self.reruns = 0
+        self.cache_bytes = 0
+        self.asados = 0
+        self.allocated = None
+        self.peak = None
+        self.evictions = 0
+
+class SessionRegistry:
+    """Sesiones de Streamlit del proceso, con su memoria y la política de desalojo
+    
+    idle_seconds: inactividad tras la cual se vacía la caché de una sesión
+    (0 = nunca); cache_limit: bytes totales de cachés de sesión a partir de
+    los cuales se vacían las menos recientes (0 = sin límite).
+    """
+    
+    def __init__(self, idle_seconds: float, cache_limit: int):
+        self.idle_seconds = idle_seconds
+        self.cache_limit = cache_limit
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._pages = {}
+    
+    @staticmethod
+    def new_key():
+        return uuid.uuid4().hex
+    
+    @contextmanager
+    def rerun(self, key: str, cache: SessionCache):
+        """Marcar un rerun completo de la sesión: desaloja, mide y actualiza el tamaño de su caché"""
+        now = time.monotonic()
+        with self._lock:
+            stats = self._sessions.get(key)
+            if stats is None or stats.cache() is not cache:
+                stats = self._sessions[key] = SessionStats(cache, now)
+            stats.last_seen = now
+            stats.running = True
+        measurement = None
+        try:
+            self.sweep(exclude=key)
+            with measure() as measurement:
+                yield
+        finally:
+            size = sum(entry_bytes(entry) for entry in list(cache.values()))
+            with self._lock:
+                stats.running = False
+                stats.reruns += 1
+                stats.cache_bytes = size
+                stats.asados = len(cache)
+                if measurement is not None:
+                    stats.allocated = measurement.allocated
+                    stats.peak = measurement.peak
+                    if stats.page:
+                        self._pages.setdefault(stats.page, SectionStats()).add(measurement)
+    
+    def set_page(self, key: str, page: str):
+        """Página que muestra la sesión en este rerun"""
+        with self._lock:
+            if key in self._sessions:
+                self._sessions[key].page = page
+    
+    def _evict(self, stats: SessionStats):
+        cache = stats.cache()
+        if cache is not None:
+            cache.clear()
+        stats.cache_bytes = 0
+        stats.asados = 0
+        stats.evictions += 1
+    
+    def sweep(self, exclude: str = None):
+        """Vaciar las cachés de sesiones inactivas y, sobre el límite, las menos recientes
+        
+        Nunca toca una sesión en medio de un rerun ni la sesión exclude.
+        Devuelve cuántas cachés vació.
+        """
+        now = time.monotonic()
+        evicted = 0
+        with self._lock:
+            # Sesiones cerradas: Streamlit ya liberó su caché
+            for key in [key for key, stats in self._sessions.items() if stats.cache() is None]:
+                del self._sessions[key]
+            
+            candidates = sorted(
+                (stats for key, stats in self._sessions.items() if key != exclude and not stats.running and stats.asados),
+                key=lambda stats: stats.last_seen
+            )
+            total = sum(stats.cache_bytes for stats in self._sessions.values())
+            for stats in candidates:
+                idle = self.idle_seconds and now - stats.last_seen > self.idle_seconds
+                if not idle and not (self.cache_limit and total > self.cache_limit):
+                    continue
+                total -= stats.cache_bytes
+                self._evict(stats)
+                evicted += 1
+        if evicted:
+            logger.info(f"Cachés de {evicted} sesiones liberadas")
+        return evicted
+    
+    def report(self):
+        """Sesiones vivas, de la que más memoria retiene a la que menos"""
+        now = time.monotonic()
+        with self._lock:
+            reports = [
+                SessionReport(
+                    key, stats.page, now - stats.last_seen, stats.reruns, stats.asados,
+                    stats.cache_bytes, stats.allocated, stats.peak, stats.evictions
+                )
+                for key, stats in self._sessions.items() if stats.cache() is not None
+            ]
+        return sorted(reports, key=lambda report: (report.cache_bytes, report.peak or 0), reverse=True)
+    
+    def page_report(self):
+        """Reruns por página (con tracemalloc), de mayor a menor pico"""
+        with self._lock:
+            reports = [stats.report(page) for page, stats in self._pages.items()]
+        return sorted(reports, key=lambda report: report.max_peak, reverse=True)
+
+sessions = SessionRegistry(
+    idle_seconds=float(os.getenv('SESSION_IDLE_MINUTES', '30')) * 60,
+    cache_limit=int(float(os.getenv('SESSION_CACHE_MB', '0')) * 1024 * 1024)
+)
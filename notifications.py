@@ -0,0 +1,138 @@
+import os
+import json
+import select
+import logging
+import threading
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Canal de PostgreSQL por el que los procesos avisan sus escrituras
+CHANNEL = 'asadoapp_changes'
+
+def notify_change(session, kind: str, **payload):
+    """Encolar un NOTIFY en la transacción de la sesión (se envía recién con el commit)
+    
+    Solo aplica a PostgreSQL; con otros motores no hace nada.
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    message = json.dumps({'kind': kind, 'pid': os.getpid(), **payload})
+    session.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': CHANNEL, 'payload': message})
+
+class AsadoVersions:
+    """Última versión conocida de cada asado en este proceso
+    
+    Solo es confiable mientras el listener está conectado: si se pierde la
+    conexión se vacía y get() devuelve None hasta que vuelva. Cada aviso
+    descarta la versión del asado; una lectura solo la guarda si no llegó
+    ningún aviso entre token() y observe().
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._generations = {}
+        self._epoch = 0
+        self.trusted = False
+    
+    def get(self, asado_name: str):
+        """(shard, asado_id, versión) vigente o None si hay que consultar la base"""
+        if not self.trusted:
+            return None
+        return self._versions.get(asado_name)
+    
+    def token(self, asado_name: str):
+        """Marca a tomar antes de leer la base y pasar luego a observe()"""
+        with self._lock:
+            return self._epoch, self._generations.get(asado_name, 0)
+    
+    def observe(self, asado_name: str, version, token):
+        """Guardar la versión leída si nada la invalidó desde token()"""
+        with self._lock:
+            if self.trusted and token == (self._epoch, self._generations.get(asado_name, 0)):
+                self._versions[asado_name] = version
+    
+    def invalidate(self, asado_name: str):
+        """Descartar la versión de un asado (llegó un aviso o se escribió acá)"""
+        with self._lock:
+            self._generations[asado_name] = self._generations.get(asado_name, 0) + 1
+            self._versions.pop(asado_name, None)
+    
+    def reset(self, trusted: bool):
+        """Descartar todo; trusted indica si el listener está conectado"""
+        with self._lock:
+            self._epoch += 1
+            self._versions.clear()
+            self._generations.clear()
+            self.trusted = trusted
+
+class ChangeListener(threading.Thread):
+    """Hilo que escucha CHANNEL con LISTEN y pasa cada aviso a on_change(payload)
+    
+    Usa una conexión del engine compartido. Si la conexión se cae, llama a
+    on_reset(False), reintenta con espera creciente y al volver llama a
+    on_reset(True): los avisos perdidos en el medio obligan a invalidar todo.
+    """
+    
+    def __init__(self, engine, on_change, on_reset, poll_seconds: float = 1.0):
+        super().__init__(name="asadoapp-change-listener", daemon=True)
+        self.engine = engine
+        self.on_change = on_change
+        self.on_reset = on_reset
+        self.poll_seconds = poll_seconds
+        self._stop_event = threading.Event()
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                connection = self.engine.raw_connection()
+                driver_connection = connection.driver_connection
+                driver_connection.autocommit = True
+                driver_connection.cursor().execute(f"LISTEN {CHANNEL}")
+                logger.info(f"Escuchando cambios en el canal {CHANNEL}")
+                self.on_reset(True)
+                backoff = 1.0
+                
+                for payload in self._notifications(driver_connection):
+                    self._dispatch(payload)
+            except Exception as e:
+                logger.error(f"Error en el listener de cambios: {e}")
+            finally:
+                self.on_reset(False)
+                if connection is not None:
+                    try:
+                        connection.invalidate()
+                    except Exception:
+                        pass
+            
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+    
+    def _notifications(self, driver_connection):
+        """Generar los payloads recibidos hasta que se pida detener el hilo"""
+        if type(driver_connection).__module__.startswith('psycopg2'):
+            # psycopg2: esperar en el socket y leer conn.notifies
+            while not self._stop_event.is_set():
+                if select.select([driver_connection], [], [], self.poll_seconds) != ([], [], []):
+                    driver_connection.poll()
+                    while driver_connection.notifies:
+                        yield driver_connection.notifies.pop(0).payload
+        else:
+            # psycopg 3: notifies() corta después de timeout segundos sin avisos
+            while not self._stop_event.is_set():
+                for notify in driver_connection.notifies(timeout=self.poll_seconds):
+                    yield notify.payload
+                    if self._stop_event.is_set():
+                        break
+    
+    def _dispatch(self, payload):
+        try:
+            self.on_change(json.loads(payload))
+        except Exception as e:
+            logger.error(f"Aviso de cambio inválido ({payload!r}): {e}")
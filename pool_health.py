@@ -0,0 +1,92 @@
+import time
+import logging
+import threading
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+class RetryingSession(Session):
+    """Session que repite una vez la primera consulta de una transacción si la conexión estaba cortada
+    
+    Sin pool_pre_ping, una conexión que se cortó mientras estaba ociosa en
+    el pool recién se nota al usarla. Si eso pasa en la primera consulta de
+    la transacción (y no hay objetos sin escribir) no se pierde nada:
+    SQLAlchemy descarta la conexión y las demás abiertas antes del corte, y
+    la consulta se repite con una nueva. En cualquier otro punto el error
+    sigue su curso como siempre.
+    """
+    
+    def execute(self, *args, **kwargs):
+        return self._retry_disconnect(super().execute, *args, **kwargs)
+    
+    def scalar(self, *args, **kwargs):
+        return self._retry_disconnect(super().scalar, *args, **kwargs)
+    
+    def scalars(self, *args, **kwargs):
+        return self._retry_disconnect(super().scalars, *args, **kwargs)
+    
+    def _retry_disconnect(self, method, *args, **kwargs):
+        if self.in_transaction() or self.new or self.dirty or self.deleted:
+            return method(*args, **kwargs)
+        try:
+            return method(*args, **kwargs)
+        except DBAPIError as e:
+            if not e.connection_invalidated:
+                raise
+            logger.warning(f"Conexión cortada, se repite la consulta con otra: {e.orig}")
+            self.rollback()
+            return method(*args, **kwargs)
+
+class PoolProbe(threading.Thread):
+    """Hilo que cada interval segundos prueba las conexiones ociosas de los pools
+    
+    Reemplaza el SELECT 1 de pool_pre_ping en cada checkout: saca del pool
+    de a una las conexiones ociosas (el pool es FIFO, así que recorre todas),
+    las prueba y las devuelve. Si una está cortada SQLAlchemy la descarta
+    junto con las demás abiertas antes del corte, y la próxima sesión ya
+    recibe conexiones nuevas.
+    """
+    
+    def __init__(self, engines, interval: float = 30.0):
+        super().__init__(name="asadoapp-pool-probe", daemon=True)
+        self.engines = engines
+        self.interval = interval
+        self._stop_event = threading.Event()
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for engine in self.engines:
+                try:
+                    self.probe(engine)
+                except Exception as e:
+                    logger.error(f"Error probando conexiones de {engine.url.render_as_string()}: {e}")
+    
+    def probe(self, engine):
+        """Probar las conexiones ociosas del pool de engine; devuelve cuántas estaban cortadas"""
+        checkedin = getattr(engine.pool, 'checkedin', None)
+        if checkedin is None:
+            # Pools sin conexiones ociosas que revisar (p. ej. NullPool)
+            return 0
+        dead = 0
+        start = time.perf_counter()
+        for _ in range(checkedin()):
+            with engine.connect() as connection:
+                try:
+                    connection.execute(text("SELECT 1"))
+                except DBAPIError as e:
+                    if not e.connection_invalidated:
+                        raise
+                    dead += 1
+            if self._stop_event.is_set():
+                break
+        if dead:
+            logger.warning(
+                f"Conexiones cortadas en el pool: se reemplazaron las abiertas antes del corte "
+                f"({(time.perf_counter() - start) * 1000:.0f} ms)"
+            )
+        return dead
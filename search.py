@@ -0,0 +1,284 @@
+import re
+import logging
+import unicodedata
+from datetime import datetime
+from typing import NamedTuple
+from sqlalchemy import text, DateTime
+
+logger = logging.getLogger(__name__)
+
+class SearchResultRow(NamedTuple):
+    id: int
+    asado: str
+    participant: str
+    category: str
+    amount: float
+    description: str
+    timestamp: datetime
+    score: float
+
+# Puntajes: un resultado del índice de texto (0.5 a 1, según su rango) queda
+# siempre por encima de uno que solo se parece por trigramas (0 a 0.5)
+TEXT_SCORE = 0.5
+FUZZY_SCORE = 0.5
+# Parecido mínimo por trigramas para el fallback en Python
+FUZZY_THRESHOLD = 0.4
+
+# PostgreSQL: tsvector guardado de categoría + descripción sin tildes (translate
+# es inmutable, unaccent no), con índice GIN; trigramas con pg_trgm si está
+ACCENTS = ('áéíóúàèìòùäëïöüâêîôûñç', 'aeiouaeiouaeiouaeiounc')
+PG_DOCUMENT = (
+    "to_tsvector('spanish'::regconfig, translate(lower(category || ' ' || coalesce(description, '')), "
+    f"'{ACCENTS[0]}', '{ACCENTS[1]}'))"
+)
+PG_SETUP = [
+    f"ALTER TABLE expenses ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({PG_DOCUMENT}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_search_vector ON expenses USING gin (search_vector)",
+]
+PG_TRIGRAM_SETUP = [
+    "CREATE INDEX IF NOT EXISTS ix_participants_name_trgm ON participants USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_category_trgm ON expenses USING gin (category gin_trgm_ops)",
+]
+
+# SQLite: tabla FTS5 (sin tildes ni mayúsculas) mantenida con triggers
+SQLITE_SETUP = [
+    "CREATE VIRTUAL TABLE expense_search USING fts5("
+    "category, description, participant, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO expense_search (rowid, category, description, participant) "
+    "SELECT e.id, e.category, coalesce(e.description, ''), p.name "
+    "FROM expenses e JOIN participants p ON p.id = e.participant_id",
+]
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS expenses_search_insert AFTER INSERT ON expenses BEGIN "
+    "INSERT INTO expense_search (rowid, category, description, participant) VALUES "
+    "(new.id, new.category, coalesce(new.description, ''), (SELECT name FROM participants WHERE id = new.participant_id)); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_search_delete AFTER DELETE ON expenses BEGIN "
+    "DELETE FROM expense_search WHERE rowid = old.id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_search_update AFTER UPDATE ON expenses BEGIN "
+    "DELETE FROM expense_search WHERE rowid = old.id; "
+    "INSERT INTO expense_search (rowid, category, description, participant) VALUES "
+    "(new.id, new.category, coalesce(new.description, ''), (SELECT name FROM participants WHERE id = new.participant_id)); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS participants_search_update AFTER UPDATE OF name ON participants BEGIN "
+    "UPDATE expense_search SET participant = new.name "
+    "WHERE rowid IN (SELECT id FROM expenses WHERE participant_id = new.id); "
+    "END",
+]
+
+# Lo que drop_search_indexes borra y setup_search vuelve a crear
+PG_SEARCH_INDEXES = ['ix_expenses_search_vector', 'ix_participants_name_trgm', 'ix_expenses_category_trgm']
+SQLITE_SEARCH_TRIGGERS = [
+    'expenses_search_insert', 'expenses_search_delete', 'expenses_search_update', 'participants_search_update'
+]
+
+# Columnas de SearchResultRow salvo el puntaje (timestamp se tipa con
+# RESULT_TYPES: SQLite lo devuelve como texto en consultas textuales)
+RESULT_COLUMNS = (
+    "e.id AS id, a.name AS asado, p.name AS participant, e.category AS category, "
+    "e.amount AS amount, e.description AS description, e.timestamp AS timestamp"
+)
+RESULT_TYPES = {'timestamp': DateTime}
+RESULT_JOINS = (
+    "JOIN expenses e ON e.id = top.id "
+    "JOIN participants p ON p.id = e.participant_id "
+    "JOIN asados a ON a.id = e.asado_id"
+)
+
+# Capacidades de búsqueda de cada engine (se detectan una vez)
+_trigram_support = {}
+
+def normalize(value: str):
+    """Minúsculas y sin tildes, para comparar nombres"""
+    decomposed = unicodedata.normalize('NFKD', value.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).strip()
+
+def query_terms(query: str):
+    """Palabras de la búsqueda (sin operadores ni signos)"""
+    return re.findall(r'\w+', normalize(query))
+
+def trigrams(value: str):
+    """Trigramas de cada palabra al estilo de pg_trgm (dos espacios antes, uno después)"""
+    grams = set()
+    for word in re.findall(r'\w+', normalize(value)):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def trigram_similarity(query: str, value: str):
+    """Parecido por trigramas de la búsqueda con el texto o con alguna de sus palabras"""
+    query_grams = trigrams(query)
+    if not query_grams:
+        return 0.0
+    best = 0.0
+    for candidate in [value] + value.split():
+        grams = trigrams(candidate)
+        if grams:
+            best = max(best, len(query_grams & grams) / len(query_grams | grams))
+    return best
+
+def setup_search(engine):
+    """Crear índices de búsqueda (tsvector + GIN y trigramas en PostgreSQL, FTS5 en SQLite)
+    
+    Es idempotente; si algo no está disponible (p. ej. pg_trgm sin permisos)
+    la búsqueda sigue funcionando con lo que haya.
+    """
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        with engine.begin() as connection:
+            for statement in PG_SETUP:
+                connection.execute(text(statement))
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for statement in PG_TRIGRAM_SETUP:
+                    connection.execute(text(statement))
+        except Exception as e:
+            logger.warning(f"pg_trgm no disponible, parecido por trigramas en Python: {e}")
+        _trigram_support.pop(engine, None)
+    elif dialect == 'sqlite':
+        with engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'expense_search'")
+            ).first()
+            if not exists:
+                for statement in SQLITE_SETUP:
+                    connection.execute(text(statement))
+            for statement in SQLITE_TRIGGERS:
+                connection.execute(text(statement))
+
+def drop_search_indexes(connection):
+    """Borrar índices, tabla FTS5 y triggers de búsqueda antes de una carga masiva
+    
+    Construirlos de una vez al final es mucho más rápido que mantenerlos
+    fila por fila; después de la carga hay que llamar a setup_search.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        for name in PG_SEARCH_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    elif dialect == 'sqlite':
+        for name in SQLITE_SEARCH_TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        connection.execute(text("DROP TABLE IF EXISTS expense_search"))
+
+def has_trigram_index(session):
+    """Si la base tiene pg_trgm (y por lo tanto los índices de trigramas)"""
+    engine = session.get_bind()
+    if engine not in _trigram_support:
+        _trigram_support[engine] = session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first() is not None
+    return _trigram_support[engine]
+
+def search_expenses(session, query: str, asado_id: int = None, limit: int = 20, categories=()):
+    """Gastos que coinciden con la búsqueda, del más relevante al menos relevante
+    
+    Busca las palabras (también como prefijo) en categoría y descripción con
+    el índice de texto de la base, y nombres de participantes y categorías
+    parecidos por trigramas para tolerar errores de tipeo. categories son
+    los nombres de categoría candidatos para el parecido cuando la base no
+    tiene pg_trgm. Devuelve una lista de SearchResultRow (vacía si limit < 1:
+    en SQLite un LIMIT negativo no limita).
+    """
+    terms = query_terms(query)
+    if not terms or limit < 1:
+        return []
+    if session.get_bind().dialect.name == 'postgresql':
+        if has_trigram_index(session):
+            return _search_postgresql(session, query, terms, asado_id, limit, trigram=True)
+        results = _search_postgresql(session, query, terms, asado_id, limit, trigram=False)
+    else:
+        results = _search_sqlite(session, terms, asado_id, limit)
+    return _merge(results, _search_fuzzy(session, query, asado_id, limit, categories), limit)
+
+def _search_postgresql(session, query, terms, asado_id, limit, trigram):
+    asado_filter = "AND e.asado_id = :asado_id" if asado_id is not None else ""
+    branches = [
+        f"(SELECT e.id, {TEXT_SCORE} + {TEXT_SCORE} * ts_rank(e.search_vector, q, 32) AS score "
+        f"FROM expenses e, to_tsquery('spanish', :tsquery) q "
+        f"WHERE e.search_vector @@ q {asado_filter} ORDER BY score DESC LIMIT :limit)"
+    ]
+    if trigram:
+        branches += [
+            f"(SELECT e.id, {FUZZY_SCORE} * word_similarity(:query, p.name) AS score "
+            f"FROM participants p JOIN expenses e ON e.participant_id = p.id "
+            f"WHERE :query <% p.name {asado_filter} ORDER BY score DESC, e.id DESC LIMIT :limit)",
+            f"(SELECT e.id, {FUZZY_SCORE} * word_similarity(:query, e.category) AS score "
+            f"FROM expenses e WHERE :query <% e.category {asado_filter} ORDER BY score DESC, e.id DESC LIMIT :limit)",
+        ]
+    statement = text(
+        f"SELECT {RESULT_COLUMNS}, top.score FROM ("
+        f"SELECT id, max(score) AS score FROM ({' UNION ALL '.join(branches)}) hits "
+        f"GROUP BY id ORDER BY score DESC, id DESC LIMIT :limit"
+        f") top {RESULT_JOINS} ORDER BY top.score DESC, e.id DESC"
+    ).columns(**RESULT_TYPES)
+    params = {'tsquery': ' & '.join(f"{term}:*" for term in terms), 'query': normalize(query), 'limit': limit}
+    if asado_id is not None:
+        params['asado_id'] = asado_id
+    return [SearchResultRow._make(row) for row in session.execute(statement, params)]
+
+def _search_sqlite(session, terms, asado_id, limit):
+    asado_filter = "AND e.asado_id = :asado_id" if asado_id is not None else ""
+    # bm25 es negativo (más negativo, más relevante): se lleva a (0.5, 1)
+    statement = text(
+        f"SELECT {RESULT_COLUMNS}, top.score FROM ("
+        f"SELECT expense_search.rowid AS id, "
+        f"{TEXT_SCORE} + {TEXT_SCORE} * (-bm25(expense_search) / (1 - bm25(expense_search))) AS score "
+        f"FROM expense_search JOIN expenses e ON e.id = expense_search.rowid "
+        f"WHERE expense_search MATCH :match {asado_filter} ORDER BY bm25(expense_search) LIMIT :limit"
+        f") top {RESULT_JOINS} ORDER BY top.score DESC, e.id DESC"
+    ).columns(**RESULT_TYPES)
+    params = {'match': ' '.join(f'"{term}"*' for term in terms), 'limit': limit}
+    if asado_id is not None:
+        params['asado_id'] = asado_id
+    return [SearchResultRow._make(row) for row in session.execute(statement, params)]
+
+def _search_fuzzy(session, query, asado_id, limit, categories):
+    """Gastos de participantes y categorías parecidos, con trigramas calculados en Python
+    
+    Los nombres y categorías distintos son pocos comparados con los gastos,
+    así que se comparan todos y solo se consultan los gastos de los parecidos.
+    """
+    if asado_id is None:
+        names = session.execute(text("SELECT DISTINCT name FROM participants")).scalars().all()
+    else:
+        names = session.execute(
+            text("SELECT name FROM participants WHERE asado_id = :asado_id"), {'asado_id': asado_id}
+        ).scalars().all()
+    
+    matches = []
+    for column, values in (('p.name', names), ('e.category', categories)):
+        for value in set(values):
+            similarity = trigram_similarity(query, value)
+            if similarity >= FUZZY_THRESHOLD:
+                matches.append((similarity, column, value))
+    matches.sort(reverse=True)
+    
+    asado_filter = "AND e.asado_id = :asado_id" if asado_id is not None else ""
+    results = []
+    for similarity, column, value in matches:
+        if len(results) >= limit:
+            break
+        statement = text(
+            f"SELECT {RESULT_COLUMNS} FROM (SELECT e.id FROM expenses e "
+            f"JOIN participants p ON p.id = e.participant_id "
+            f"WHERE {column} = :value {asado_filter} ORDER BY e.id DESC LIMIT :limit"
+            f") top {RESULT_JOINS} ORDER BY e.id DESC"
+        ).columns(**RESULT_TYPES)
+        params = {'value': value, 'limit': limit - len(results)}
+        if asado_id is not None:
+            params['asado_id'] = asado_id
+        score = FUZZY_SCORE * similarity
+        results.extend(SearchResultRow(*row, score) for row in session.execute(statement, params))
+    return results
+
+def _merge(text_results, fuzzy_results, limit):
+    """Unir resultados quedándose con el mejor puntaje de cada gasto"""
+    best = {}
+    for results in (text_results, fuzzy_results):
+        for row in results:
+            if row.id not in best or row.score > best[row.id].score:
+                best[row.id] = row
+    return sorted(best.values(), key=lambda row: (-row.score, -row.id))[:limit]
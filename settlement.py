@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Liquidación de todos los asados en lote
+
+Lee de la base lo que pagó y lo que le toca a cada participante de cada
+asado (una sola consulta agregada, en streaming), reparte los asados en tandas
+entre un pool de procesos que calcula balances y transferencias con la
+misma lógica de la página de Resumen, y escribe un único informe.
+
+Uso:
+    python settlement.py informe.csv
+    python settlement.py informe.parquet --workers 8
+    python settlement.py informe.json --chunk-size 2000
+
+CSV y Parquet tienen una fila por participante (con sus transferencias en
+las columnas pays y receives); JSON tiene un objeto por asado.
+"""
+
+import os
+import csv
+import json
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from summary import calculate_balance, calculate_transfers, balance_status
+
+logger = logging.getLogger(__name__)
+
+REPORT_COLUMNS = ['asado_id', 'asado', 'participant', 'paid', 'share', 'balance', 'status', 'pays', 'receives']
+
+def settle_asado(asado_id, asado_name, totals):
+    """Liquidación de un asado a partir de sus totales por participante
+    
+    totals es ([(participante, pagado, parte de los gastos con división), ...],
+    total de los gastos sin división): a cada uno le toca su parte de los
+    gastos con división más ese total repartido entre todos.
+    """
+    rows, equal_split = totals
+    participants = [participant for participant, _, _ in rows]
+    paid = {participant: amount for participant, amount, _ in rows}
+    equal_share = equal_split / len(participants)
+    share = {participant: weighted + equal_share for participant, _, weighted in rows}
+    total = sum(paid.values())
+    balance = calculate_balance(participants, paid, share)
+    transfers = calculate_transfers(balance)
+    return {
+        'asado_id': asado_id,
+        'asado': asado_name,
+        'total': round(total, 2),
+        'per_person': round(total / len(participants), 2),
+        'participants': [
+            {
+                'participant': participant,
+                'paid': round(paid[participant], 2),
+                'share': round(share[participant], 2),
+                'balance': round(balance[participant], 2),
+                'status': balance_status(balance[participant])
+            }
+            for participant in participants
+        ],
+        'transfers': [
+            {'from': deudor, 'to': acreedor, 'amount': round(monto, 2)}
+            for deudor, acreedor, monto in transfers
+        ]
+    }
+
+def settle_chunk(chunk):
+    """Liquidar una tanda de asados (se ejecuta en un proceso del pool)"""
+    return [settle_asado(*asado) for asado in chunk]
+
+def read_asados(service, chunk_size: int):
+    """Agrupar el stream de totales por asado y generar tandas de chunk_size asados"""
+    chunk = []
+    for (asado_id, asado_name), rows in groupby(service.stream_participant_totals(), key=itemgetter(0, 1)):
+        rows = list(rows)
+        chunk.append((asado_id, asado_name, (
+            [(participant, float(paid), float(weighted)) for _, _, participant, paid, weighted, _ in rows],
+            float(rows[0][5])
+        )))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def settle_all(service, workers: int = None, chunk_size: int = 1000):
+    """Generar las liquidaciones de todos los asados, en orden, calculadas en paralelo
+    
+    Mantiene a lo sumo dos tandas por proceso en vuelo, así la memoria no
+    crece con la cantidad de asados.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = read_asados(service, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from settle_chunk(chunk)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(settle_chunk, chunk))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def report_rows(settlement):
+    """Filas del informe (una por participante) de la liquidación de un asado"""
+    pays = {}
+    receives = {}
+    for transfer in settlement['transfers']:
+        pays.setdefault(transfer['from'], []).append(f"{transfer['to']}={transfer['amount']:.2f}")
+        receives.setdefault(transfer['to'], []).append(f"{transfer['from']}={transfer['amount']:.2f}")
+    for line in settlement['participants']:
+        yield {
+            'asado_id': settlement['asado_id'],
+            'asado': settlement['asado'],
+            **line,
+            'pays': '; '.join(pays.get(line['participant'], [])),
+            'receives': '; '.join(receives.get(line['participant'], []))
+        }
+
+def write_csv(settlements, path):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as output:
+        writer = csv.DictWriter(output, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        for settlement in settlements:
+            writer.writerows(report_rows(settlement))
+            count += 1
+    return count
+
+def write_json(settlements, path):
+    count = 0
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write('[\n')
+        for settlement in settlements:
+            if count:
+                output.write(',\n')
+            output.write(json.dumps(settlement, ensure_ascii=False))
+            count += 1
+        output.write('\n]\n')
+    return count
+
+def write_parquet(settlements, path, rows_per_group: int = 100000):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([
+        ('asado_id', pa.int64()), ('asado', pa.string()), ('participant', pa.string()),
+        ('paid', pa.float64()), ('share', pa.float64()), ('balance', pa.float64()),
+        ('status', pa.string()), ('pays', pa.string()), ('receives', pa.string())
+    ])
+    count = 0
+    rows = []
+    with pq.ParquetWriter(path, schema) as writer:
+        for settlement in settlements:
+            rows.extend(report_rows(settlement))
+            count += 1
+            if len(rows) >= rows_per_group:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    return count
+
+WRITERS = {'csv': write_csv, 'json': write_json, 'parquet': write_parquet}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="Archivo del informe (.csv, .parquet o .json)")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="Formato (por defecto, según la extensión)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, uno por núcleo)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Asados por tanda")
+    args = parser.parse_args()
+    
+    report_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if report_format not in WRITERS:
+        parser.error(f"Formato desconocido: {report_format!r} (usar --format)")
+    
+    # Sin initialize_database: el lote no necesita listener ni cola de escritura
+    from database import create_asado_service
+    service = create_asado_service()
+    count = WRITERS[report_format](settle_all(service, args.workers, args.chunk_size), args.output)
+    logger.info(f"{count} asados liquidados en {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Sharding horizontal de asados entre varias bases
+
+Con DATABASE_SHARDS="nombre=url,nombre=url,..." cada asado vive en un solo
+shard, elegido por hashing consistente de su nombre (los ids son de cada
+base, así que no sirven para rutear). ShardedAsadoService tiene la misma
+interfaz que AsadoService: las operaciones de un asado van a su shard y los
+listados de todos los asados (asados, estadísticas, búsqueda, analítica)
+consultan todos los shards en paralelo y juntan los resultados.
+DATABASE_URL queda como base global: ahí van las categorías personalizadas.
+
+Agregar o sacar un shard cambia el dueño de una parte de los asados; hasta
+rebalancear, los que todavía están en su shard anterior no se encuentran.
+El rebalanceo mueve cada asado a su dueño: lo archiva en el origen, importa
+el Parquet en el destino, lo restaura ahí si no estaba archivado y lo borra
+del origen. Mientras se mueve es de solo lectura, y sus gastos reciben ids
+nuevos.
+
+Uso:
+    python shards.py status
+    python shards.py rebalance --dry-run
+    python shards.py rebalance
+"""
+
+import os
+import bisect
+import hashlib
+import logging
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from database import (
+    DatabaseManager, AsadoService, ParticipantMonthRow, ParticipantRollupRow, CategoryTrendRow
+)
+from archive import read_archive_metadata
+
+logger = logging.getLogger(__name__)
+
+def shard_urls():
+    """{nombre: url} de DATABASE_SHARDS, en el orden en que aparecen"""
+    shards = {}
+    for entry in os.getenv('DATABASE_SHARDS', '').split(','):
+        if not entry.strip():
+            continue
+        name, separator, url = entry.partition('=')
+        name = name.strip()
+        if not separator or not name or not url.strip():
+            raise ValueError(f"Shard inválido en DATABASE_SHARDS: {entry!r} (nombre=url)")
+        if name in shards:
+            raise ValueError(f"Shard repetido en DATABASE_SHARDS: {name}")
+        shards[name] = url.strip()
+    if not shards:
+        raise ValueError("DATABASE_SHARDS no tiene shards")
+    return shards
+
+def _hash(key: str):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    """Anillo de hashing consistente con vnodes puntos por shard
+    
+    Agregar un shard solo le pasa los asados de los tramos que toma (en
+    promedio 1/n del total); los demás no cambian de dueño.
+    """
+    
+    def __init__(self, shards, vnodes: int = 64):
+        points = sorted((_hash(f"{shard}#{index}"), shard) for shard in shards for index in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+    
+    def owner(self, key: str):
+        """Shard dueño de key: el primer punto del anillo desde su hash"""
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[index]
+
+class ShardVersions:
+    """Versiones conocidas de los asados, cada una en el AsadoVersions de su shard"""
+    
+    def __init__(self, service):
+        self.service = service
+    
+    def get(self, asado_name: str):
+        return self.service.shard_for(asado_name).versions.get(asado_name)
+    
+    def invalidate(self, asado_name: str):
+        self.service.shard_for(asado_name).versions.invalidate(asado_name)
+
+def merge_participant_analytics(results):
+    """Juntar get_participant_analytics de varios shards (cada asado está en uno solo)"""
+    months = defaultdict(lambda: [0.0, 0.0, 0])
+    totals = {}
+    for result in results:
+        for row in result['months']:
+            month = months[(row.participant, row.month)]
+            month[0] += row.paid
+            month[1] += row.owed
+            month[2] += row.asados
+        for row in result['totals']:
+            total = totals.get(row.participant)
+            if total is None:
+                totals[row.participant] = [row.name, row.paid, row.owed, row.asados, row.expenses]
+                continue
+            total[0] = min(total[0], row.name)
+            total[1] += row.paid
+            total[2] += row.owed
+            total[3] += row.asados
+            total[4] += row.expenses
+    return {
+        'months': [ParticipantMonthRow(*key, *values) for key, values in sorted(months.items())],
+        'totals': sorted(
+            (ParticipantRollupRow(participant, *values) for participant, values in totals.items()),
+            key=lambda row: row.paid, reverse=True
+        )
+    }
+
+def merge_category_trends(results):
+    """Juntar get_category_trends de varios shards y recalcular las ventanas sobre el total"""
+    cells = defaultdict(lambda: [0.0, 0])
+    for rows in results:
+        for row in rows:
+            cell = cells[(row.month, row.category)]
+            cell[0] += row.total
+            cell[1] += row.expenses
+    month_totals = defaultdict(float)
+    for (month, _), (total, _) in cells.items():
+        month_totals[month] += total
+    
+    merged = []
+    previous = {}
+    cumulative = defaultdict(float)
+    for (month, category), (total, expenses) in sorted(cells.items()):
+        cumulative[category] += total
+        merged.append(CategoryTrendRow(
+            month, category, total, expenses,
+            total / month_totals[month] if month_totals[month] else None,
+            previous.get(category),
+            cumulative[category]
+        ))
+        previous[category] = total
+    return merged
+
+class ShardedAsadoService(AsadoService):
+    """AsadoService sobre varios shards: rutea por asado y junta los listados
+    
+    La base de db_manager es la global (categorías personalizadas, su
+    listener y la cola de escritura diferida); shards es {nombre: url} y
+    cada shard tiene su propio AsadoService, con su listener y su pool.
+    Las réplicas de lectura (DATABASE_READ_URLS) son solo de la base global.
+    """
+    
+    def __init__(self, db_manager: DatabaseManager, shards: dict, vnodes: int = 64):
+        super().__init__(db_manager)
+        self.shards = {
+            name: AsadoService(DatabaseManager(url, read_urls=[], shard=name))
+            for name, url in shards.items()
+        }
+        for service in self.shards.values():
+            # Una sola caché de categorías, la de la base global
+            service.categories = self.categories
+        self.ring = HashRing(self.shards, vnodes)
+        self.versions = ShardVersions(self)
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='asadoapp-shard')
+    
+    def shard_for(self, asado_name: str):
+        """AsadoService del shard dueño del asado"""
+        return self.shards[self.ring.owner(asado_name)]
+    
+    def _gather(self, method: str, *args, **kwargs):
+        """Llamar method en todos los shards en paralelo; resultados en el orden de los shards"""
+        futures = [
+            self._executor.submit(getattr(service, method), *args, **kwargs)
+            for service in self.shards.values()
+        ]
+        return [future.result() for future in futures]
+    
+    def db_managers(self):
+        return [self.db_manager] + [service.db_manager for service in self.shards.values()]
+    
+    def start_listener(self):
+        super().start_listener()
+        for service in self.shards.values():
+            service.start_listener()
+    
+    def stop_listener(self):
+        super().stop_listener()
+        for service in self.shards.values():
+            service.stop_listener()
+    
+    def _on_listener_reset(self, connected: bool):
+        # El listener de la base global solo cuida las categorías; cada shard, sus versiones
+        self.categories.invalidate()
+    
+    # Operaciones de un asado: van a su shard
+    
+    def create_asado(self, name: str):
+        return self.shard_for(name).create_asado(name)
+    
+    def get_asado_by_name(self, name: str):
+        return self.shard_for(name).get_asado_by_name(name)
+    
+    def delete_asado(self, name: str):
+        return self.shard_for(name).delete_asado(name)
+    
+    def archive_asado(self, name: str):
+        return self.shard_for(name).archive_asado(name)
+    
+    def restore_asado(self, name: str):
+        return self.shard_for(name).restore_asado(name)
+    
+    def get_archive_path(self, name: str):
+        return self.shard_for(name).get_archive_path(name)
+    
+    def import_archive(self, path: str):
+        return self.shard_for(read_archive_metadata(path)['name']).import_archive(path)
+    
+    def add_participant(self, asado_name: str, participant_name: str):
+        return self.shard_for(asado_name).add_participant(asado_name, participant_name)
+    
+    def get_participants(self, asado_name: str):
+        return self.shard_for(asado_name).get_participants(asado_name)
+    
+    def get_participant_rows(self, asado_name: str):
+        return self.shard_for(asado_name).get_participant_rows(asado_name)
+    
+    def remove_participant(self, asado_name: str, participant_name: str):
+        return self.shard_for(asado_name).remove_participant(asado_name, participant_name)
+    
+    def add_expense(self, asado_name: str, participant_name: str, category: str, amount: float, description: str = "", shares=None):
+        return self.shard_for(asado_name).add_expense(asado_name, participant_name, category, amount, description, shares)
+    
+    def add_expenses(self, items):
+        """Agregar varios gastos: un INSERT multi-fila y un commit por shard"""
+        by_shard = defaultdict(list)
+        for index, item in enumerate(items):
+            by_shard[self.ring.owner(item['asado'])].append(index)
+        ids = [None] * len(items)
+        for shard, indexes in by_shard.items():
+            shard_ids = self.shards[shard].add_expenses([items[index] for index in indexes])
+            for index, expense_id in zip(indexes, shard_ids):
+                ids[index] = expense_id
+        return ids
+    
+    def set_expense_shares(self, expense_id: int, shares=None, asado_name: str = None):
+        if asado_name is None:
+            raise ValueError("Con shards los ids de gasto no son únicos: hace falta el asado")
+        return self.shard_for(asado_name).set_expense_shares(expense_id, shares, asado_name)
+    
+    def remove_expense(self, expense_id: int, asado_name: str = None):
+        if asado_name is None:
+            raise ValueError("Con shards los ids de gasto no son únicos: hace falta el asado")
+        return self.shard_for(asado_name).remove_expense(expense_id, asado_name)
+    
+    def get_expense_shares(self, asado_name: str):
+        return self.shard_for(asado_name).get_expense_shares(asado_name)
+    
+    def get_expenses(self, asado_name: str):
+        return self.shard_for(asado_name).get_expenses(asado_name)
+    
+    def get_expenses_columnar(self, asado_name: str, as_arrow: bool = False):
+        return self.shard_for(asado_name).get_expenses_columnar(asado_name, as_arrow)
+    
+    def get_expense_changes(self, asado_name: str, since_version: int = 0):
+        return self.shard_for(asado_name).get_expense_changes(asado_name, since_version)
+    
+    def get_asado_snapshot(self, asado_name: str, since_version: int = 0):
+        return self.shard_for(asado_name).get_asado_snapshot(asado_name, since_version)
+    
+    def get_asado_version(self, asado_name: str):
+        return self.shard_for(asado_name).get_asado_version(asado_name)
+    
+    # Listados de todos los asados: scatter-gather
+    
+    def get_all_asados(self):
+        rows = [row for rows in self._gather('get_all_asados') for row in rows]
+        return sorted(rows, key=lambda row: (row.created_date or datetime.min, row.name))
+    
+    def get_asado_stats(self):
+        rows = [row for rows in self._gather('get_asado_stats') for row in rows]
+        return sorted(rows, key=lambda row: (row.created_date or datetime.min, row.name))
+    
+    def search_expenses(self, query: str, asado_name: str = None, limit: int = 20):
+        if asado_name is not None:
+            return self.shard_for(asado_name).search_expenses(query, asado_name, limit)
+        rows = [row for rows in self._gather('search_expenses', query, None, limit) for row in rows]
+        return sorted(rows, key=lambda row: row.score, reverse=True)[:limit]
+    
+    def get_data_version(self):
+        return tuple(self._gather('get_data_version'))
+    
+    def get_expense_years(self):
+        return sorted(set().union(*self._gather('get_expense_years')), reverse=True)
+    
+    def get_participant_analytics(self, year=None):
+        return merge_participant_analytics(self._gather('get_participant_analytics', year))
+    
+    def get_category_trends(self, year=None):
+        return merge_category_trends(self._gather('get_category_trends', year))
+    
+    def stream_participant_totals(self, batch_size: int = 5000):
+        """Totales por participante shard por shard (ordenados por asado dentro de cada uno)"""
+        for service in self.shards.values():
+            yield from service.stream_participant_totals(batch_size)
+    
+    def count_archived_asados(self):
+        return sum(self._gather('count_archived_asados'))
+    
+    def get_idle_asados(self, before: datetime):
+        return [name for names in self._gather('get_idle_asados', before) for name in names]
+
+def misplaced_asados(service: ShardedAsadoService):
+    """[(asado, shard actual, shard dueño)] de los asados que no están en su shard"""
+    misplaced = []
+    for shard, rows in zip(service.shards, service._gather('get_all_asados')):
+        for row in rows:
+            owner = service.ring.owner(row.name)
+            if owner != shard:
+                misplaced.append((row.name, shard, owner))
+    return misplaced
+
+def move_asado(service: ShardedAsadoService, name: str, source: str, target: str):
+    """Mover un asado entre shards por su Parquet; si algo falla, vuelve a quedar en el origen"""
+    source_service, target_service = service.shards[source], service.shards[target]
+    # False si ya estaba archivado: en ese caso se muda archivado
+    archived_here = source_service.archive_asado(name)
+    path = source_service.get_archive_path(name)
+    if path is None:
+        raise ValueError(f"No existe el asado {name} en el shard {source}")
+    
+    imported = False
+    try:
+        if target_service.import_archive(path) is None:
+            raise ValueError(f"Ya existe un asado {name} en el shard {target}")
+        imported = True
+        if archived_here:
+            target_service.restore_asado(name)
+        source_service.delete_asado(name)
+    except Exception:
+        if imported:
+            target_service.delete_asado(name)
+        if archived_here:
+            source_service.restore_asado(name)
+        raise
+
+def rebalance(service: ShardedAsadoService, dry_run: bool = False):
+    """Mover cada asado a su shard según el anillo; devuelve los que movió (o movería)"""
+    misplaced = misplaced_asados(service)
+    moved = []
+    for name, source, target in misplaced:
+        if dry_run:
+            logger.info(f"{name}: {source} -> {target}")
+            moved.append((name, source, target))
+            continue
+        try:
+            move_asado(service, name, source, target)
+            logger.info(f"Asado {name} movido de {source} a {target}")
+            moved.append((name, source, target))
+        except Exception as e:
+            logger.error(f"Error moviendo el asado {name} de {source} a {target}: {e}")
+    return moved
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Asados por shard y cuántos están fuera de su shard")
+    rebalance_parser = subparsers.add_parser('rebalance', help="Mover los asados a su shard")
+    rebalance_parser.add_argument("--dry-run", action="store_true", help="Solo listar lo que se movería")
+    args = parser.parse_args()
+    
+    # Sin initialize_database: no hace falta listener ni cola de escritura
+    service = ShardedAsadoService(DatabaseManager(), shard_urls())
+    for manager in service.db_managers():
+        manager.create_tables()
+    if args.command == 'status':
+        misplaced = defaultdict(int)
+        for _, source, _ in misplaced_asados(service):
+            misplaced[source] += 1
+        for shard, rows in zip(service.shards, service._gather('get_all_asados')):
+            logger.info(f"{shard}: {len(rows)} asados, {misplaced[shard]} fuera de su shard")
+        return
+    
+    moved = rebalance(service, args.dry_run)
+    logger.info(f"{len(moved)} asados {'a mover' if args.dry_run else 'movidos'}")
+
+if __name__ == "__main__":
+    main()
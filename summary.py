@@ -0,0 +1,309 @@
+# pandas y Plotly se importan dentro de las funciones que arman tablas y
+# gráficos, para que importar este módulo (p. ej. por format_currency) sea liviano.
+
+from memory import traced
+
+def format_currency(amount):
+    """Formatear cantidad como moneda argentina"""
+    return f"${amount:,.2f}"
+
+@traced("calculate_totals")
+def calculate_totals(participants, df, shares=None):
+    """Calcular totales y división de gastos
+    
+    Sin shares cada gasto se divide en partes iguales entre todos; shares son
+    las divisiones explícitas por gasto en formato columnar (expense_id,
+    participant, weight), como las devuelve AsadoService.get_expense_shares.
+    """
+    if df.empty or not participants:
+        return None
+    
+    # Total general
+    total_general = df['amount'].sum()
+    
+    # Total por participante
+    total_by_participant = df.groupby('participant')['amount'].sum()
+    
+    # Total por categoría
+    total_by_category = df.groupby('category')['amount'].sum()
+    
+    # Cantidad a pagar por persona (promedio si hay divisiones explícitas)
+    num_participants = len(participants)
+    amount_per_person = total_general / num_participants if num_participants > 0 else 0
+    
+    # Cuánto le toca pagar a cada uno
+    if has_shares(shares):
+        should_pay = calculate_owed(participants, df['id'].to_numpy(), df['amount'].to_numpy(), shares)
+    else:
+        should_pay = amount_per_person
+    
+    # Calcular balance (cuánto pagó cada uno vs cuánto debe pagar)
+    balance = calculate_balance(participants, total_by_participant, should_pay)
+    
+    return {
+        'total_general': total_general,
+        'total_by_participant': total_by_participant,
+        'total_by_category': total_by_category,
+        'amount_per_person': amount_per_person,
+        'should_pay': should_pay,
+        'balance': balance,
+        'df': df
+    }
+
+def has_shares(shares):
+    """Si hay alguna división explícita en shares (columnar)"""
+    return shares is not None and len(shares['expense_id']) > 0
+
+def calculate_owed(participants, expense_ids, amounts, shares):
+    """Cuánto le toca pagar a cada participante con divisiones por gasto
+    
+    Es el producto de la matriz rala participante x gasto de pesos
+    normalizados por el vector de montos, con la matriz en formato COO (los
+    arrays de shares) y sin recorrer gastos por participante. Los gastos sin
+    división explícita (o cuyos participantes ya no están) se reparten en
+    partes iguales entre todos.
+    """
+    import numpy as np
+    
+    if not participants:
+        return {}
+    expense_ids = np.asarray(expense_ids, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    share_expenses = np.asarray(shares['expense_id'], dtype=np.int64)
+    share_participants = np.asarray(shares['participant'], dtype=str)
+    weights = np.asarray(shares['weight'], dtype=np.float64)
+    
+    # Columna (gasto) de cada peso
+    expense_order = np.argsort(expense_ids, kind='stable')
+    sorted_expenses = expense_ids[expense_order]
+    columns = np.searchsorted(sorted_expenses, share_expenses)
+    columns[columns == len(sorted_expenses)] = 0
+    valid = sorted_expenses[columns] == share_expenses if len(sorted_expenses) else np.zeros(len(columns), dtype=bool)
+    
+    # Fila (participante) de cada peso
+    names = np.asarray(participants, dtype=str)
+    name_order = np.argsort(names, kind='stable')
+    sorted_names = names[name_order]
+    rows = np.searchsorted(sorted_names, share_participants)
+    rows[rows == len(sorted_names)] = 0
+    valid &= sorted_names[rows] == share_participants
+    
+    columns = expense_order[columns[valid]]
+    rows = name_order[rows[valid]]
+    weights = weights[valid]
+    
+    # Normalizar cada columna para que sus pesos sumen 1
+    column_weights = np.bincount(columns, weights=weights, minlength=len(expense_ids))
+    # bincount devuelve enteros si no quedó ningún peso válido
+    owed = np.bincount(rows, weights=weights / column_weights[columns] * amounts[columns], minlength=len(names)).astype(np.float64)
+    owed += amounts[column_weights == 0].sum() / len(names)
+    return dict(zip(participants, owed.tolist()))
+
+def calculate_balance(participants, total_by_participant, amount_per_person):
+    """Balance de cada participante: lo que pagó menos lo que le toca pagar
+    
+    total_by_participant es cualquier mapeo participante -> monto pagado
+    (una Series de pandas o un dict); amount_per_person es un monto igual
+    para todos o un mapeo participante -> monto.
+    """
+    balance = {}
+    for participant in participants:
+        paid = float(total_by_participant.get(participant, 0))
+        if hasattr(amount_per_person, 'get'):
+            should_pay = float(amount_per_person.get(participant, 0))
+        else:
+            should_pay = float(amount_per_person)
+        balance[participant] = paid - should_pay
+    return balance
+
+def calculate_transfers(balance):
+    """Calcular quién le paga a quién a partir de los balances (algoritmo greedy)
+    
+    Devuelve una lista de tuplas (deudor, acreedor, monto).
+    """
+    deudores = []
+    acreedores = []
+    for participant, amount in balance.items():
+        if amount > 0.01:  # Debe recibir (acreedor)
+            acreedores.append((participant, amount))
+        elif amount < -0.01:  # Debe pagar (deudor)
+            deudores.append((participant, abs(amount)))
+    
+    # Ordenar por montos (mayor a menor)
+    deudores.sort(key=lambda x: x[1], reverse=True)
+    acreedores.sort(key=lambda x: x[1], reverse=True)
+    
+    transferencias = []
+    while deudores and acreedores:
+        deudor_name, deuda = deudores[0]
+        acreedor_name, credito = acreedores[0]
+        
+        # El monto a transferir es el menor entre la deuda y el crédito
+        monto_transferencia = min(deuda, credito)
+        transferencias.append((deudor_name, acreedor_name, monto_transferencia))
+        
+        # Actualizar los montos
+        deudores[0] = (deudor_name, deuda - monto_transferencia)
+        acreedores[0] = (acreedor_name, credito - monto_transferencia)
+        
+        # Remover si ya no deben nada
+        if deudores[0][1] <= 0.01:
+            deudores.pop(0)
+        if acreedores[0][1] <= 0.01:
+            acreedores.pop(0)
+    
+    return transferencias
+
+def balance_status(amount):
+    """Estado de un participante según su balance"""
+    if amount > 0.01:
+        return "Debe recibir"
+    if amount < -0.01:
+        return "Debe pagar"
+    return "Está al día"
+
+@traced("build_summary")
+def build_summary(participants, df, shares=None):
+    """Armar todo lo que muestra la página de Resumen
+    
+    El resultado es inmutable en la práctica (se comparte entre sesiones
+    desde la caché): tablas listas para mostrar y figuras serializadas a JSON.
+    """
+    import pandas as pd
+    
+    totals = calculate_totals(participants, df, shares)
+    if not totals:
+        return None
+    
+    balance_df = pd.DataFrame([
+        {
+            'Participante': participant,
+            'Balance': format_currency(abs(amount)),
+            'Estado': balance_status(amount)
+        }
+        for participant, amount in totals['balance'].items()
+    ])
+    if has_shares(shares):
+        balance_df.insert(1, 'Le toca', [format_currency(totals['should_pay'][participant]) for participant in balance_df['Participante']])
+    
+    transfers = [
+        {'De': deudor, 'Para': acreedor, 'Monto': format_currency(monto)}
+        for deudor, acreedor, monto in calculate_transfers(totals['balance'])
+    ]
+    
+    category_summary = df.groupby('category').agg({
+        'amount': ['sum', 'count', 'mean']
+    }).round(2)
+    category_summary.columns = ['Total', 'Cantidad', 'Promedio']
+    category_summary['Total'] = category_summary['Total'].apply(format_currency)
+    category_summary['Promedio'] = category_summary['Promedio'].apply(format_currency)
+    
+    category_figure, participant_figure = build_figures(totals)
+    
+    return {
+        'total_general': totals['total_general'],
+        'amount_per_person': totals['amount_per_person'],
+        'num_participants': len(participants),
+        'weighted': has_shares(shares),
+        'category_figure': category_figure,
+        'participant_figure': participant_figure,
+        'balance_df': balance_df,
+        'transfers': transfers,
+        'transfers_df': pd.DataFrame(transfers),
+        'category_summary': category_summary
+    }
+
+def build_figures(totals):
+    """Gráficos de la página de Resumen serializados a JSON (o None si no hay datos)"""
+    import plotly.express as px
+    
+    category_figure = None
+    if len(totals['total_by_category']) > 0:
+        category_figure = px.pie(
+            values=totals['total_by_category'].values,
+            names=totals['total_by_category'].index,
+            title="Distribución de Gastos por Categoría"
+        ).to_json()
+    
+    participant_figure = None
+    if len(totals['total_by_participant']) > 0:
+        participant_figure = px.bar(
+            x=totals['total_by_participant'].index,
+            y=totals['total_by_participant'].values,
+            title="Gastos Pagados por Participante",
+            labels={'x': 'Participante', 'y': 'Monto ($)'}
+        ).to_json()
+    
+    return category_figure, participant_figure
+
+@traced("build_analytics")
+def build_analytics(analytics, trends):
+    """Armar lo que muestra la página de Historial (todos los asados juntos)
+    
+    analytics y trends son los resultados de get_participant_analytics y
+    get_category_trends; como build_summary, el resultado se comparte entre
+    sesiones desde la caché.
+    """
+    import pandas as pd
+    import plotly.express as px
+    
+    if not analytics['totals']:
+        return None
+    
+    totals = pd.DataFrame(analytics['totals'])
+    balance = totals['paid'] - totals['owed']
+    totals_df = pd.DataFrame({
+        'Participante': totals['name'],
+        'Asados': totals['asados'],
+        'Gastos': totals['expenses'],
+        'Pagó': totals['paid'].apply(format_currency),
+        'Le tocó': totals['owed'].apply(format_currency),
+        'Balance': balance.abs().apply(format_currency),
+        'Estado': balance.apply(balance_status)
+    })
+    
+    trend_figure = None
+    trend_df = pd.DataFrame()
+    if trends:
+        trends = pd.DataFrame(trends)
+        trend_figure = px.line(
+            trends, x='month', y='total', color='category', markers=True,
+            title="Gastos por Categoría y Mes",
+            labels={'month': 'Mes', 'total': 'Monto ($)', 'category': 'Categoría'}
+        ).to_json()
+        change = (trends['total'] / trends['previous'] - 1) * 100
+        trend_df = pd.DataFrame({
+            'Mes': trends['month'],
+            'Categoría': trends['category'],
+            'Total': trends['total'].apply(format_currency),
+            'Gastos': trends['expenses'],
+            '% del mes': (trends['share'] * 100).round(1),
+            'Vs. mes anterior (%)': change.round(1),
+            'Acumulado': trends['cumulative'].apply(format_currency)
+        })
+    
+    return {
+        'total_paid': float(totals['paid'].sum()),
+        'num_participants': len(totals),
+        'participants': dict(zip(totals['participant'], totals['name'])),
+        'totals_df': totals_df,
+        'months': pd.DataFrame(analytics['months']),
+        'trend_figure': trend_figure,
+        'trend_df': trend_df
+    }
+
+def build_participant_history(months, participant):
+    """Tabla y gráfico mes a mes de un participante (clave normalizada) de build_analytics"""
+    import plotly.express as px
+    
+    rows = months[months['participant'] == participant]
+    figure = px.bar(
+        rows.melt(id_vars='month', value_vars=['paid', 'owed']).replace({'paid': 'Pagó', 'owed': 'Le tocó'}),
+        x='month', y='value', color='variable', barmode='group',
+        labels={'month': 'Mes', 'value': 'Monto ($)', 'variable': ''}
+    ).to_json()
+    table = rows.rename(columns={'month': 'Mes', 'asados': 'Asados'})[['Mes', 'Asados']].assign(**{
+        'Pagó': rows['paid'].apply(format_currency),
+        'Le tocó': rows['owed'].apply(format_currency)
+    })
+    return table, figure
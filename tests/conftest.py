@@ -0,0 +1,34 @@
+"""
+Fixtures compartidas: cada test usa una base SQLite y un directorio de archivos propios
+"""
+
+import pytest
+
+from database import DatabaseManager, AsadoService
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'asadoapp.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.setenv("ASADO_ARCHIVE_DIR", str(tmp_path / "archive"))
+    for name in ("DATABASE_SHARDS", "DATABASE_READ_URLS", "DATABASE_LISTEN_URL", "EXPENSE_WRITE_BEHIND"):
+        monkeypatch.delenv(name, raising=False)
+    return url
+
+
+@pytest.fixture
+def service(database_url):
+    db_manager = DatabaseManager()
+    db_manager.create_tables()
+    yield AsadoService(db_manager)
+    db_manager.engine.dispose()
+
+
+@pytest.fixture
+def asado(service):
+    """Asado con tres participantes"""
+    service.create_asado("Asado")
+    for name in ("Ana", "Beto", "Carla"):
+        service.add_participant("Asado", name)
+    return "Asado"
@@ -0,0 +1,79 @@
+"""
+Totales por participante y analítica entre asados, con asados archivados
+"""
+
+import os
+
+import pytest
+
+import database
+from database import PARTICIPANT_TOTALS, ASADO_PARTICIPANT_TOTALS
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def two_asados(service, asado):
+    service.add_expense(asado, "Ana", "Carne", 300.0)
+    service.add_expense(asado, "Beto", "Bebidas", 90.0, shares={"Beto": 2, "Carla": 1})
+    service.create_asado("Otro")
+    for name in ("Ana", "Dario"):
+        service.add_participant("Otro", name)
+    service.add_expense("Otro", "Dario", "Carne", 50.0)
+    service.add_expense("Otro", "Ana", "Hielo", 10.0, shares={"Ana": 1})
+    return asado, "Otro"
+
+
+def test_asado_totals_match_global_totals(service, two_asados):
+    with service.db_manager.get_session() as session:
+        everything = [tuple(row) for row in session.execute(PARTICIPANT_TOTALS)]
+        for name in two_asados:
+            asado_id = service.get_asado_by_name(name).id
+            expected = [row for row in everything if row[0] == asado_id]
+            rows = [tuple(row) for row in session.execute(ASADO_PARTICIPANT_TOTALS, {'asado_id': asado_id})]
+            assert rows == expected
+
+
+def test_asado_totals_only_count_that_asado(service, two_asados):
+    # Ana está en los dos asados y tiene gastos y divisiones en ambos
+    with service.db_manager.get_session() as session:
+        totals = {
+            name: {
+                row[2]: tuple(row[3:])
+                for row in session.execute(ASADO_PARTICIPANT_TOTALS, {'asado_id': service.get_asado_by_name(name).id})
+            }
+            for name in two_asados
+        }
+    assert totals == {
+        "Asado": {"Ana": (300.0, 0.0, 300.0), "Beto": (90.0, 60.0, 300.0), "Carla": (0.0, 30.0, 300.0)},
+        "Otro": {"Ana": (10.0, 10.0, 50.0), "Dario": (50.0, 0.0, 50.0)},
+    }
+
+
+def test_archived_asados_are_counted_and_excluded(service, two_asados):
+    before = {row.participant: row.paid for row in service.get_participant_analytics()['totals']}
+    assert before == pytest.approx({"ana": 310.0, "beto": 90.0, "carla": 0.0, "dario": 50.0})
+    assert service.count_archived_asados() == 0
+    
+    assert service.archive_asado("Otro")
+    after = {row.participant: row.paid for row in service.get_participant_analytics()['totals']}
+    assert after == pytest.approx({"ana": 300.0, "beto": 90.0, "carla": 0.0})
+    assert service.count_archived_asados() == 1
+    assert service.search_expenses("Hielo") == []
+
+
+def test_history_page_says_archived_asados_are_excluded(service, two_asados, monkeypatch):
+    AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+    service.archive_asado("Otro")
+    # initialize_database reemplaza el servicio del proceso; monkeypatch lo vuelve a dejar como estaba
+    monkeypatch.setattr(database, "asado_service", None)
+    assert database.initialize_database()
+    try:
+        app = AppTest.from_file(APP_PATH, default_timeout=60)
+        app.run()
+        app.sidebar.selectbox[1].select("Historial").run()
+        assert not app.exception
+        assert any("1 asado(s) archivado(s)" in caption.value for caption in app.caption)
+    finally:
+        for manager in database.get_asado_service().db_managers():
+            manager.stop_pool_probe()
@@ -0,0 +1,104 @@
+"""
+Rutas de la API HTTP/JSON sobre un servidor en un puerto libre de localhost
+"""
+
+import json
+import socket
+import threading
+import http.client
+
+import pytest
+
+import api
+import database
+
+
+@pytest.fixture
+def server(service, asado, monkeypatch):
+    """Servidor sin token con el servicio de los tests como servicio del proceso"""
+    monkeypatch.setattr(database, "asado_service", service)
+    instances = []
+    
+    def start(token=None):
+        instance = api.ApiServer(("127.0.0.1", 0), api.ApiHandler, token)
+        threading.Thread(target=instance.serve_forever, daemon=True).start()
+        instances.append(instance)
+        return instance
+    
+    yield start
+    for instance in instances:
+        instance.shutdown()
+        instance.server_close()
+
+
+def request(instance, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*instance.server_address, timeout=5)
+    payload = None if body is None else json.dumps(body)
+    connection.request(method, path, body=payload, headers=headers or {})
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response.status, json.loads(data) if data else None, response.getheader("ETag")
+
+
+def test_expenses_and_summary(server):
+    instance = server()
+    status, body, _ = request(instance, "POST", "/asados/Asado/expenses", {"expenses": [
+        {"participant": "Ana", "category": "Carne", "amount": 300},
+        {"participant": "Beto", "category": "Bebidas", "amount": 100, "shares": {"Beto": 1, "Carla": 1}},
+    ]})
+    assert status == 201 and len(body["ids"]) == 2
+    
+    status, body, etag = request(instance, "GET", "/asados/Asado")
+    assert status == 200
+    assert sorted(body["participants"]) == ["Ana", "Beto", "Carla"]
+    assert len(body["expenses"]["id"]) == 2
+    assert request(instance, "GET", "/asados/Asado", headers={"If-None-Match": etag})[0] == 304
+    
+    status, body, _ = request(instance, "GET", "/asados/Asado/summary")
+    assert status == 200
+    assert body["total"] == pytest.approx(400)
+    
+    assert request(instance, "GET", "/asados/Otro")[0] == 404
+    assert request(instance, "PUT", "/asados/Asado")[0] == 405
+
+
+def test_participants_must_be_strings(server):
+    instance = server()
+    assert request(instance, "POST", "/asados/Asado/participants", {"names": "Dario"})[0] == 400
+    assert request(instance, "POST", "/asados/Asado/participants", {"names": ["Dario", 3]})[0] == 400
+    assert request(instance, "POST", "/asados/Asado/participants", {"name": {"x": 1}})[0] == 400
+    
+    status, body, _ = request(instance, "POST", "/asados/Asado/participants", {"names": ["Dario", " Eva "]})
+    assert status == 201
+    assert [row["name"] for row in body["added"]] == ["Dario", "Eva"]
+
+
+@pytest.mark.parametrize("limit", ["0", "-1", "x"])
+def test_search_limit_must_be_positive(server, limit):
+    instance = server()
+    assert request(instance, "GET", f"/search?q=carne&limit={limit}")[0] == 400
+
+
+@pytest.mark.parametrize("length", ["-1", "abc"])
+def test_invalid_content_length(server, length):
+    instance = server()
+    with socket.create_connection(instance.server_address, timeout=5) as sock:
+        sock.sendall(f"POST /asados HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n\r\n".encode())
+        assert sock.recv(1024).startswith(b"HTTP/1.1 400")
+
+
+def test_token(server):
+    instance = server("secreto")
+    assert request(instance, "GET", "/asados")[0] == 401
+    assert request(instance, "GET", "/asados", headers={"Authorization": "Bearer otro"})[0] == 401
+    status, body, _ = request(instance, "GET", "/asados", headers={"Authorization": "Bearer secreto"})
+    assert status == 200
+    assert [row["name"] for row in body] == ["Asado"]
+
+
+def test_public_host_requires_token():
+    with pytest.raises(ValueError):
+        api.ApiServer(("0.0.0.0", 0), api.ApiHandler)
+    assert api.is_loopback("127.0.0.1") and api.is_loopback("::1") and api.is_loopback("localhost")
+    assert not api.is_loopback("0.0.0.0")
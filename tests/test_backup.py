@@ -0,0 +1,85 @@
+"""
+Backup y restauración completos sobre SQLite, con un asado archivado
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from backup import backup_database, restore_database
+from database import DatabaseManager, AsadoService
+
+
+@pytest.fixture
+def backup_path(service, asado, tmp_path):
+    service.add_expense(asado, "Ana", "Carne", 300.0, "vacío\tcon tab")
+    service.add_expense(asado, "Beto", "Bebidas", 90.0, shares={"Beto": 2, "Carla": 1})
+    service.create_asado("Viejo")
+    service.add_participant("Viejo", "Dario")
+    service.add_expense("Viejo", "Dario", "Carbón", 25.0)
+    assert service.archive_asado("Viejo")
+    service.add_custom_category("Postre")
+    path = str(tmp_path / "asadoapp.backup")
+    backup_database(service.db_manager.engine, path)
+    return path
+
+
+@pytest.fixture
+def target(tmp_path, monkeypatch):
+    """Base vacía con su propio directorio de archivos"""
+    monkeypatch.setenv("ASADO_ARCHIVE_DIR", str(tmp_path / "restored"))
+    db_manager = DatabaseManager(f"sqlite:///{tmp_path / 'restored.db'}")
+    db_manager.create_tables()
+    yield AsadoService(db_manager)
+    db_manager.engine.dispose()
+
+
+def contents(service, name):
+    snapshot = service.get_asado_snapshot(name)
+    expenses = snapshot['expenses']['inserted']
+    return (
+        sorted(snapshot['participants']),
+        sorted(zip(expenses['id'].tolist(), expenses['participant'].tolist(), expenses['amount'].tolist(),
+                   expenses['description'].tolist())),
+        sorted(zip(*(snapshot['shares'][column].tolist() for column in ('expense_id', 'participant', 'weight')))),
+        snapshot['archived']
+    )
+
+
+def test_round_trip(service, backup_path, target):
+    counts = restore_database(target.db_manager.engine, backup_path)
+    assert counts['expenses'] == 2 and counts['asado_archives'] == 1
+    for name in ("Asado", "Viejo"):
+        assert contents(target, name) == contents(service, name)
+    assert "Postre" in target.categories.custom()
+    path = target.get_archive_path("Viejo")
+    assert path.startswith(os.environ["ASADO_ARCHIVE_DIR"]) and os.path.exists(path)
+    # Los archivos temporales no quedan
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+
+def test_restore_does_not_overwrite_archives(service, backup_path, target, monkeypatch):
+    # Restaurar sobre el mismo directorio pisaría el Parquet del asado original
+    original = service.get_archive_path("Viejo")
+    monkeypatch.setenv("ASADO_ARCHIVE_DIR", os.path.dirname(original))
+    with open(original, 'rb') as source:
+        data = source.read()
+    with pytest.raises(ValueError):
+        restore_database(target.db_manager.engine, backup_path)
+    with open(original, 'rb') as source:
+        assert source.read() == data
+    assert os.listdir(os.path.dirname(original)) == [os.path.basename(original)]
+    assert target.get_all_asados() == []
+
+
+def test_failed_restore_removes_only_temporary_files(service, backup_path, target, monkeypatch):
+    import backup
+    
+    monkeypatch.setattr(backup, "_file_sha256", lambda path: "otro")
+    with pytest.raises(ValueError):
+        restore_database(target.db_manager.engine, backup_path)
+    directory = os.environ["ASADO_ARCHIVE_DIR"]
+    assert not os.path.exists(directory) or os.listdir(directory) == []
+    assert target.get_all_asados() == []
@@ -0,0 +1,47 @@
+import threading
+
+from categories import CategoryRegistry, DEFAULT_CATEGORIES
+
+
+def test_failed_load_is_not_cached():
+    calls = []
+    
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("base caída")
+        return ["Postre casero"]
+    
+    registry = CategoryRegistry(load)
+    assert registry.all() == sorted(DEFAULT_CATEGORIES)
+    assert "Postre casero" in registry
+    assert registry.custom() == ["Postre casero"]
+    assert len(calls) == 2
+
+
+def test_invalidate_during_load_discards_stale_state():
+    started, release = threading.Event(), threading.Event()
+    results = [["Vieja"], ["Nueva"]]
+    
+    def load():
+        if len(results) == 2:
+            started.set()
+            release.wait(5)
+        return results.pop(0)
+    
+    registry = CategoryRegistry(load)
+    reader = threading.Thread(target=registry.all)
+    reader.start()
+    started.wait(5)
+    registry.invalidate()
+    release.set()
+    reader.join(5)
+    assert registry.custom() == ["Nueva"]
+
+
+def test_service_registry_reloads_after_changes(service):
+    assert service.categories.custom() == []
+    service.add_custom_category("Provoleta")
+    assert "Provoleta" in service.categories
+    service.remove_custom_category("Provoleta")
+    assert "Provoleta" not in service.categories
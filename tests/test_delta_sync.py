@@ -0,0 +1,45 @@
+from database import Expense
+
+
+def test_delta_with_reused_expense_id(service, asado, monkeypatch):
+    """Base SQLite sin AUTOINCREMENT: el id de un gasto eliminado se reusa"""
+    monkeypatch.setitem(Expense.__table__.dialect_options['sqlite'], 'autoincrement', False)
+    service.db_manager.engine.dispose()
+    Expense.__table__.drop(service.db_manager.engine)
+    Expense.__table__.create(service.db_manager.engine)
+    
+    since = service.get_asado_version(asado)[-1]
+    first = service.add_expense(asado, "Ana", "Carne", 100.0)
+    service.remove_expense(first.id)
+    second = service.add_expense(asado, "Beto", "Vino", 50.0)
+    assert second.id == first.id
+    
+    changes = service.get_expense_changes(asado, since)
+    assert not changes['reset']
+    assert changes['inserted']['id'].tolist() == [second.id]
+    assert changes['inserted']['amount'].tolist() == [50.0]
+    assert changes['deleted'] == [first.id]
+
+
+def test_expense_ids_are_not_reused(service, asado):
+    first = service.add_expense(asado, "Ana", "Carne", 100.0)
+    service.remove_expense(first.id)
+    second = service.add_expense(asado, "Beto", "Vino", 50.0)
+    assert second.id > first.id
+
+
+def test_delta_since_version(service, asado):
+    kept = service.add_expense(asado, "Ana", "Carne", 100.0)
+    removed = service.add_expense(asado, "Beto", "Vino", 50.0)
+    since = service.get_expense_changes(asado, 0)['version']
+    
+    added = service.add_expense(asado, "Carla", "Pan", 10.0)
+    service.remove_expense(removed.id)
+    changes = service.get_expense_changes(asado, since)
+    assert changes['inserted']['id'].tolist() == [added.id]
+    assert changes['deleted'] == [removed.id]
+    assert changes['version'] > since
+    
+    full = service.get_expense_changes(asado, 0)
+    assert full['reset']
+    assert full['inserted']['id'].tolist() == [kept.id, added.id]
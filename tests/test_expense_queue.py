@@ -0,0 +1,63 @@
+import json
+from datetime import datetime
+
+from expense_queue import ExpenseWriteQueue
+
+
+def make_item(seq, participant, category="Carne", amount=100.0, asado="Asado"):
+    return {
+        'seq': seq, 'asado': asado, 'participant': participant, 'category': category,
+        'amount': amount, 'description': "", 'timestamp': datetime.now(), 'shares': {}
+    }
+
+
+def make_queue(service, tmp_path, **options):
+    return ExpenseWriteQueue(service, spool_path=str(tmp_path / "spool.jsonl"), **options)
+
+
+def test_failing_item_is_isolated_and_rejected(service, asado, tmp_path):
+    expense_queue = make_queue(service, tmp_path, max_attempts=2)
+    # category NULL viola la restricción: falla siempre
+    batch = [make_item(1, "Ana"), make_item(2, "Beto", category=None), make_item(3, "Carla")]
+    expense_queue._write_with_retry(batch)
+    
+    written = service.get_expenses(asado)
+    assert sorted(row.participant for row in written) == ["Ana", "Carla"]
+    assert expense_queue.rejected == 1
+    with open(expense_queue.rejected_path, encoding='utf-8') as rejected:
+        lines = [json.loads(line) for line in rejected]
+    assert [line['participant'] for line in lines] == ["Beto"]
+    assert lines[0]['error']
+
+
+def test_dropped_items_are_reported(service, asado, tmp_path):
+    expense_queue = make_queue(service, tmp_path)
+    expense_queue._write_with_retry([make_item(1, "Ana"), make_item(2, "Nadie")])
+    
+    assert [row.participant for row in service.get_expenses(asado)] == ["Ana"]
+    assert expense_queue.rejected == 1
+    with open(expense_queue.rejected_path, encoding='utf-8') as rejected:
+        assert json.loads(rejected.readline())['participant'] == "Nadie"
+
+
+def test_invalid_share_weights_are_rejected(service, asado, tmp_path):
+    expense_queue = make_queue(service, tmp_path)
+    bad = make_item(2, "Beto")
+    bad['shares'] = {"Ana": -1, "Beto": 2}
+    expense_queue._write_with_retry([make_item(1, "Ana"), bad])
+    
+    assert [row.participant for row in service.get_expenses(asado)] == ["Ana"]
+    assert expense_queue.rejected == 1
+
+
+def test_submit_and_stop_writes_pending(service, asado, tmp_path):
+    expense_queue = make_queue(service, tmp_path, flush_seconds=10)
+    expense_queue.start()
+    provisional = expense_queue.submit(asado, "Ana", "Vino", 30.0, shares={"Beto": 1})
+    assert provisional < 0
+    assert [row[0] for row in expense_queue.pending(asado)] == [provisional]
+    expense_queue.stop()
+    
+    assert expense_queue.pending(asado) == []
+    assert [(row.participant, row.amount) for row in service.get_expenses(asado)] == [("Ana", 30.0)]
+    assert service.get_expense_shares(asado)['participant'].tolist() == ["Beto"]
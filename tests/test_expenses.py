@@ -0,0 +1,32 @@
+"""
+Altas de gastos en lote (add_expenses): mismas reglas de división que add_expense
+"""
+
+from datetime import datetime
+
+import pytest
+
+
+def item(participant, shares=None, amount=100.0):
+    return {
+        'asado': "Asado", 'participant': participant, 'category': "Carne", 'amount': amount,
+        'description': "", 'timestamp': datetime.now(), 'shares': shares
+    }
+
+
+@pytest.mark.parametrize("shares", [{"Ana": -1, "Beto": 2}, {"Ana": 0, "Beto": 0}])
+def test_invalid_weights_are_rejected_one_by_one(service, asado, shares):
+    with pytest.raises(ValueError):
+        service.add_expense(asado, "Ana", "Carne", 100.0, shares=shares)
+    
+    ids = service.add_expenses([item("Ana", shares), item("Beto", amount=50.0)])
+    assert ids[0] is None and ids[1] is not None
+    assert [row.amount for row in service.get_expenses(asado)] == [50.0]
+    assert len(service.get_expense_shares(asado)['expense_id']) == 0
+
+
+def test_valid_weights_are_stored(service, asado):
+    ids = service.add_expenses([item("Ana", {"Ana": 0, "Beto": 2, "Carla": 1})])
+    shares = service.get_expense_shares(asado)
+    assert shares['expense_id'].tolist() == [ids[0], ids[0]]
+    assert sorted(zip(shares['participant'].tolist(), shares['weight'].tolist())) == [("Beto", 2.0), ("Carla", 1.0)]
@@ -0,0 +1,34 @@
+"""
+Lecturas con una réplica caída: se saca de la rotación y se lee de la primaria
+"""
+
+import time
+
+import pytest
+
+from database import DatabaseManager, AsadoService
+
+
+@pytest.fixture
+def replicated(database_url, tmp_path):
+    # Un SQLite en un directorio que no existe: cada conexión a la réplica falla
+    db_manager = DatabaseManager(database_url, read_urls=[f"sqlite:///{tmp_path / 'falta' / 'replica.db'}"])
+    db_manager.create_tables()
+    db_manager.read_your_writes_seconds = 0
+    service = AsadoService(db_manager)
+    service.create_asado("Asado")
+    yield service
+    for engine in [db_manager.engine] + db_manager.read_engines:
+        engine.dispose()
+
+
+def test_get_asado_by_name_falls_back_to_primary(replicated):
+    db_manager = replicated.db_manager
+    assert db_manager.get_read_session("Asado").get_bind() is db_manager.read_engines[0]
+    
+    row = replicated.get_asado_by_name("Asado")
+    assert row is not None and row.name == "Asado"
+    assert replicated.get_asado_by_name("Otro") is None
+    # La réplica quedó fuera de la rotación
+    assert db_manager._replica_down_until[0] > time.monotonic()
+    assert db_manager.get_read_session("Asado").get_bind() is db_manager.engine
@@ -0,0 +1,82 @@
+"""
+Búsqueda de gastos sobre SQLite: tabla FTS5 con triggers y parecido por trigramas
+"""
+
+import pytest
+from sqlalchemy import text
+
+from search import TEXT_SCORE
+
+
+@pytest.fixture
+def expenses(service, asado):
+    service.add_expense(asado, "Ana", "Carne", 300.0, "vacío de novillo")
+    service.add_expense(asado, "Beto", "Carbón", 40.0, "bolsa grande")
+    service.add_expense(asado, "Carla", "Bebidas", 90.0, "fernet y coca")
+    service.create_asado("Otro")
+    service.add_participant("Otro", "Dario")
+    service.add_expense("Otro", "Dario", "Carne", 120.0, "entraña")
+    return asado
+
+
+def found(service, query, asado_name=None, limit=20):
+    return [(row.asado, row.participant, row.category) for row in service.search_expenses(query, asado_name, limit)]
+
+
+def execute(service, statement, **params):
+    with service.db_manager.engine.begin() as connection:
+        connection.execute(text(statement), params)
+
+
+def test_triggers_keep_the_index_current(service, expenses):
+    added = service.add_expense(expenses, "Ana", "Postre", 25.0, "flan casero")
+    assert found(service, "flan") == [("Asado", "Ana", "Postre")]
+    
+    execute(service, "UPDATE expenses SET description = 'helado' WHERE id = :id", id=added.id)
+    assert found(service, "flan") == []
+    assert found(service, "helado") == [("Asado", "Ana", "Postre")]
+    
+    execute(service, "UPDATE participants SET name = 'Anabel' WHERE name = 'Ana'")
+    assert ("Asado", "Anabel", "Postre") in found(service, "anabel")
+    
+    service.remove_expense(added.id)
+    assert found(service, "helado") == []
+
+
+def test_accents_are_ignored(service, expenses):
+    for query in ("carbón", "carbon", "CARBON"):
+        assert found(service, query) == [("Asado", "Beto", "Carbón")]
+    assert found(service, "vacio") == [("Asado", "Ana", "Carne")]
+    assert found(service, "entrana") == [("Otro", "Dario", "Carne")]
+
+
+def test_typo_falls_back_to_trigrams(service, expenses):
+    results = service.search_expenses("Carnne")
+    assert sorted((row.asado, row.category) for row in results) == [("Asado", "Carne"), ("Otro", "Carne")]
+    assert all(row.score < TEXT_SCORE for row in results)
+    # Nombre de participante mal escrito
+    assert found(service, "Carlaa") == [("Asado", "Carla", "Bebidas")]
+
+
+def test_text_matches_rank_above_fuzzy_ones(service, expenses):
+    # "carla" está en el índice de texto (participante); "Carlos" solo se parece
+    service.add_participant(expenses, "Carlos")
+    service.add_expense(expenses, "Carlos", "Pan", 15.0)
+    results = service.search_expenses("carla")
+    assert [(row.participant, row.score >= TEXT_SCORE) for row in results] == [("Carla", True), ("Carlos", False)]
+    # Todas las palabras tienen que estar
+    assert found(service, "fernet coca") == [("Asado", "Carla", "Bebidas")]
+
+
+def test_asado_filter_and_limit(service, expenses):
+    assert found(service, "carne", "Otro") == [("Otro", "Dario", "Carne")]
+    assert found(service, "carne", "Inexistente") == []
+    assert len(found(service, "carne", limit=1)) == 1
+    for limit in (0, -1):
+        assert found(service, "carne", limit=limit) == []
+
+
+def test_archived_asados_are_not_searched(service, expenses):
+    assert service.archive_asado("Otro")
+    assert found(service, "entraña") == []
+    assert found(service, "carne") == [("Asado", "Ana", "Carne")]
@@ -0,0 +1,63 @@
+"""
+Liquidación en lote: misma cuenta que la página de Resumen, con asados archivados
+"""
+
+import csv
+import json
+import sys
+
+import pytest
+
+import settlement
+from settlement import settle_all
+
+
+@pytest.fixture
+def asados(service, asado):
+    service.add_expense(asado, "Ana", "Carne", 300.0)
+    service.add_expense(asado, "Beto", "Bebidas", 90.0, shares={"Beto": 2, "Carla": 1})
+    service.create_asado("Viejo")
+    for name in ("Dario", "Eva"):
+        service.add_participant("Viejo", name)
+    service.add_expense("Viejo", "Dario", "Carbón", 40.0)
+    service.archive_asado("Viejo")
+    return asado, "Viejo"
+
+
+def test_matches_summary(service, asados):
+    pytest.importorskip("pandas")
+    from api import build_settlement
+    
+    settlements = {result['asado']: result for result in settle_all(service, workers=1)}
+    assert set(settlements) == set(asados)
+    for name in asados:
+        snapshot = service.get_asado_snapshot(name)
+        expected = build_settlement(snapshot['participants'], snapshot['expenses']['inserted'], snapshot['shares'])
+        result = settlements[name]
+        assert result['total'] == pytest.approx(expected['total'])
+        assert {line['participant']: line['share'] for line in result['participants']} == pytest.approx(expected['should_pay'])
+        assert {line['participant']: line['balance'] for line in result['participants']} == pytest.approx(expected['balance'])
+        assert result['transfers'] == expected['transfers']
+    
+    balances = {line['participant']: line['balance'] for line in settlements["Asado"]['participants']}
+    assert balances == pytest.approx({"Ana": 200.0, "Beto": -70.0, "Carla": -130.0})
+    assert settlements["Viejo"]['transfers'] == [{'from': "Eva", 'to': "Dario", 'amount': 20.0}]
+
+
+def test_parallel_matches_serial(service, asados):
+    assert list(settle_all(service, workers=2, chunk_size=1)) == list(settle_all(service, workers=1))
+
+
+def test_cli_writes_reports(service, asados, tmp_path, monkeypatch):
+    csv_path, json_path = tmp_path / "informe.csv", tmp_path / "informe.json"
+    for path in (csv_path, json_path):
+        monkeypatch.setattr(sys, "argv", ["settlement.py", str(path), "--workers", "1"])
+        settlement.main()
+    
+    with open(csv_path, encoding='utf-8') as report:
+        rows = list(csv.DictReader(report))
+    assert len(rows) == 5
+    assert {row['participant']: row['pays'] for row in rows}["Carla"] == "Ana=130.00"
+    
+    with open(json_path, encoding='utf-8') as report:
+        assert [result['asado'] for result in json.load(report)] == ["Asado", "Viejo"]
@@ -0,0 +1,97 @@
+"""
+Asados repartidos en shards SQLite: versiones por shard, rebalanceo y anillo
+"""
+
+import pytest
+
+from api import version_etag
+from database import DatabaseManager
+from shards import HashRing, ShardedAsadoService, misplaced_asados, move_asado, rebalance
+
+
+def sharded_service(database_url, tmp_path, names):
+    service = ShardedAsadoService(
+        DatabaseManager(database_url), {name: f"sqlite:///{tmp_path / f'{name}.db'}" for name in names}
+    )
+    for manager in service.db_managers():
+        manager.create_tables()
+    return service
+
+
+@pytest.fixture
+def sharded(database_url, tmp_path):
+    service = sharded_service(database_url, tmp_path, ["a", "b"])
+    yield service
+    for manager in service.db_managers():
+        manager.engine.dispose()
+
+
+def asado_in(service, shard, exclude=()):
+    """Un nombre de asado que el anillo pone en ese shard"""
+    return next(
+        f"Asado {index}" for index in range(1000)
+        if service.ring.owner(f"Asado {index}") == shard and f"Asado {index}" not in exclude
+    )
+
+
+def seed(service, name, amount):
+    service.create_asado(name)
+    service.add_participant(name, "Ana")
+    service.add_participant(name, "Beto")
+    service.add_expense(name, "Ana", "Carne", amount)
+
+
+def contents(service, name):
+    snapshot = service.get_asado_snapshot(name)
+    expenses = snapshot['expenses']['inserted']
+    return sorted(snapshot['participants']), sorted(zip(expenses['participant'].tolist(), expenses['amount'].tolist()))
+
+
+def test_versions_include_the_shard(sharded):
+    first, second = asado_in(sharded, "a"), asado_in(sharded, "b")
+    seed(sharded, first, 100.0)
+    seed(sharded, second, 200.0)
+    
+    # Mismo id y misma versión en cada base: solo el shard los distingue
+    one, other = sharded.get_asado_snapshot(first)['version'], sharded.get_asado_snapshot(second)['version']
+    assert one[1:] == other[1:]
+    assert one == ("a",) + one[1:] and other == ("b",) + other[1:]
+    assert version_etag(one) != version_etag(other)
+    assert sharded.get_asado_version(first) == one
+
+
+def test_moved_asado_changes_version(sharded):
+    name = asado_in(sharded, "a")
+    seed(sharded, name, 100.0)
+    before = sharded.get_asado_snapshot(name)['version']
+    
+    move_asado(sharded, name, "a", "b")
+    moved = sharded.shards["b"].get_asado_snapshot(name)['version']
+    assert moved[0] == "b" and moved != before
+    assert sharded.shards["a"].get_asado_snapshot(name) is None
+
+
+def test_rebalance_moves_only_misplaced_asados(database_url, tmp_path, sharded):
+    names = [f"Asado {index}" for index in range(12)]
+    for index, name in enumerate(names):
+        seed(sharded.shard_for(name), name, 10.0 * (index + 1))
+    before = {name: contents(sharded, name) for name in names}
+    
+    grown = sharded_service(database_url, tmp_path, ["a", "b", "c"])
+    misplaced = misplaced_asados(grown)
+    assert all(target == "c" for _, _, target in misplaced)
+    
+    moved = rebalance(grown)
+    assert moved == misplaced
+    assert misplaced_asados(grown) == []
+    assert {name: contents(grown, name) for name in names} == before
+    assert sorted(row.name for row in grown.get_all_asados()) == sorted(names)
+
+
+def test_ring_is_stable_when_adding_a_shard():
+    keys = [f"asado {index}" for index in range(2000)]
+    small, grown = HashRing(["a", "b", "c"]), HashRing(["a", "b", "c", "d"])
+    changed = [key for key in keys if small.owner(key) != grown.owner(key)]
+    # Solo cambian de dueño los que pasan al shard nuevo (alrededor de 1/4)
+    assert all(grown.owner(key) == "d" for key in changed)
+    assert 0.1 < len(changed) / len(keys) < 0.4
@@ -0,0 +1,52 @@
+"""
+División de gastos con pesos por participante (calculate_owed y calculate_totals)
+"""
+
+import pytest
+
+from summary import calculate_owed, calculate_totals, calculate_transfers
+
+PARTICIPANTS = ["Ana", "Beto", "Carla"]
+
+
+def shares(*rows):
+    return {
+        'expense_id': [row[0] for row in rows],
+        'participant': [row[1] for row in rows],
+        'weight': [row[2] for row in rows],
+    }
+
+
+def test_owed_without_shares_is_equal_split():
+    owed = calculate_owed(PARTICIPANTS, [1, 2], [90.0, 30.0], shares())
+    assert owed == pytest.approx({"Ana": 40.0, "Beto": 40.0, "Carla": 40.0})
+
+
+def test_owed_with_weights():
+    # El gasto 1 se divide 2:1 entre Ana y Beto; el 2, entre todos
+    owed = calculate_owed(PARTICIPANTS, [2, 1], [30.0, 90.0], shares((1, "Ana", 2), (1, "Beto", 1)))
+    assert owed == pytest.approx({"Ana": 70.0, "Beto": 40.0, "Carla": 10.0})
+    assert sum(owed.values()) == pytest.approx(120.0)
+
+
+def test_owed_ignores_unknown_participants_and_expenses():
+    # Un peso de alguien que ya no está y uno de un gasto que no existe no cuentan;
+    # si no queda ningún peso válido, el gasto va entre todos
+    owed = calculate_owed(PARTICIPANTS, [1, 2], [60.0, 30.0],
+                          shares((1, "Dario", 1), (2, "Carla", 1), (7, "Ana", 1)))
+    assert owed == pytest.approx({"Ana": 20.0, "Beto": 20.0, "Carla": 50.0})
+
+
+def test_totals_and_transfers_with_shares():
+    pd = pytest.importorskip("pandas")
+    df = pd.DataFrame({
+        'id': [1, 2],
+        'participant': ["Ana", "Beto"],
+        'category': ["Carne", "Bebidas"],
+        'amount': [90.0, 30.0],
+    })
+    totals = calculate_totals(PARTICIPANTS, df, shares((2, "Beto", 1), (2, "Carla", 1)))
+    assert totals['should_pay'] == pytest.approx({"Ana": 30.0, "Beto": 45.0, "Carla": 45.0})
+    assert totals['balance'] == pytest.approx({"Ana": 60.0, "Beto": -15.0, "Carla": -45.0})
+    transfers = calculate_transfers(totals['balance'])
+    assert sum(amount for _, _, amount in transfers) == pytest.approx(60.0)